@@ -10,7 +10,12 @@ from anki.hooks import wrap
 from aqt import gui_hooks, mw
 from aqt.editor import Editor
 from aqt.qt import QAction, QMenu, Qt
-from .notetype import NOTE_TYPE_NAME
+from .notetype import (
+    NOTE_TYPE_NAME,
+    finish_pending_install,
+    note_needs_font_subset,
+    refresh_font_subsets,
+)
 from .media_convert import rewrite_m4a_tags, find_ffmpeg, convert_m4a_to_mp3, m4a_to_mp3_filename, _M4A_AUDIO_RE
 
 _SOUND_RE = re.compile(r"\[sound:([^\]]+)\]")
@@ -104,6 +109,23 @@ def _convert_on_add(col, note, deck_id):
 anki_hooks.note_will_be_added.append(_convert_on_add)
 
 
+# --- Font subsets: rebuild when a new note needs a glyph they don't have ---
+
+
+def _check_font_subset(col, note, deck_id):
+    model = note.note_type()
+    if model is None or model["name"] != NOTE_TYPE_NAME:
+        return
+    if note_needs_font_subset(note.fields):
+        refresh_font_subsets(extra_texts=list(note.fields))
+
+
+anki_hooks.note_will_be_added.append(_check_font_subset)
+# Notes added on other devices arrive by sync.
+gui_hooks.profile_did_open.append(refresh_font_subsets)
+gui_hooks.sync_did_finish.append(refresh_font_subsets)
+
+
 # --- Editor display hook: convert [sound:] when fields are loaded (e.g. Migaku intercept) ---
 
 _converting_editor = False
@@ -270,9 +292,13 @@ def _get_config() -> dict:
 
 
 def _auto_install_notetype():
-    if not _get_config().get("auto_install", True):
+    if not mw.col:
+        return
+    if mw.col.models.by_name(NOTE_TYPE_NAME):
+        # Installed offline from the bundled templates: fetch the fonts now.
+        finish_pending_install()
         return
-    if mw.col and not mw.col.models.by_name(NOTE_TYPE_NAME):
+    if _get_config().get("auto_install", True):
         install_notetype(on_success=lambda: showInfo(
             f"{NOTE_TYPE_NAME} note type installed successfully."
         ))
@@ -0,0 +1,217 @@
+"""Move the note type's inline card scripts into a shared, cacheable media file.
+
+The templates inline all of their JavaScript, and because ``back.html``
+includes ``{{FrontSide}}`` every answer reveal re-parses the whole front
+script as well. At install time the add-on moves each inline ``<script>``
+block into ``_mvj_runtime.js`` (one media file shared by every note type
+built from these templates, so the webview compiles and caches it once)
+and leaves a one-line bootstrap in its place:
+
+    <script src="_mvj_runtime.js?v=1a2b3c4d5e"></script>   (before the first block)
+    <script>__mvjRun("b0123456789ab")</script>             (one per moved block)
+
+Blocks are keyed by a hash of their source, so identical blocks in different
+note types share one entry, and the runtime registers a block only once per
+document. Execution order and repetition are unchanged: each bootstrap runs
+its block where the inline script used to run, front blocks run again on the
+back through ``{{FrontSide}}``, and a throwing block doesn't stop later ones.
+
+Wrapping a script in a function changes the scope of its top-level
+declarations, so:
+
+  * top-level ``function`` declarations are re-exported onto ``window``;
+  * a block with a top-level ``var`` / ``let`` / ``const`` / ``class`` (which
+    other scripts could see as a global) is left inline, as is any block the
+    scanner can't lex with confidence.
+
+Pure Python; no Anki imports.
+"""
+
+import hashlib
+import re
+
+from .minify import Token, TokenizeError, tokenize_js
+
+RUNTIME_FILE = "_mvj_runtime.js"
+
+# Only bare <script> tags are moved; anything with attributes is left alone.
+_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+_BLOCK_RE = re.compile(
+    r"^/\* @block (b[0-9a-f]+) \*/\n(.*?)^/\* @end \1 \*/\n",
+    re.DOTALL | re.MULTILINE,
+)
+_CALL_RE = re.compile(r'__mvjRun\("(b[0-9a-f]+)"\)')
+
+_HEADER = (
+    "/* _mvj_runtime.js: card scripts for the MvJ note types, generated by the\n"
+    "   MvJ add-on from the note type templates. Do not edit; it is rewritten\n"
+    "   whenever the note type is installed or updated. */\n"
+)
+
+# The red line a card shows, once per card, when it can't run its scripts:
+# the runtime hasn't synced to this device yet, or the copy here is older than
+# the templates (which call blocks it doesn't have). Deduped by its element
+# id, not a window flag: the reviewer keeps one webview across cards.
+_BANNER_ID = "mvj-runtime-missing"
+_BANNER = (
+    "document.getElementById('" + _BANNER_ID + "')||"
+    "document.body.insertAdjacentHTML('afterbegin','<div id=\"" + _BANNER_ID + "\" "
+    "style=\"color:#c33;font:14px sans-serif;padding:8px\">MvJ: " + RUNTIME_FILE
+    + " is missing or out of date. Sync media, or update the note type from Anki "
+    "on your computer.</div>')"
+)
+
+# Defined by the loader in case the media file hasn't synced to this device
+# yet; the runtime replaces it.
+_MISSING_RUNTIME = (
+    "<script>window.__mvjRun||(window.__mvjRun=function(){" + _BANNER + "})"
+    "</script>"
+)
+
+_BLOCK_HEADERS = {"if", "for", "while", "switch", "catch", "with"}
+
+
+class ScanError(ValueError):
+    """The scanner couldn't follow a script; it's left inline."""
+
+
+def scan_globals(js: str) -> tuple[list[str], list[str]]:
+    """Top-level declarations of *js*: ``(function_names, variable_names)``.
+
+    Works on ``minify.tokenize_js`` tokens, tracking bracket nesting well
+    enough to tell which declarations land in the global scope.
+    ``variable_names`` are ``var`` declarations outside any function plus
+    ``let`` / ``const`` / ``class`` at the top level (only the first name of a
+    declaration list is reported). Raises ``ScanError`` on unbalanced
+    brackets or input the tokenizer rejects.
+    """
+    functions: list[str] = []
+    variables: list[str] = []
+    try:
+        tokens = [t for t in tokenize_js(js) if t.kind not in ("space", "comment")]
+    except TokenizeError as e:
+        raise ScanError(str(e)) from e
+    # Open brackets: "{" block, "f" function body, "(" and "[". Each "(" also
+    # remembers the token before it, to tell `if (...) {` from `f(...) {`.
+    stack: list[str] = []
+    paren_prev: list[str | None] = []
+    fn_depth = 0
+    closed_paren_prev: str | None = None
+    prev: Token | None = None
+    for k, tok in enumerate(tokens):
+        nxt = tokens[k + 1] if k + 1 < len(tokens) else None
+        word = tok.text if tok.kind == "name" and not (prev and prev.text in (".", "?.")) else None
+        if word == "function" and not stack and (prev is None or prev.text in (";", "}", "async")):
+            after = tokens[k + 2] if nxt and nxt.text == "*" and k + 2 < len(tokens) else nxt
+            if after and after.kind == "name":
+                functions.append(after.text)
+        elif (word == "var" and not fn_depth) or (word in ("let", "const", "class") and not stack):
+            if nxt and nxt.kind == "name":
+                variables.append(nxt.text)
+        elif tok.kind == "punct" and tok.text == "{":
+            # A body follows "=>" or the ")" of a parameter list that isn't
+            # an if/for/while/... header (function and method definitions).
+            is_fn = prev is not None and (
+                prev.text == "=>" or (prev.text == ")" and closed_paren_prev not in _BLOCK_HEADERS)
+            )
+            stack.append("f" if is_fn else "{")
+            fn_depth += is_fn
+        elif tok.kind == "punct" and tok.text in ("(", "["):
+            stack.append(tok.text)
+            if tok.text == "(":
+                paren_prev.append(prev.text if prev else None)
+        elif tok.kind == "punct" and tok.text in ("}", ")", "]"):
+            opener = {"}": "{f", ")": "(", "]": "["}[tok.text]
+            if not stack or stack[-1] not in opener:
+                raise ScanError(f"unbalanced {tok.text!r}")
+            fn_depth -= stack.pop() == "f"
+            if tok.text == ")":
+                closed_paren_prev = paren_prev.pop()
+        prev = tok
+    if stack:
+        raise ScanError("unbalanced brackets at end of script")
+    return functions, variables
+
+
+def block_id(js: str) -> str:
+    return "b" + hashlib.sha256(js.encode("utf-8")).hexdigest()[:12]
+
+
+def _render_block(bid: str, js: str, functions: list[str]) -> str:
+    exports = "".join(f"window.{name} = {name};\n" for name in functions)
+    return (
+        f"/* @block {bid} */\n"
+        f'B["{bid}"] = B["{bid}"] || function () {{\n'
+        f"{exports}{js.strip(chr(10))}\n"
+        "};\n"
+        f"/* @end {bid} */\n"
+    )
+
+
+def extract_runtime(template: str) -> tuple[str, dict[str, str]]:
+    """Move *template*'s inline scripts into runtime blocks.
+
+    Returns ``(template, blocks)``: the template with each movable script
+    replaced by its bootstrap (and the loader before the first one), and
+    ``{block_id: rendered block}`` for ``render_runtime``. A template with
+    nothing movable is returned unchanged with no blocks.
+    """
+    blocks: dict[str, str] = {}
+
+    def replace(m: re.Match) -> str:
+        js = m.group(1)
+        if not js.strip():
+            return m.group(0)
+        try:
+            functions, variables = scan_globals(js)
+        except ScanError:
+            return m.group(0)
+        if variables:
+            return m.group(0)
+        bid = block_id(js)
+        blocks[bid] = _render_block(bid, js, functions)
+        return f'<script>__mvjRun("{bid}")</script>'
+
+    body = _SCRIPT_RE.sub(replace, template)
+    if not blocks:
+        return template, {}
+    version = hashlib.sha256("".join(blocks).encode()).hexdigest()[:10]
+    loader = f'<script src="{RUNTIME_FILE}?v={version}"></script>{_MISSING_RUNTIME}\n'
+    first = body.index("<script>__mvjRun(")
+    # Keep the loader on the same indentation as the first bootstrap.
+    line_start = body.rfind("\n", 0, first) + 1
+    indent = body[line_start:first] if not body[line_start:first].strip() else ""
+    return body[:first] + loader + indent + body[first:], blocks
+
+
+def referenced_blocks(template: str) -> set[str]:
+    """Block ids a (built) template's bootstraps call."""
+    return set(_CALL_RE.findall(template))
+
+
+def parse_runtime(js: str) -> dict[str, str]:
+    """``{block_id: rendered block}`` of an existing runtime file."""
+    return {m.group(1): m.group(0) for m in _BLOCK_RE.finditer(js)}
+
+
+def render_runtime(blocks: dict[str, str]) -> str:
+    """The runtime file for *blocks* (as returned by ``extract_runtime``)."""
+    body = "".join(blocks[bid] for bid in sorted(blocks))
+    version = hashlib.sha256(body.encode("utf-8")).hexdigest()[:10]
+    return (
+        _HEADER
+        + "(function () {\n"
+        + f'if (window.__mvjRuntimeVersion === "{version}") return;\n'
+        + "var B = window.__mvjBlocks = window.__mvjBlocks || {};\n"
+        + body
+        + "window.__mvjRun = function (id) {\n"
+        + "    var fn = B[id];\n"
+        + "    if (fn) return fn.call(window);\n"
+        + '    console.error("[MvJ] card script " + id + " is missing from '
+        + RUNTIME_FILE
+        + '");\n'
+        + f"    {_BANNER};\n"
+        + "};\n"
+        + f'window.__mvjRuntimeVersion = "{version}";\n'
+        + "})();\n"
+    )
@@ -0,0 +1,205 @@
+"""Compile the note type CSS down to the states its settings can reach.
+
+``css.css`` styles every color scheme, debug outlines, tategaki and the other
+root-level switches, and the webview matches all of it on every card. The
+card scripts turn five settings into state on ``<html>``:
+
+  * ``--tategaki``          → the ``tategaki`` class (present iff ``on``)
+  * ``--color-scheme``      → ``data-color-scheme``   (empty → ``blue``)
+  * ``--debug``             → ``data-debug``          (empty → ``off``)
+  * ``--audio-labels``      → ``data-audio-labels``   (empty → ``on``)
+  * ``--card-transparency`` → ``data-card-transparency`` (empty → ``on``)
+
+A value is reachable if it's the default or any mode's override of that
+setting (a mode applies whenever its tag or deck matches, so every mode
+counts). ``compile_css`` drops the selectors that need an unreachable value,
+and the rules left with no selector. Everything else, including comments and
+the ``⚙ SETTINGS`` region the card scripts read, is copied byte-for-byte, so
+the result round-trips through the settings dialog's parsers like the source.
+
+Conservative: tests inside ``:not(...)`` (other than ``:not(.tategaki)``)
+never cause a drop, and only ``@media`` / ``@supports`` / ``@container`` /
+``@layer`` bodies are descended into.
+
+Pure Python; no Anki imports.
+"""
+
+import re
+
+# setting → (html attribute, value the card scripts use when it's empty)
+_ATTRIBUTES = {
+    "color-scheme": ("data-color-scheme", "blue"),
+    "debug": ("data-debug", "off"),
+    "audio-labels": ("data-audio-labels", "on"),
+    "card-transparency": ("data-card-transparency", "on"),
+}
+_SWITCHES = ("tategaki",) + tuple(_ATTRIBUTES)
+
+_DECL_RE = re.compile(
+    r"--(?:mode-\d+-)?(" + "|".join(map(re.escape, _SWITCHES)) + r")\s*:\s*([^;}]*)"
+)
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_ATTR_RE = re.compile(r"""\[\s*([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([\w-]+))\s*\]""")
+_TATEGAKI_RE = re.compile(r"\.tategaki(?![\w-])")
+_NOT_TATEGAKI = ":not(.tategaki)"
+_GROUPING_RE = re.compile(r"@(?:media|supports|container|layer)\b")
+
+
+def reachable_states(css: str) -> dict[str, set[str]]:
+    """``{setting: values}`` the card can end up with, from *css*'s declarations.
+
+    A setting with no declaration at all maps to an empty set: the card
+    scripts never set its attribute.
+    """
+    states: dict[str, set[str]] = {name: set() for name in _SWITCHES}
+    for m in _DECL_RE.finditer(_COMMENT_RE.sub("", css)):
+        name, value = m.group(1), m.group(2).strip()
+        if name == "tategaki":
+            states[name].add("on" if value == "on" else "off")
+        else:
+            states[name].add(value or _ATTRIBUTES[name][1])
+    return states
+
+
+def _not_spans(selector: str) -> list[tuple[int, int]]:
+    spans = []
+    for m in re.finditer(r":not\(", selector):
+        depth, i = 1, m.end()
+        while i < len(selector) and depth:
+            depth += {"(": 1, ")": -1}.get(selector[i], 0)
+            i += 1
+        spans.append((m.start(), i))
+    return spans
+
+
+def selector_reachable(selector: str, states: dict[str, set[str]]) -> bool:
+    """Whether *selector* can match given the reachable *states*."""
+    spans = _not_spans(selector)
+
+    def negated(pos: int) -> bool:
+        return any(a <= pos < b for a, b in spans)
+
+    attributes = {attr: name for name, (attr, _empty) in _ATTRIBUTES.items()}
+    for m in _ATTR_RE.finditer(selector):
+        name = attributes.get(m.group(1))
+        if name and not negated(m.start()):
+            value = next(g for g in m.groups()[1:] if g is not None)
+            if value not in states[name]:
+                return False
+    if "on" not in states["tategaki"]:
+        if any(not negated(m.start()) for m in _TATEGAKI_RE.finditer(selector)):
+            return False
+    if _NOT_TATEGAKI in selector and "off" not in states["tategaki"]:
+        return False
+    return True
+
+
+def _skip(css: str, i: int) -> int:
+    """Index just past the comment or string starting at *i* (or *i* itself)."""
+    if css.startswith("/*", i):
+        end = css.find("*/", i + 2)
+        return len(css) if end < 0 else end + 2
+    if css[i] in "\"'":
+        quote, i = css[i], i + 1
+        while i < len(css) and css[i] != quote:
+            i += 2 if css[i] == "\\" else 1
+        return i + 1
+    return i
+
+
+def _block_end(css: str, i: int) -> int:
+    """Index just past the ``}`` closing the block whose ``{`` is at *i*."""
+    depth = 0
+    while i < len(css):
+        j = _skip(css, i)
+        if j != i:
+            i = j
+            continue
+        if css[i] == "{":
+            depth += 1
+        elif css[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(css)
+
+
+def _split_selectors(prelude: str) -> list[str]:
+    parts, depth, start, i = [], 0, 0, 0
+    while i < len(prelude):
+        j = _skip(prelude, i)
+        if j != i:
+            i = j
+            continue
+        c = prelude[i]
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and not depth:
+            parts.append(prelude[start:i])
+            start = i + 1
+        i += 1
+    parts.append(prelude[start:])
+    return parts
+
+
+def _compile_rule(prelude: str, body: str, states: dict[str, set[str]]) -> str:
+    """The rule ``prelude{body}`` compiled for *states*; empty if it can't apply."""
+    source = prelude + "{" + body + "}"
+    if prelude.startswith("@"):
+        if not _GROUPING_RE.match(prelude):
+            return source
+        inner = _compile_rules(body, states)
+        return prelude + "{" + inner + "}" if inner.strip() else ""
+    selectors = _split_selectors(prelude)
+    kept = [s for s in selectors if selector_reachable(_COMMENT_RE.sub("", s), states)]
+    if len(kept) == len(selectors):
+        return source
+    if not kept:
+        return ""
+    sep = ",\n" if "\n" in prelude else ","
+    trail = prelude[len(prelude.rstrip()) :]
+    return sep.join(s.strip() for s in kept) + trail + "{" + body + "}"
+
+
+def _compile_rules(css: str, states: dict[str, set[str]]) -> str:
+    out = []
+    i = copied = 0
+    while i < len(css):
+        j = _skip(css, i)
+        if j != i or css[i].isspace() or css[i] in ";}":
+            i = max(j, i + 1)
+            continue
+        start = i
+        while i < len(css) and css[i] not in "{;}":
+            j = _skip(css, i)
+            i = j if j != i else i + 1
+        if i >= len(css) or css[i] != "{":
+            continue  # a statement such as @import, copied as is
+        end = _block_end(css, i)
+        rule = _compile_rule(css[start:i], css[i + 1 : end - 1], states)
+        if rule != css[start:end]:
+            cut, resume = start, end
+            if not rule:
+                # Take the dropped rule's indentation and its trailing blank
+                # lines along, so the source's spacing stays as it was.
+                line = css.rfind("\n", 0, start) + 1
+                if not css[line:start].strip():
+                    cut = line
+                k = end
+                while k < len(css) and css[k].isspace():
+                    k += 1
+                resume = css.rfind("\n", end, k) + 1 or end
+            out.append(css[copied:cut])
+            out.append(rule)
+            copied = resume
+        i = end
+    out.append(css[copied:])
+    return "".join(out)
+
+
+def compile_css(css: str) -> str:
+    """*css* without the rules its reachable settings can never apply."""
+    return _compile_rules(css, reachable_states(css))
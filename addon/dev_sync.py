@@ -10,7 +10,13 @@ from aqt import gui_hooks, mw
 from aqt.qt import QKeySequence, QShortcut
 from aqt.utils import showWarning, tooltip
 
-from .notetype import NOTE_TYPE_NAME, _update_notetype, _merge_css_settings
+from .notetype import (
+    NOTE_TYPE_NAME,
+    _build_templates,
+    _install_runtime,
+    _merge_css_settings,
+    _update_notetype,
+)
 
 _CONFIGS = {
     "mvj": {
@@ -52,7 +58,11 @@ def sync_local_templates(*, reset_css: bool = False):
             with open(path, "r", encoding="utf-8") as f:
                 contents[key] = f.read()
 
-        _update_notetype(model, contents["front"], contents["back"], contents["css"], reset_css=reset_css)
+        # Both note types build into the same shared runtime file.
+        front, back, css, blocks = _build_templates(contents["front"], contents["back"], contents["css"])
+        _install_runtime(blocks)
+        _update_notetype(model, front, back, css, reset_css=reset_css)
+        _install_runtime(blocks, model["id"])
         synced.append(config)
 
     msg = f"Local templates synced ({', '.join(synced)})."
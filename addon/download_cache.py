@@ -0,0 +1,189 @@
+"""Content-addressed cache of downloaded files, shared by every profile.
+
+Anki's add-on folder is per machine, not per profile, so files kept under
+``user_files/cache`` are visible to all profiles: a second profile installing
+Kaishi finds the media zip, ``cards.tsv`` and the manifests already there.
+
+Bodies are stored once, as ``blobs/<sha256>``. ``index.json`` maps each URL
+to the blob it last served and the server's validator (ETag / Last-Modified)
+for it, and records when each blob was last used. A blob is reused when the
+caller knows the digest it wants (``find``), or when the server answers a
+conditional request for the URL with 304 (``get``, ``revalidate``). Once the
+blobs exceed *max_bytes*, the least recently used go first.
+
+Pure Python; no Anki imports.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+
+from .downloader import _validator
+
+
+class DownloadCache:
+    """Blobs under *directory*, at most *max_bytes* of them (LRU eviction)."""
+
+    _INDEX = "index.json"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self._dir = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        try:
+            with open(os.path.join(directory, self._INDEX), encoding="utf-8") as f:
+                index = json.load(f)
+            self._urls = dict(index["urls"])
+            self._blobs = dict(index["blobs"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._urls, self._blobs = {}, {}
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self._dir, "blobs", sha256)
+
+    def find(self, sha256: str) -> str | None:
+        """Path of the blob with digest *sha256*, or None; marks it used."""
+        sha256 = sha256.lower()
+        with self._lock:
+            if sha256 not in self._blobs or not os.path.exists(self.blob_path(sha256)):
+                return None
+            self._blobs[sha256]["used"] = time.time()
+            self._save()
+        return self.blob_path(sha256)
+
+    def request_headers(self, url: str) -> dict:
+        """Conditional headers for *url*'s cached blob, or {} if there's none."""
+        with self._lock:
+            entry = self._urls.get(url)
+            if not entry or entry["sha256"] not in self._blobs:
+                return {}
+        if not os.path.exists(self.blob_path(entry["sha256"])):
+            return {}
+        validator = entry["validator"]
+        if validator.startswith('"'):
+            return {"If-None-Match": validator}
+        return {"If-Modified-Since": validator}
+
+    def _cached(self, url: str) -> str | None:
+        with self._lock:
+            entry = self._urls.get(url)
+        return self.find(entry["sha256"]) if entry else None
+
+    def get(self, session, url: str) -> bytes:
+        """*url*'s body over *session*, from the cache when the server says 304."""
+        headers = self.request_headers(url)
+        status, resp_headers, body = session.fetch(url, headers=headers)
+        if status == 304:
+            path = self._cached(url)
+            if path:
+                with open(path, "rb") as f:
+                    return f.read()
+            # Blob evicted meanwhile; fetch it unconditionally.
+            status, resp_headers, body = session.fetch(url)
+        self.put_bytes(url, body, _validator(resp_headers))
+        return body
+
+    def revalidate(self, opener, url: str, *, timeout: float = 30) -> str | None:
+        """Path of *url*'s cached blob if the server confirms it's current.
+
+        Sends one conditional GET over *opener*; anything but a 304 (including
+        a connection error) returns None and the caller downloads as usual.
+        """
+        headers = self.request_headers(url)
+        if not headers:
+            return None
+        try:
+            with opener(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+                status = getattr(resp, "status", 200)
+        except HTTPError as e:
+            # urllib proper raises on 304; the pooled opener returns it.
+            status = e.code
+        except OSError:
+            return None
+        return self._cached(url) if status == 304 else None
+
+    def put_bytes(self, url: str, data: bytes, validator) -> str | None:
+        """Store *data* as *url*'s body; its blob path, or None if not kept."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path) and len(data) <= self.max_bytes:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return self._record(url, sha256, len(data), validator)
+
+    def put_file(self, url: str, path: str, validator, sha256: str | None = None) -> str | None:
+        """Move the downloaded file at *path* into the cache as *url*'s body.
+
+        Returns the blob's path, or None if the file is larger than the whole
+        cache (it's left where it is). *sha256* skips hashing the file again.
+        """
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return None
+        if sha256 is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(block)
+            sha256 = sha.hexdigest()
+        sha256 = sha256.lower()
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.replace(path, blob)
+        return self._record(url, sha256, size, validator)
+
+    def remove(self, sha256: str) -> None:
+        """Drop the blob with digest *sha256* (e.g. found corrupt)."""
+        with self._lock:
+            if self._blobs.pop(sha256.lower(), None) is None:
+                return
+            self._urls = {u: e for u, e in self._urls.items() if e["sha256"] in self._blobs}
+            self._save()
+        try:
+            os.unlink(self.blob_path(sha256.lower()))
+        except OSError:
+            pass
+
+    def _record(self, url, sha256, size, validator) -> str | None:
+        with self._lock:
+            if size > self.max_bytes:
+                self._urls.pop(url, None)
+                self._save()
+                return None
+            if validator:
+                self._urls[url] = {"sha256": sha256, "validator": validator}
+            else:
+                self._urls.pop(url, None)  # nothing to revalidate against
+            self._blobs[sha256] = {"size": size, "used": time.time()}
+            self._evict(keep=sha256)
+            self._save()
+        return self.blob_path(sha256)
+
+    def _evict(self, keep: str) -> None:
+        total = sum(b["size"] for b in self._blobs.values())
+        for sha256 in sorted(self._blobs, key=lambda s: self._blobs[s]["used"]):
+            if total <= self.max_bytes:
+                break
+            if sha256 == keep:
+                continue
+            total -= self._blobs.pop(sha256)["size"]
+            try:
+                os.unlink(self.blob_path(sha256))
+            except OSError:
+                pass
+        self._urls = {u: e for u, e in self._urls.items() if e["sha256"] in self._blobs}
+
+    def _save(self) -> None:
+        os.makedirs(self._dir, exist_ok=True)
+        path = os.path.join(self._dir, self._INDEX)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"urls": self._urls, "blobs": self._blobs}, f, indent=2)
+        os.replace(tmp, path)
@@ -11,18 +11,67 @@ loop silently treats such a truncated transfer as complete -- CPython's
 later surfaces as a baffling "File is not a zip file". This module instead
 verifies the byte count against ``Content-Length``, resumes from where it stopped
 via an HTTP ``Range`` request, and retries until the file is whole.
+
+With ``segments`` > 1, ``download_to_file`` fetches byte ranges over several
+connections at once, for links that throttle each connection; every segment
+retries and resumes on its own.
+
+With ``resumable``, the bytes land in ``<dest>.part`` next to a small JSON
+sidecar recording the URL, the server's validator (ETag / Last-Modified), the
+size and which ranges are still missing; a later call -- even after Anki was
+closed mid-download -- continues from there, or starts over if the file changed.
+
+``ConnectionPool`` lets a batch of small files (the note type's templates and
+fonts) share a few keep-alive connections instead of paying a fresh TCP + TLS
+handshake per file.
 """
 
+import hashlib
 import http.client
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
 import time
 import urllib.request
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
 from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
 
 # Transient HTTP statuses worth retrying; anything else (404, 403, 416, ...) is a
 # hard error and surfaced to the caller immediately.
 _RETRYABLE_HTTP = {429, 500, 502, 503, 504}
 
+_REDIRECT_HTTP = {301, 302, 303, 307, 308}
+_MAX_REDIRECTS = 5
+
+# Segments smaller than this aren't worth another connection's handshake.
+_MIN_SEGMENT = 4 * 1024 * 1024
+
+# Resumable downloads rewrite their sidecar at most this often (seconds).
+_PARTIAL_SAVE_INTERVAL = 1.0
+
+# Block size for hashing bytes already on disk.
+_HASH_READ = 1024 * 1024
+
+# The receive buffer starts at ``chunk_size`` and doubles up to this while
+# reads fill it quickly, aiming for reads of about ``_CHUNK_TARGET`` seconds.
+_MAX_CHUNK = 1024 * 1024
+_CHUNK_TARGET = 0.05
+
+# ``on_progress`` fires at most this often (seconds), and only once another
+# this-much of the file (fraction) has arrived; the last byte always reports.
+_PROGRESS_INTERVAL = 0.25
+_PROGRESS_STEP = 0.01
+
+# Same User-Agent urllib sends, so pooled requests look identical upstream.
+_USER_AGENT = "Python-urllib/%d.%d" % sys.version_info[:2]
+
 
 class DownloadError(Exception):
     """Base class for download failures carrying a user-facing message."""
@@ -44,6 +93,25 @@ class CorruptDownloadError(DownloadError):
     """A full-sized download that isn't the expected zip (e.g. an error page)."""
 
 
+class ChecksumMismatchError(CorruptDownloadError):
+    """A download's SHA-256 differs from the one the caller expected."""
+
+    def __init__(self, expected: str, actual: str):
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            "The downloaded file doesn't match its expected checksum "
+            "(the download may have been corrupted). Please try again."
+        )
+
+
+class DownloadCancelled(DownloadError):
+    """The caller's ``CancelToken`` was cancelled during the download."""
+
+    def __init__(self):
+        super().__init__("Download cancelled.")
+
+
 class _BadRangeResponse(DownloadError):
     """Internal: a server mishandled our Range request; discard and refetch.
 
@@ -58,6 +126,109 @@ class _BadRangeResponse(DownloadError):
         )
 
 
+class _RangeUnsupported(Exception):
+    """Internal: the server ignored the segmented probe's Range request."""
+
+
+class _FileChanged(Exception):
+    """Internal: the server's file no longer matches the bytes already held."""
+
+
+class CancelToken:
+    """Cooperative cancellation for ``download_to_file``; cancel from any thread.
+
+    The transfer checks it between chunks and before every retry, and a
+    backoff wait ends as soon as it's cancelled. ``cancel`` also shuts down
+    the sockets of the responses being read (``watching``), so a thread
+    blocked on a stalled connection wakes at once rather than after the read
+    timeout. The download then raises ``DownloadCancelled``.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._open = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            responses = list(self._open)
+        for resp in responses:
+            _abort(resp)
+
+    def check(self) -> None:
+        """Raise ``DownloadCancelled`` if cancelled."""
+        if self._event.is_set():
+            raise DownloadCancelled()
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to *seconds*; True (early) if cancelled meanwhile."""
+        return self._event.wait(seconds)
+
+    @contextmanager
+    def watching(self, resp):
+        """Abort *resp* if cancelled while the block runs (or already)."""
+        with self._lock:
+            self._open.add(resp)
+        try:
+            self.check()
+            yield resp
+        finally:
+            with self._lock:
+                self._open.discard(resp)
+
+
+def _abort(resp) -> None:
+    """Make a read blocked on *resp* in another thread return now.
+
+    Closing a response doesn't wake a thread blocked in ``recv``; shutting its
+    socket down does. Pooled responses do that themselves; for a plain
+    ``http.client`` one (``urllib``'s) the socket sits under ``fp``.
+    """
+    try:
+        if hasattr(resp, "abort"):
+            resp.abort()
+            return
+        sock = getattr(getattr(getattr(resp, "fp", None), "raw", None), "_sock", None)
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        else:
+            resp.close()
+    except OSError:
+        pass
+
+
+def _watch(cancel, resp):
+    return cancel.watching(resp) if cancel else nullcontext(resp)
+
+
+def _pause(seconds: float, cancel) -> None:
+    """Back off for *seconds*, cut short by *cancel*."""
+    if cancel:
+        cancel.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def _stop(cancel, partial, path: str) -> None:
+    """Raise ``DownloadCancelled`` if *cancel* fired, tidying up first.
+
+    A resumable download keeps its part file (and saves its sidecar) for the
+    next attempt to pick up; a plain one deletes the unfinished *path*.
+    """
+    if cancel is None or not cancel.cancelled:
+        return
+    if partial:
+        partial.save(force=True)
+    else:
+        _unlink(path)
+    raise DownloadCancelled()
+
+
 def _mb(n: int) -> str:
     """Format a byte count as a rounded decimal-MB string for messages."""
     return f"{n / 1_000_000:.0f} MB"
@@ -79,6 +250,479 @@ def _parse_content_range(resp) -> tuple:
         return None, None
 
 
+@dataclass(frozen=True)
+class TransferStats:
+    """A snapshot of a download, as passed to ``on_progress``."""
+
+    downloaded: int
+    total: int
+    bytes_per_sec: float  # over this call's transfer, resumed bytes excluded
+    retries: int  # failed attempts retried (any segment)
+    resumes: int  # requests that continued from a byte offset
+
+    @property
+    def fraction(self) -> float:
+        return self.downloaded / self.total if self.total else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """Seconds left at the current rate, or None before there's a rate."""
+        if not self.bytes_per_sec or not self.total:
+            return None
+        return max(0, self.total - self.downloaded) / self.bytes_per_sec
+
+
+class _Progress:
+    """Counts a download's bytes, retries and resumes; reports them coalesced.
+
+    Shared by a segmented download's workers. ``on_progress`` gets a
+    ``TransferStats`` no more than every ``_PROGRESS_INTERVAL`` seconds and
+    ``_PROGRESS_STEP`` of the file, so a caller that hops to the UI thread for
+    each report isn't woken per chunk.
+    """
+
+    def __init__(self, on_progress, total: int = 0, done: int = 0):
+        self.total = total
+        self.downloaded = done
+        self.retries = 0
+        self.resumes = 0
+        self.validator = None  # the server's, for the file being fetched
+        self._on_progress = on_progress
+        self._fetched = 0
+        self._started = time.monotonic()
+        self._reported_at = None
+        self._reported = 0
+        self._lock = threading.Lock()
+
+    def update(self, downloaded: int, total: int) -> None:
+        """Record a (single-stream) download's position."""
+        with self._lock:
+            self._fetched += max(0, downloaded - self.downloaded)
+            self.downloaded, self.total = downloaded, total
+            self._maybe_report()
+
+    def add(self, n: int) -> None:
+        """Record *n* more bytes (segmented downloads)."""
+        with self._lock:
+            self._fetched += n
+            self.downloaded += n
+            self._maybe_report()
+
+    def retried(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def resumed(self) -> None:
+        with self._lock:
+            self.resumes += 1
+
+    def stats(self) -> TransferStats:
+        elapsed = time.monotonic() - self._started
+        return TransferStats(
+            self.downloaded, self.total, self._fetched / elapsed if elapsed > 0 else 0.0,
+            self.retries, self.resumes,
+        )
+
+    def _maybe_report(self) -> None:
+        if not self._on_progress or not self.total:
+            return
+        now = time.monotonic()
+        if self.downloaded < self.total and self._reported_at is not None and (
+            now - self._reported_at < _PROGRESS_INTERVAL
+            or abs(self.downloaded - self._reported) < self.total * _PROGRESS_STEP
+        ):
+            return
+        if self.downloaded == self._reported == self.total:
+            return  # the end was reported already
+        self._reported_at, self._reported = now, self.downloaded
+        self._on_progress(self.stats())
+
+
+class _PooledResponse:
+    """A finished-headers response whose connection returns to the pool on close.
+
+    Quacks like the ``urlopen`` result the rest of this module expects
+    (``status``, ``headers``, ``read``, context manager).
+    """
+
+    def __init__(self, pool, key, conn, resp, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+        self._aborted = False
+
+    def read(self, amt=None):
+        return self._resp.read(amt)
+
+    def readinto(self, b):
+        return self._resp.readinto(b)
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+    def abort(self):
+        """Shut the socket down under a read in another thread (cancellation)."""
+        conn = self._conn
+        sock = conn.sock if conn is not None else None
+        self._aborted = True
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        # Only a fully-consumed response leaves the connection at a clean
+        # request boundary; anything else would hand the next caller the tail
+        # of this body.
+        if self._resp.isclosed() and not self._resp.will_close and not self._aborted:
+            self._pool._release(self._key, conn)
+        else:
+            self._resp.close()
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Reuse keep-alive HTTP/1.1 connections across requests to the same host.
+
+    ``urlopen`` is a drop-in for ``urllib.request.urlopen`` (same ``HTTPError`` /
+    ``URLError`` contract, redirects followed), so it can be passed anywhere this
+    module accepts an ``opener``. Thread-safe: concurrent callers each check out
+    their own connection, and at most *max_idle_per_host* are kept afterwards.
+
+    Non-HTTP schemes and proxied environments are delegated to ``urllib`` so
+    proxy settings keep working exactly as before.
+    """
+
+    def __init__(self, max_idle_per_host: int = 4):
+        self._max_idle = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl_context = None
+        self.connections_opened = 0
+
+    def urlopen(self, req, timeout=30):
+        if isinstance(req, str):
+            req = urllib.request.Request(req)
+        url = req.full_url
+        for _ in range(_MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or _uses_proxy(parts.scheme):
+                return urllib.request.urlopen(req, timeout=timeout)
+            resp = self._send(parts, req, timeout)
+            location = resp.headers.get("Location")
+            if resp.status in _REDIRECT_HTTP and location:
+                resp.read()
+                resp.close()
+                url = urljoin(url, location)
+                req = _redirected(req, url)
+                continue
+            if resp.status >= 400:
+                body = resp.read()
+                resp.close()
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, _Body(body))
+            return resp
+        raise HTTPError(url, resp.status, "Too many redirects", resp.headers, None)
+
+    def close(self) -> None:
+        """Close every idle connection (checked-out ones close on release)."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _send(self, parts, req, timeout):
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = {"User-Agent": _USER_AGENT}
+        headers.update(req.header_items())
+        method = req.get_method()
+        conn, reused = self._acquire(key, timeout)
+        try:
+            conn.request(method, path, body=req.data, headers=headers)
+            resp = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError,
+                BrokenPipeError) as e:
+            conn.close()
+            if not reused:
+                raise URLError(e) from e
+            # The server dropped an idle keep-alive connection; that says
+            # nothing about the request, so retry once on a fresh socket.
+            conn, _ = self._acquire(key, timeout, fresh=True)
+            try:
+                conn.request(method, path, body=req.data, headers=headers)
+                resp = conn.getresponse()
+            except OSError as e2:
+                conn.close()
+                raise URLError(e2) from e2
+        except OSError as e:
+            conn.close()
+            raise URLError(e) from e
+        return _PooledResponse(self, key, conn, resp, req.full_url)
+
+    def _acquire(self, key, timeout, fresh=False):
+        if not fresh:
+            with self._lock:
+                conns = self._idle.get(key)
+                conn = conns.pop() if conns else None
+            if conn is not None:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        scheme, host, port = key
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=timeout, context=self._ssl_context
+            )
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        with self._lock:
+            self.connections_opened += 1
+        return conn, False
+
+    def _release(self, key, conn):
+        if conn.sock is None:
+            return
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self._max_idle:
+                conns.append(conn)
+                return
+        conn.close()
+
+
+class _Body:
+    """File-like wrapper so an ``HTTPError`` raised by the pool stays readable."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self, *args):
+        data, self._data = self._data, b""
+        return data
+
+    def close(self):
+        pass
+
+
+def _uses_proxy(scheme: str) -> bool:
+    return scheme in urllib.request.getproxies()
+
+
+def _redirected(req, url):
+    """Copy *req* onto a redirect target, keeping its headers (e.g. Range)."""
+    return urllib.request.Request(url, headers=dict(req.header_items()))
+
+
+def _validator(headers):
+    """A strong ``ETag``, else ``Last-Modified``: what identifies this version of the file."""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+class _Partial:
+    """A resumable download's ``.part`` file and its JSON sidecar.
+
+    The sidecar (``<part>.json``) records the URL, the source the validator
+    came from (the URL itself or a mirror of it), the server's validator, the
+    full size and the byte ranges still missing. It's rewritten atomically at
+    most every ``_PARTIAL_SAVE_INTERVAL`` seconds, always after the bytes it
+    counts have been written, so after a crash the part file holds at least
+    what the sidecar says. Without a validator there's no telling whether the
+    server's file changed in between, so nothing is persisted.
+    """
+
+    def __init__(self, path: str, url: str):
+        self.path = path
+        self.url = url
+        self.source = url
+        self.validator = None
+        self.total = 0
+        self.ranges = []  # [[pos, end], ...] still to fetch
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def meta_path(self) -> str:
+        return self.path + ".json"
+
+    @classmethod
+    def load(cls, path: str, url: str) -> "_Partial":
+        """The sidecar's state for *url*, or a fresh one if it doesn't match."""
+        partial = cls(path, url)
+        try:
+            with open(partial.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            size = os.path.getsize(path)
+            ranges = [[int(pos), int(end)] for pos, end in meta["ranges"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return partial
+        if meta.get("url") != url or not meta.get("validator") or not ranges:
+            return partial
+        if size < max(pos for pos, _end in ranges) or ranges[-1][1] > meta.get("total", 0):
+            return partial
+        partial.source = meta.get("source", url)
+        partial.validator = meta["validator"]
+        partial.total = meta["total"]
+        partial.ranges = ranges
+        return partial
+
+    @property
+    def done(self) -> int:
+        return self.total - sum(end - pos for pos, end in self.ranges)
+
+    def start(self, total: int, validator, ranges: list, source: str | None = None) -> None:
+        """Begin a fresh transfer of *total* bytes as *ranges*, from *source*."""
+        with self._lock:
+            self.source = source or self.url
+            self.total = total
+            self.validator = validator
+            self.ranges = [list(r) for r in ranges]
+        self.save(force=True)
+
+    def advance(self, index: int, pos: int) -> None:
+        with self._lock:
+            self.ranges[index][0] = pos
+        self.save()
+
+    def save(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self.validator or (not force and now - self._saved_at < _PARTIAL_SAVE_INTERVAL):
+                return
+            self._saved_at = now
+            meta = {
+                "url": self.url,
+                "source": self.source,
+                "validator": self.validator,
+                "total": self.total,
+                "ranges": [r for r in self.ranges if r[0] < r[1]],
+            }
+            tmp = self.meta_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.meta_path)
+
+    def reset(self) -> None:
+        """Forget the recorded state (the server's file changed)."""
+        with self._lock:
+            self.total = 0
+            self.validator = None
+            self.ranges = []
+        _unlink(self.meta_path)
+
+    def finish(self, dest: str) -> None:
+        """Move the completed part file to *dest* and drop the sidecar."""
+        os.replace(self.path, dest)
+        _unlink(self.meta_path)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class _StreamHash:
+    """SHA-256 of a file that's being written, taken in order as the bytes land.
+
+    ``feed`` hashes a chunk straight from memory when it continues the hashed
+    prefix; ``catch_up`` reads bytes that were written out of order (or by an
+    earlier attempt) back from disk. Either way each byte is hashed once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pos = 0
+        self._sha = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def feed(self, pos: int, data: bytes) -> None:
+        with self._lock:
+            if pos == self.pos:
+                self._sha.update(data)
+                self.pos += len(data)
+
+    def catch_up(self, upto: int) -> None:
+        """Hash the file's bytes up to *upto*, which must be on disk already."""
+        with self._lock:
+            if self.pos >= upto:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self.pos)
+                while self.pos < upto:
+                    block = f.read(min(_HASH_READ, upto - self.pos))
+                    if not block:
+                        break
+                    self._sha.update(block)
+                    self.pos += len(block)
+
+    def check(self, expected: str, total: int) -> None:
+        """Raise ``ChecksumMismatchError`` unless the first *total* bytes hash to *expected*."""
+        self.catch_up(total)
+        actual = self._sha.hexdigest()
+        if actual != expected.lower():
+            raise ChecksumMismatchError(expected, actual)
+
+
+def cleanup_partials(directory: str, max_age_days: float = 14) -> None:
+    """Delete ``.part`` downloads (and sidecars) in *directory* untouched for *max_age_days*.
+
+    Sidecars whose part file is gone are removed regardless of age.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    cutoff = time.time() - max_age_days * 86400
+    for name in names:
+        path = os.path.join(directory, name)
+        if name.endswith(".part.json") and name[: -len(".json")] not in names:
+            _unlink(path)
+        elif name.endswith(".part"):
+            try:
+                stale = os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if stale:
+                _unlink(path)
+                _unlink(path + ".json")
+
+
 def download_to_file(
     url: str,
     dest: str,
@@ -87,9 +731,15 @@ def download_to_file(
     opener=urllib.request.urlopen,
     timeout: int = 120,
     chunk_size: int = 65536,
+    max_chunk_size: int = _MAX_CHUNK,
     max_stalls: int = 5,
     max_attempts: int = 30,
-) -> None:
+    segments: int = 1,
+    resumable: bool = False,
+    sha256: str | None = None,
+    sources: list | None = None,
+    cancel: CancelToken | None = None,
+) -> str | None:
     """Download *url* to *dest*, resuming partial transfers and verifying size.
 
     Streams the response to disk. If the connection drops before the advertised
@@ -102,68 +752,503 @@ def download_to_file(
     gives up only after *max_stalls* consecutive attempts make no progress, with
     *max_attempts* as an absolute backstop against pathological tiny-chunk loops.
 
+    With several *sources*, a stalled attempt (no progress, or a read timeout)
+    moves on to the next one, which resumes at the same byte offset; backoff
+    only starts once every source has stalled in turn.
+
     Args:
-        on_progress: optional ``callable(downloaded: int, total: int)`` invoked as
-            bytes arrive (only when the total size is known).
+        on_progress: optional ``callable(stats: TransferStats)`` invoked as bytes
+            arrive (only when the total size is known), coalesced to a few
+            calls a second; the final byte count is always reported.
         opener: a ``urlopen``-compatible callable, overridable for tests.
+        chunk_size / max_chunk_size: the receive buffer's smallest and largest
+            size; it adapts to the observed throughput in between (see
+            ``_receive``).
+        segments: with more than one, download up to this many byte ranges in
+            parallel (see ``_download_segmented``). Falls back to a single
+            stream when the server doesn't honour ``Range``.
+        resumable: download into ``dest + ".part"`` with a JSON sidecar (see
+            ``_Partial``), so a later call -- even in a new process -- picks up
+            where this one stopped, provided the server's file is unchanged.
+            *dest* only appears once complete.
+        sha256: expected hex digest of the file. The bytes are hashed as they
+            stream to disk (a resumed prefix is read back once), so checking
+            costs no second pass over the finished file.
+        sources: URLs serving the same file as *url* (mirrors, *url* itself),
+            tried in this order; defaults to ``[url]``. *url* still names the
+            file for a resumable partial. A validator only holds for the
+            server that sent it, so bytes resumed from another source are
+            matched on size alone -- pass *sha256* to catch a stale mirror.
+        cancel: a ``CancelToken`` that stops the transfer promptly, closing
+            its connections. A resumable download keeps its part file for the
+            next call; otherwise the unfinished *dest* is deleted.
+
+    Returns:
+        The server's validator for the file (strong ``ETag``, else
+        ``Last-Modified``), or None, including when the last response came
+        from a mirror; callers caching the file revalidate *url* with it.
 
     Raises:
+        DownloadCancelled: *cancel* was cancelled.
         IncompleteDownloadError: the file stayed short of ``Content-Length``.
+        ChecksumMismatchError: the file's SHA-256 isn't *sha256*; the download
+            (and any partial) is deleted so the next try starts clean.
         HTTPError: a non-retryable HTTP status (e.g. 404).
         URLError / OSError: a persistent connection failure.
     """
-    downloaded = total = stalls = attempts = 0
+    partial = _Partial.load(dest + ".part", url) if resumable else None
+    path = partial.path if partial else dest
+    progress = _Progress(on_progress)
+    sources = list(sources or [url])
+
+    if segments > 1:
+        try:
+            digest, total = _download_segmented(
+                url, path, segments, partial, progress, opener=opener,
+                timeout=timeout, chunk_size=chunk_size, max_chunk_size=max_chunk_size,
+                max_stalls=max_stalls, max_attempts=max_attempts, hashed=bool(sha256),
+                sources=sources, cancel=cancel,
+            )
+        except _RangeUnsupported:
+            pass
+        except _FileChanged:
+            # Replaced mid-download: start over, as one stream from scratch.
+            if partial:
+                partial.reset()
+        except DownloadCancelled:
+            _stop(cancel, partial, path)
+            raise
+        else:
+            _finish(path, dest, partial, digest, sha256, total)
+            return progress.validator
+
+    downloaded = total = stalls = attempts = current = 0
     last_err = None
+    # The validator of the bytes we hold, and the source that sent it.
+    validator, validator_source = None, url
+    if partial and partial.ranges:
+        # Carry on from the first missing byte; everything before it is
+        # here. (A segmented transfer's later ranges are simply fetched again.)
+        downloaded, total = min(pos for pos, _end in partial.ranges), partial.total
+        validator, validator_source = partial.validator, partial.source
+        if len(partial.ranges) > 1:
+            partial.start(total, validator, [[downloaded, total]], validator_source)
+    # Bytes already on disk (or counted by a segmented attempt that fell
+    # through) aren't part of this transfer's rate.
+    progress.downloaded, progress.total = downloaded, total
+    if validator_source == url:
+        progress.validator = validator
+    digest = None
 
     while True:
+        _stop(cancel, partial, path)
         attempts += 1
         before = downloaded
+        timed_out = missing = False
+        source = sources[current]
         try:
-            req = urllib.request.Request(url)
+            req = urllib.request.Request(source)
             if downloaded:
                 req.add_header("Range", f"bytes={downloaded}-")
-            with opener(req, timeout=timeout) as resp:
-                status = getattr(resp, "status", 200)
+                if validator and source == validator_source:
+                    # A changed file comes back whole (200), not as a tail.
+                    req.add_header("If-Range", validator)
+            with opener(req, timeout=timeout) as resp, _watch(cancel, resp):
+                status = getattr(resp, "status", None) or 200  # file:// has none
+                sent = _validator(resp.headers)
                 if downloaded and status == 206:
                     start, full = _parse_content_range(resp)
-                    if start != downloaded or not full:
-                        # Server didn't honour our offset; appending its body
-                        # onto our prefix would corrupt the file. Drop what we
-                        # have and let the next attempt refetch from scratch.
+                    # Only for a server that ignored If-Range.
+                    changed = source == validator_source and validator not in (None, sent)
+                    if start != downloaded or not full or (total and full != total) or changed:
+                        # Server didn't honour our offset, or the file changed
+                        # since the part we hold; appending its body onto our
+                        # prefix would corrupt the file. Drop what we have and
+                        # let the next attempt refetch from scratch.
                         downloaded = 0
+                        if partial:
+                            partial.reset()
                         raise _BadRangeResponse()
-                    total, mode = full, "ab"
+                    total = full
+                    progress.resumed()
                 else:
-                    # First attempt, or the server ignored Range (status 200).
-                    downloaded, mode = 0, "wb"
+                    # First attempt, the file changed (If-Range), or the server
+                    # ignored Range: either way this is the whole file.
+                    downloaded = progress.downloaded = 0
                     total = int(resp.headers.get("Content-Length", 0))
-                with open(dest, mode) as f:
-                    while True:
-                        chunk = resp.read(chunk_size)
-                        if not chunk:
-                            break
+                    validator, validator_source = sent, source
+                    if partial:
+                        partial.start(total, sent, [[0, total]], source)
+                progress.validator = sent if source == url else None
+                if sha256 and (digest is None or digest.pos > downloaded):
+                    digest = _StreamHash(path)
+                if digest:
+                    digest.catch_up(downloaded)
+                with open(path, "r+b" if downloaded else "wb") as f:
+                    # Bytes past the resume point may predate the last save.
+                    f.seek(downloaded)
+                    f.truncate()
+                    for chunk in _receive(resp, chunk_size, max_chunk_size):
+                        if cancel:
+                            cancel.check()
                         f.write(chunk)
+                        if digest:
+                            digest.feed(downloaded, chunk)
                         downloaded += len(chunk)
-                        if on_progress and total:
-                            on_progress(downloaded, total)
+                        if partial and total:
+                            f.flush()
+                            partial.advance(0, downloaded)
+                        progress.update(downloaded, total)
             if total and downloaded != total:
                 raise IncompleteDownloadError(downloaded, total)
-            return
+            _finish(path, dest, partial, digest, sha256, downloaded)
+            return progress.validator
+        except DownloadCancelled:
+            pass                    # tidied up below, with the file closed
         except HTTPError as e:
             if e.code not in _RETRYABLE_HTTP:
-                raise               # 404/403/416/... are deterministic
+                if len(sources) == 1:
+                    raise           # 404/403/416/... are deterministic
+                missing = True      # ...but another source may have the file
             last_err = e
         except (URLError, OSError, http.client.IncompleteRead,
                 IncompleteDownloadError, _BadRangeResponse) as e:
             last_err = e
+            timed_out = _timed_out(e)
+        if partial:
+            partial.save(force=True)
+        _stop(cancel, partial, path)
 
         # Any forward progress resets the stall counter and skips backoff, so a
         # choppy-but-advancing transfer isn't throttled.
         stalls = 0 if downloaded > before else stalls + 1
-        if stalls >= max_stalls or attempts >= max_attempts:
+        if stalls >= max_stalls * len(sources) or attempts >= max_attempts:
             raise last_err
-        if stalls:
-            time.sleep(min(2 ** stalls, 8))
+        progress.retried()
+        if missing:
+            del sources[current]
+            current %= len(sources)
+        elif stalls or timed_out:
+            current = (current + 1) % len(sources)
+        if stalls and not missing and stalls % len(sources) == 0:
+            _pause(min(2 ** (stalls // len(sources)), 8), cancel)
+
+
+def _timed_out(e: BaseException) -> bool:
+    """Whether *e* is a connect/read timeout (bare, or wrapped in ``URLError``)."""
+    return isinstance(e, TimeoutError) or isinstance(getattr(e, "reason", None), TimeoutError)
+
+
+def _receive(resp, size: int, max_size: int, limit: int | None = None):
+    """Yield *resp*'s body as views of one reused buffer, up to *limit* bytes.
+
+    Reads with ``readinto`` where the response has it (``read`` otherwise), so
+    the steady state allocates nothing per chunk. The read size starts at
+    *size* and doubles, to at most *max_size*, while reads fill it in under
+    half of ``_CHUNK_TARGET``; it halves again (not below *size*) when a read
+    takes more than twice that. The buffer only ever grows, a handful of
+    times. Each view is only valid until the next one is requested.
+    """
+    floor = size
+    buf = memoryview(bytearray(size))
+    readinto = getattr(resp, "readinto", None)
+    while limit is None or limit > 0:
+        want = size if limit is None else min(size, limit)
+        started = time.monotonic()
+        if readinto:
+            n = readinto(buf[:want])
+            chunk = buf[:n]
+        else:
+            chunk = resp.read(want)
+            n = len(chunk)
+        if not n:
+            return
+        took = time.monotonic() - started
+        yield chunk
+        if limit is not None:
+            limit -= n
+        if n == want and took < _CHUNK_TARGET / 2 and size < max_size:
+            size = min(size * 2, max_size)
+            if size > len(buf):
+                buf = memoryview(bytearray(size))
+        elif took > _CHUNK_TARGET * 2 and size > floor:
+            size = max(size // 2, floor)
+
+
+def _finish(path, dest, partial, digest, sha256, total) -> None:
+    """Check the finished download's digest, then move it into place."""
+    if sha256:
+        try:
+            digest.check(sha256, total)
+        except ChecksumMismatchError:
+            if partial:
+                partial.reset()
+            _unlink(path)
+            raise
+    if partial:
+        partial.finish(dest)
+
+
+class _SegmentProgress:
+    """State shared by a segmented download's workers.
+
+    Counts bytes into *transfer* (a ``_Progress``). With a *digest*, also keeps
+    it hashing the file's complete prefix: chunks that extend it are hashed
+    from memory, and once a segment's range is done the next segment's bytes
+    so far are read back from disk.
+    """
+
+    def __init__(self, transfer, partial=None, ranges=(), digest=None, cancel=None):
+        self.transfer = transfer
+        self.total = transfer.total
+        self.cancelled = False
+        self.cancel = cancel
+        self.if_range = (None, None)  # (source, validator) that segments resume against
+        self.digest = digest
+        self._partial = partial
+        self._ranges = [list(r) for r in ranges]  # [[pos, end], ...] per worker
+        self._lock = threading.Lock()
+
+    def _prefix(self) -> int:
+        """End of the file's complete prefix (bytes outside the ranges are done)."""
+        for pos, end in sorted(self._ranges):
+            if pos < end:
+                return pos
+        return self.total
+
+    @property
+    def stopped(self) -> bool:
+        """A segment failed, or the caller cancelled: workers should return."""
+        return self.cancelled or (self.cancel is not None and self.cancel.cancelled)
+
+    def position(self, index: int) -> int:
+        """How far segment *index* has got (its bytes are written and counted)."""
+        with self._lock:
+            return self._ranges[index][0]
+
+    def advance(self, index: int, pos: int, chunk: bytes) -> None:
+        if self._partial:
+            self._partial.advance(index, pos)
+        if self.digest:
+            self.digest.feed(pos - len(chunk), chunk)
+        with self._lock:
+            self._ranges[index][0] = pos
+            prefix = self._prefix()
+        self.transfer.add(len(chunk))
+        if self.digest:
+            self.digest.catch_up(prefix)
+
+
+def _write_range(resp, dest, index, pos, end, chunk_sizes, progress) -> int:
+    """Copy *resp* into *dest* at *pos*, stopping at *end*; returns the new offset."""
+    with open(dest, "r+b") as f:
+        f.seek(pos)
+        for chunk in _receive(resp, *chunk_sizes, limit=end - pos):
+            if progress.stopped:
+                break
+            f.write(chunk)
+            f.flush()
+            pos += len(chunk)
+            progress.advance(index, pos, chunk)
+    return pos
+
+
+def _download_segment(
+    sources, dest, index, start, end, first_resp, progress, *,
+    opener, timeout, chunk_sizes, max_stalls, max_attempts,
+) -> None:
+    """Fill ``[start, end)`` of *dest*, with the same retry rules as a whole file.
+
+    *first_resp*, if given, is an open response from ``sources[0]`` already
+    positioned at *start*. A stall moves on to the next of *sources*, as in
+    ``download_to_file``; a source answering with an unusable range (e.g. a
+    ``file://`` mirror, which ignores ``Range``) counts as stalled.
+    """
+    pos, stalls, attempts, current = start, 0, 0, 0
+    sources = list(sources)
+    last_err = None
+    resp = first_resp
+    while pos < end and not progress.stopped:
+        attempts += 1
+        before = pos
+        timed_out = missing = False
+        try:
+            if resp is None:
+                if attempts > 1:
+                    progress.transfer.resumed()
+                req = urllib.request.Request(sources[current])
+                req.add_header("Range", f"bytes={pos}-{end - 1}")
+                if_range = progress.if_range[1] if progress.if_range[0] == sources[current] else None
+                if if_range:
+                    req.add_header("If-Range", if_range)
+                with opener(req, timeout=timeout) as resp, _watch(progress.cancel, resp):
+                    got, total = _parse_content_range(resp)
+                    status = getattr(resp, "status", None)
+                    if if_range and (status == 200 or _validator(resp.headers) != if_range):
+                        raise _FileChanged()
+                    if status != 206 or got != pos or total != progress.total:
+                        raise _BadRangeResponse()
+                    pos = _write_range(resp, dest, index, pos, end, chunk_sizes, progress)
+            else:
+                pos = _write_range(resp, dest, index, pos, end, chunk_sizes, progress)
+        except HTTPError as e:
+            if e.code not in _RETRYABLE_HTTP:
+                if len(sources) == 1:
+                    raise
+                missing = True
+            last_err = e
+        except (URLError, OSError, http.client.IncompleteRead, _BadRangeResponse,
+                DownloadCancelled) as e:
+            last_err = e
+            timed_out = _timed_out(e)
+        finally:
+            resp = None
+            # A failed read still wrote (and counted) the chunks before it.
+            pos = progress.position(index)
+        if pos >= end or progress.stopped:
+            return
+        stalls = 0 if pos > before else stalls + 1
+        if stalls >= max_stalls * len(sources) or attempts >= max_attempts:
+            raise last_err or IncompleteDownloadError(progress.transfer.downloaded, progress.total)
+        progress.transfer.retried()
+        if missing:
+            del sources[current]
+            current %= len(sources)
+        elif stalls or timed_out:
+            current = (current + 1) % len(sources)
+        if stalls and not missing and stalls % len(sources) == 0:
+            _pause(min(2 ** (stalls // len(sources)), 8), progress.cancel)
+
+
+def _open_probe(url, start, *, opener, timeout, if_range=None):
+    """``GET`` *url* from *start* onwards; ``(resp, total)`` if it's a usable 206.
+
+    Raises ``_RangeUnsupported`` otherwise, and on transient failures, which
+    the single-stream path retries. With an *if_range* validator, a 200 means
+    the file changed and raises ``_FileChanged``.
+    """
+    req = urllib.request.Request(url)
+    req.add_header("Range", f"bytes={start}-")
+    if if_range:
+        req.add_header("If-Range", if_range)
+    try:
+        resp = opener(req, timeout=timeout)
+    except HTTPError as e:
+        if e.code not in _RETRYABLE_HTTP:
+            raise
+        raise _RangeUnsupported() from e
+    except (URLError, OSError) as e:
+        raise _RangeUnsupported() from e
+    got, total = _parse_content_range(resp)
+    if getattr(resp, "status", 200) != 206 or got != start or not total:
+        resp.close()
+        if if_range and getattr(resp, "status", 200) == 200:
+            raise _FileChanged()
+        raise _RangeUnsupported()
+    if if_range and _validator(resp.headers) != if_range:
+        resp.close()
+        raise _FileChanged()  # a server that ignores If-Range
+    return resp, total
+
+
+def _download_segmented(
+    url, dest, segments, partial, transfer, *, opener, timeout, chunk_size,
+    max_chunk_size, max_stalls, max_attempts, hashed=False, sources=None, cancel=None,
+):
+    """Download *url* as up to *segments* byte ranges fetched in parallel.
+
+    The first request asks for ``bytes=0-``: its ``Content-Range`` gives the
+    size, and its body serves as the first segment, so splitting costs no
+    extra round trip. *dest* is preallocated and every other segment writes
+    its own range. Raises ``_RangeUnsupported`` (before writing anything) if
+    the server doesn't answer with a usable 206, or if that first request
+    fails outright, leaving the caller's single-stream path to retry it.
+
+    With a loaded *partial*, the missing ranges it records are fetched
+    instead, the first request starting at the first of them; if the server's
+    validator or size no longer match, it starts over. Bytes, retries and
+    resumes are counted into *transfer* (a ``_Progress``).
+
+    The first request goes to ``sources[0]`` (default *url*); segments fail
+    over along *sources* independently (see ``_download_segment``). *cancel*
+    stops every segment (see ``download_to_file``).
+
+    Returns ``(digest, total)``: with *hashed*, a ``_StreamHash`` that has
+    followed the file's complete prefix, else None.
+    """
+    sources = list(sources or [url])
+    source = sources[0]
+    resp = None
+    try:
+        if partial and partial.ranges:
+            if_range = partial.validator if partial.source == source else None
+            try:
+                resp, total = _open_probe(source, partial.ranges[0][0], opener=opener,
+                                          timeout=timeout, if_range=if_range)
+            except _FileChanged:
+                partial.reset()
+            else:
+                if total != partial.total:
+                    resp.close()
+                    resp = None
+                    partial.reset()
+        resumed = resp is not None
+        if not resumed:
+            resp, total = _open_probe(source, 0, opener=opener, timeout=timeout)
+    except HTTPError as e:
+        if len(sources) == 1:
+            raise
+        # E.g. a 404 from the preferred mirror: the single-stream path skips it.
+        raise _RangeUnsupported() from e
+    if resumed:
+        ranges = partial.ranges
+        transfer.resumed()
+    else:
+        count = max(1, min(segments, total // _MIN_SEGMENT))
+        ranges = [[total * k // count, total * (k + 1) // count] for k in range(count)]
+        with open(dest, "wb") as f:
+            f.truncate(total)
+        if partial:
+            partial.start(total, _validator(resp.headers), ranges, source)
+    validator = partial.validator if resumed else _validator(resp.headers)
+    transfer.validator = validator if source == url else None
+    transfer.total = total
+    transfer.downloaded = total - sum(end - pos for pos, end in ranges)
+    digest = _StreamHash(dest) if hashed else None
+    progress = _SegmentProgress(transfer, partial, ranges, digest, cancel)
+    if not resumed or partial.source == source:
+        progress.if_range = (source, validator)
+    if digest:
+        digest.catch_up(progress._prefix())
+    with resp, _watch(cancel, resp):
+        options = dict(
+            opener=opener, timeout=timeout, chunk_sizes=(chunk_size, max_chunk_size),
+            max_stalls=max_stalls, max_attempts=max_attempts,
+        )
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(
+                    _download_segment, sources, dest, k, pos, end, resp if k == 0 else None,
+                    progress, **options,
+                )
+                for k, (pos, end) in enumerate(ranges)
+                if pos < end
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Stop the other segments at their next chunk.
+                progress.cancelled = True
+                raise
+            finally:
+                if partial:
+                    partial.save(force=True)
+    if cancel:
+        cancel.check()
+    if transfer.downloaded != total:
+        raise IncompleteDownloadError(transfer.downloaded, total)
+    return digest, total
 
 
 def verify_zip(path: str) -> None:
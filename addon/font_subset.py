@@ -0,0 +1,129 @@
+"""Subset the note type's large CJK fonts to the characters a collection uses.
+
+Optional: needs fontTools with brotli (for WOFF2). Neither ships with Anki, so
+``available()`` is False on most installs and the add-on keeps the full fonts.
+
+Subsets are built from the full fonts (kept outside the media folder by the
+caller) and cached under one directory, named by the font's SHA-256 and a hash
+of the glyph set they cover. Only characters the font can actually render
+count towards that hash, so notes full of emoji or Latin accents don't cause
+rebuilds of an identical subset.
+
+Pure Python; no Anki imports.
+"""
+
+import hashlib
+import io
+import logging
+import os
+
+try:
+    from fontTools import subset as _subset
+    from fontTools.ttLib import TTFont, woff2 as _woff2
+except ImportError:  # optional dependency
+    _subset = None
+
+# Always kept, whatever the notes contain: the card UI, furigana and
+# punctuation render from these fonts too.
+BASE_CHARS = "".join(
+    chr(c)
+    for lo, hi in (
+        (0x20, 0x7E),  # ASCII
+        (0x3000, 0x303F),  # CJK symbols and punctuation
+        (0x3040, 0x30FF),  # hiragana, katakana
+        (0xFF00, 0xFFEF),  # half/fullwidth forms
+    )
+    for c in range(lo, hi + 1)
+)
+
+
+def available() -> bool:
+    """Whether fontTools (with WOFF2 support) can be imported."""
+    return _subset is not None and _woff2.haveBrotli
+
+
+def glyph_set(texts) -> set[str]:
+    """Every character in *texts*, plus ``BASE_CHARS``; control characters dropped."""
+    chars = set(BASE_CHARS)
+    for text in texts:
+        chars.update(text)
+    return {c for c in chars if c >= " "}
+
+
+class SubsetCache:
+    """Subsets built so far, as ``<font>-<glyph set hash>.woff2`` under *directory*.
+
+    Each full font's character coverage is cached alongside, so the cache key
+    for a glyph set can be computed without loading the font.
+    """
+
+    def __init__(self, directory: str):
+        self._dir = directory
+
+    def coverage(self, font_path: str, font_sha: str) -> set[str]:
+        """Characters *font_path* (whose SHA-256 is *font_sha*) has glyphs for."""
+        path = os.path.join(self._dir, f"coverage-{font_sha[:16]}.txt")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return set(f.read())
+        except OSError:
+            pass
+        font = TTFont(font_path, lazy=True)
+        chars = "".join(sorted(chr(c) for c in font.getBestCmap()))
+        font.close()
+        os.makedirs(self._dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(chars)
+        return set(chars)
+
+    def path(self, name: str, font_sha: str, chars: set[str], coverage: set[str]) -> str:
+        """Cache path of *name*'s subset for the covered part of *chars*."""
+        covered = "".join(sorted(chars & coverage))
+        key = hashlib.sha256(f"{font_sha}\n{covered}".encode("utf-8")).hexdigest()[:16]
+        stem = os.path.splitext(name)[0].lstrip("_")
+        return os.path.join(self._dir, f"{stem}-{key}.woff2")
+
+    def build(self, name: str, font_path: str, font_sha: str, chars: set[str]) -> str:
+        """Path of a WOFF2 subset of *font_path* for *chars*, built if not cached.
+
+        Slow (seconds to tens of seconds for a large CJK font); call it off
+        the main thread.
+        """
+        coverage = self.coverage(font_path, font_sha)
+        path = self.path(name, font_sha, chars, coverage)
+        if os.path.exists(path):
+            return path
+        options = _subset.Options()
+        options.flavor = "woff2"
+        options.layout_features = ["*"]  # vert/vrt2 for tategaki, ruby, palt
+        options.name_IDs = ["*"]
+        options.name_languages = ["*"]
+        options.notdef_outline = True
+        font = TTFont(font_path)
+        logging.getLogger("fontTools.subset").setLevel(logging.ERROR)
+        subsetter = _subset.Subsetter(options)
+        subsetter.populate(text="".join(sorted(chars & coverage)))
+        subsetter.subset(font)
+        font.flavor = "woff2"
+        out = io.BytesIO()
+        font.save(out)
+        font.close()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(out.getvalue())
+        os.replace(tmp, path)
+        return path
+
+    def prune(self, keep: set[str]) -> None:
+        """Delete cached subsets whose paths aren't in *keep* (coverage stays)."""
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self._dir, name)
+            if name.endswith(".woff2") and path not in keep:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
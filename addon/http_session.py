@@ -0,0 +1,189 @@
+"""One HTTP session for the add-on's downloads.
+
+The note type install, the Kaishi installer and ``downloader.download_to_file``
+used to each build their own ``urllib`` requests, with their own timeouts and
+a fresh TCP + TLS handshake per file. ``Session`` owns what they share: a
+keep-alive ``ConnectionPool``, a default timeout, the retry policy for small
+requests and gzip for text. ``shared()`` is the add-on wide instance, so a
+Kaishi migrate's ``cards.tsv``, manifests and zip (and a note type refresh
+before it) reuse the same connections.
+
+``Session.urlopen`` is opener-compatible, so it can be passed wherever an
+``opener`` is accepted, and ``Session(opener=...)`` swaps the network out for
+tests.
+
+With ``mirrors`` set (see ``mirrors.py``), ``fetch`` fails over from one
+source of a URL to the next, and ``sources`` gives large downloads the same
+list, ranked by a probe.
+
+Pure module; no Anki imports.
+"""
+
+import gzip
+import http.client
+import threading
+import time
+import urllib.request
+import zlib
+from typing import NamedTuple
+from urllib.error import HTTPError, URLError
+
+from . import mirrors as mirror_list
+from .downloader import _RETRYABLE_HTTP, ConnectionPool
+
+_DEFAULT_TIMEOUT = 30
+_RANK_TTL = 600.0  # seconds a mirror ranking is trusted
+
+
+class Fetched(NamedTuple):
+    """A completed small request: ``status`` 304 carries an empty ``body``."""
+
+    status: int
+    headers: object
+    body: bytes
+
+
+class Session:
+    """Pooled connections plus timeout, retry and gzip defaults.
+
+    Args:
+        opener: a ``urlopen``-compatible callable to use instead of a pool.
+        timeout: seconds, for requests that don't pass their own.
+        retries: extra attempts ``fetch`` makes after a transient failure
+            (connection error, timeout, 429/5xx), backing off 1 s, 2 s, ...
+        gzip: ask for gzip on ``fetch`` requests and decode it.
+        max_idle_per_host: keep-alive connections kept per host.
+        mirrors: ``{upstream prefix: [mirror prefix, ...]}``; see ``mirrors.py``.
+    """
+
+    def __init__(self, *, opener=None, timeout: float = _DEFAULT_TIMEOUT, retries: int = 2,
+                 gzip: bool = True, max_idle_per_host: int = 4, mirrors=None):
+        self._pool = None if opener else ConnectionPool(max_idle_per_host=max_idle_per_host)
+        self._opener = opener or self._pool.urlopen
+        self.timeout = timeout
+        self.retries = retries
+        self.gzip = gzip
+        self.mirrors = dict(mirrors or {})
+        self._ranked = {}  # (prefix, mirrors) -> (monotonic time, candidate order)
+        self._lock = threading.Lock()
+
+    def sources(self, url: str, *, probe: bool = False) -> list[str]:
+        """Where to fetch *url* from, most preferred first.
+
+        Its configured mirrors then *url* itself, reordered fastest first by
+        the last ranking of that mirror set (kept for ``_RANK_TTL``). With
+        *probe*, a missing or stale ranking is redone first.
+        """
+        urls = mirror_list.candidates(url, self.mirrors)
+        if len(urls) < 2:
+            return urls
+        prefix = mirror_list._prefix(url, self.mirrors)
+        key = (prefix, tuple(self.mirrors[prefix]))
+        with self._lock:
+            when, order = self._ranked.get(key, (None, None))
+        if order is None or time.monotonic() - when > _RANK_TTL:
+            if not probe:
+                return urls
+            ranked = mirror_list.rank(urls, self.urlopen)
+            order = [urls.index(u) for u in ranked]
+            with self._lock:
+                self._ranked[key] = (time.monotonic(), order)
+        return [urls[i] for i in order]
+
+    def urlopen(self, req, timeout=None):
+        """Open *req* (a URL or ``Request``) over the pool; a drop-in ``opener``.
+
+        No retries or content coding here: callers streaming large bodies
+        (``download_to_file``) have their own resume logic and count bytes.
+        """
+        if isinstance(req, str):
+            req = urllib.request.Request(req)
+        return self._opener(req, timeout=self.timeout if timeout is None else timeout)
+
+    def fetch(self, url: str, *, headers=None, timeout=None) -> Fetched:
+        """GET *url* into memory, retrying transient failures.
+
+        A 304 (conditional *headers*) comes back as a result, not an error;
+        other HTTP errors raise ``HTTPError`` as ``urlopen`` would. With
+        mirrors, each round tries every source in ``sources`` order before
+        backing off, and a source answering 404 (or similar) is dropped.
+        """
+        headers = dict(headers or {})
+        if self.gzip:
+            headers.setdefault("Accept-Encoding", "gzip")
+        sources = self.sources(url)
+        attempt = 0
+        while True:
+            for source in list(sources):
+                try:
+                    return self._fetch_one(source, headers, timeout)
+                except HTTPError as e:
+                    if e.code not in _RETRYABLE_HTTP:
+                        if len(sources) == 1:
+                            raise
+                        sources.remove(source)
+                    last_err = e
+                except (URLError, OSError, http.client.IncompleteRead) as e:
+                    last_err = e
+            if attempt >= self.retries:
+                raise last_err
+            attempt += 1
+            time.sleep(2 ** (attempt - 1))
+
+    def _fetch_one(self, url: str, headers: dict, timeout) -> Fetched:
+        try:
+            with self.urlopen(urllib.request.Request(url, headers=headers), timeout) as resp:
+                status = getattr(resp, "status", None) or 200  # file:// has none
+                body = resp.read()
+                resp_headers = resp.headers
+        except HTTPError as e:
+            # urllib proper raises on 304; the pooled opener returns it.
+            if e.code == 304:
+                return Fetched(304, e.headers, b"")
+            raise
+        if status == 304:
+            return Fetched(304, resp_headers, b"")
+        encoding = (resp_headers.get("Content-Encoding") or "").lower()
+        if encoding in ("gzip", "x-gzip"):
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError, zlib.error) as e:
+                raise URLError(f"bad gzip body from {url}: {e}") from e
+        return Fetched(status, resp_headers, body)
+
+    def get(self, url: str, *, timeout=None) -> bytes:
+        """*url*'s body (see ``fetch``)."""
+        return self.fetch(url, timeout=timeout).body
+
+    def close(self) -> None:
+        """Close idle pooled connections; the session stays usable."""
+        if self._pool:
+            self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared() -> Session:
+    """The add-on wide ``Session``, created on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Session()
+        return _shared
+
+
+def configured(config: dict) -> Session:
+    """``shared()``, with the ``mirrors`` from the add-on's *config* applied."""
+    session = shared()
+    mirrors = config.get("mirrors")
+    session.mirrors = dict(mirrors) if isinstance(mirrors, dict) else {}
+    return session
@@ -1,22 +1,29 @@
 """Install or migrate the Kaishi 1.5k deck for the MvJ note type."""
 
 import csv
+import http.client
 import io
 import json
 import os
 import re
-import tempfile
-import urllib.request
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError, URLError
 
 from aqt import mw
 from aqt.qt import QMessageBox
 from aqt.utils import showInfo, showWarning
 
+from . import http_session, remote_zip, zip_extract
+from .download_cache import DownloadCache
 from .downloader import (
+    CancelToken,
     CorruptDownloadError,
+    DownloadCancelled,
     DownloadError,
+    IncompleteDownloadError,
+    TransferStats,
+    cleanup_partials,
     download_to_file,
     verify_zip,
 )
@@ -26,6 +33,8 @@ from .notetype import NOTE_TYPE_NAME, _OLD_NOTE_TYPE_NAMES
 # Constants
 # ---------------------------------------------------------------------------
 
+# The ``mirrors`` config key can serve any URL below from elsewhere (a LAN
+# box, a shared folder); see mirrors.py.
 _KAISHI_RAW_BASE = (
     "https://raw.githubusercontent.com/"
     "mattvsjapan/mvj-notetype/main/kaishi/"
@@ -33,12 +42,32 @@ _KAISHI_RAW_BASE = (
 _CARDS_TSV_URL = _KAISHI_RAW_BASE + "cards.tsv"
 _FULL_MEDIA_MANIFEST_URL = _KAISHI_RAW_BASE + "media-manifest.json"
 _DEF_AUDIO_MANIFEST_URL = _KAISHI_RAW_BASE + "def-audio-manifest.json"
+# zip name → SHA-256 of the release zips (kaishi/build_manifests.py).
+_ZIP_DIGESTS_URL = _KAISHI_RAW_BASE + "zip-digests.json"
 _RELEASE_BASE = (
     "https://github.com/mattvsjapan/mvj-notetype/"
     "releases/download/kaishi-media-v2/"
 )
 _FULL_MEDIA_ZIP_URL = _RELEASE_BASE + "kaishi-media-full-v2.zip"
+# Parallel byte-range connections for the media zip; some links throttle each
+# connection, and GitHub's release CDN serves ranges.
+_DOWNLOAD_SEGMENTS = 4
 _DEF_AUDIO_ZIP_URL = _RELEASE_BASE + "kaishi-def-audio-v2.zip"
+# Missing media is fetched member by member (remote_zip.py) while that comes
+# to at most this fraction of the zip; past it, the whole zip downloads, with
+# segments and a resumable part file, and lands in the cache for other profiles.
+_MEMBER_FETCH_MAX = 0.5
+# Notes per query when Migrate scans the collection (_scan_sentence_keys,
+# _reviewed_note_ids).
+_SCAN_BATCH = 5000
+# Zips download here as ``<name>.part`` and resume from there after a dropped
+# connection or an Anki restart; user_files survives add-on updates.
+_DOWNLOAD_DIR = os.path.join(os.path.dirname(__file__), "user_files", "downloads")
+# Content-addressed cache shared by every profile (see download_cache.py);
+# capped by the ``download_cache_mb`` config key (400 MB, room for both Kaishi
+# zips), 0 turning it off.
+_CACHE_DIR = os.path.join(os.path.dirname(__file__), "user_files", "cache")
+_cache = None
 
 _DECK_NAME = "MvJ Kaishi 1.5k"
 _EXISTING_DECK_NAMES = ["Kaishi 1.5k", "MvJ Kaishi 1.5k"]
@@ -150,10 +179,29 @@ def _build_key_index(rows: list[dict]) -> dict[str, dict]:
     return index
 
 
+def _download_cache() -> DownloadCache | None:
+    """The cross-profile download cache, or None if ``download_cache_mb`` is 0."""
+    global _cache
+    config = mw.addonManager.getConfig(__name__) or {}
+    max_bytes = int(config.get("download_cache_mb", 400)) * 1_000_000
+    if max_bytes <= 0:
+        return None
+    if _cache is None:
+        _cache = DownloadCache(_CACHE_DIR, max_bytes)
+    _cache.max_bytes = max_bytes
+    return _cache
+
+
+def _session() -> http_session.Session:
+    """The add-on wide session, with the configured ``mirrors``."""
+    return http_session.configured(mw.addonManager.getConfig(__name__) or {})
+
+
 def _download_bytes(url: str) -> bytes:
-    req = urllib.request.Request(url)
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return resp.read()
+    cache = _download_cache()
+    if cache:
+        return cache.get(_session(), url)
+    return _session().get(url)
 
 
 def _fetch_manifest(url: str) -> dict:
@@ -161,20 +209,97 @@ def _fetch_manifest(url: str) -> dict:
     return json.loads(_download_bytes(url).decode("utf-8"))
 
 
-def _download_with_progress(url: str, dest: str, label: str) -> None:
+def _zip_digest(name: str) -> str | None:
+    """Published SHA-256 of release zip *name*, or None if there isn't one."""
+    try:
+        return _fetch_manifest(_ZIP_DIGESTS_URL).get(name)
+    except (HTTPError, URLError, OSError, ValueError) as e:
+        print(f"[MvJ] No checksum for {name}: {e}")
+        return None
+
+
+def _progress_label(label: str, stats: TransferStats) -> str:
+    """E.g. ``Downloading media (42%, 3.1 MB/s, 1:05 left)...``."""
+    parts = [f"{int(stats.fraction * 100)}%"]
+    if stats.bytes_per_sec:
+        parts.append(f"{stats.bytes_per_sec / 1_000_000:.1f} MB/s")
+    if stats.eta is not None:
+        minutes, seconds = divmod(int(stats.eta), 60)
+        parts.append(f"{minutes}:{seconds:02d} left")
+    if stats.retries:
+        parts.append(f"{stats.retries} reconnect{'s' if stats.retries > 1 else ''}")
+    return f"{label} ({', '.join(parts)})..."
+
+
+def _download_with_progress(
+    url: str, dest: str, label: str, sha256: str | None = None, cancel: CancelToken | None = None,
+) -> str | None:
     """Download a large file with progress updates (call from background thread).
 
     Delegates to downloader.download_to_file, which verifies the byte count,
     resumes interrupted transfers via HTTP Range, and retries -- so a dropped
     connection no longer leaves a truncated file masquerading as a complete one.
+    Large files arrive as ``_DOWNLOAD_SEGMENTS`` parallel ranges, and what has
+    arrived is kept in ``<dest>.part`` for the next attempt to resume. With
+    *sha256*, the bytes are hashed as they arrive and checked at the end.
+    Configured mirrors are probed and the fastest tried first, failing over
+    to the others (and *url*) mid-transfer if it stalls. *cancel* stops it,
+    keeping the ``.part``.
+    Returns the server's validator for the file.
     """
-    def on_progress(downloaded: int, total: int) -> None:
-        pct = downloaded * 100 // total
-        mw.taskman.run_on_main(
-            lambda p=pct, l=label: mw.progress.update(label=f"{l} ({p}%)...")
-        )
+    session = _session()
+    sources = session.sources(url, probe=True)
+    if sources[0] != url:
+        print(f"[MvJ] Downloading {url.rsplit('/', 1)[-1]} from {sources[0]}")
+    return download_to_file(
+        url, dest, on_progress=_progress_reporter(label, cancel), opener=session.urlopen,
+        segments=_DOWNLOAD_SEGMENTS, resumable=True, sha256=sha256, sources=sources,
+        cancel=cancel,
+    )
+
+
+def _progress_reporter(label: str, cancel: CancelToken | None):
+    """An ``on_progress`` for the downloader that updates the progress dialog."""
+    def on_progress(stats: TransferStats) -> None:
+        # The downloader coalesces these to a few a second.
+        text = _progress_label(label, stats)
+        mw.taskman.run_on_main(lambda t=text: mw.progress.update(label=t))
+
+    return on_progress
+
 
-    download_to_file(url, dest, on_progress=on_progress)
+def _start_cancellable_progress(label: str) -> tuple[CancelToken, object]:
+    """``mw.progress.start`` for a download the user can cancel.
+
+    Anki's progress dialog has no button of its own, so a Cancel button is
+    added under the label; it cancels the returned token. Esc (or closing
+    the dialog) is recorded as ``want_cancel``, which a timer forwards to the
+    token as well. Stop the timer (the second value) once the task is done.
+    """
+    from aqt.qt import QPushButton
+
+    dialog = mw.progress.start(label=label, parent=mw)
+    cancel = CancelToken()
+    button = None
+    if dialog is not None and dialog.layout() is not None:
+        button = QPushButton("Cancel", dialog)
+        dialog.layout().addWidget(button)
+
+    def on_cancel():
+        cancel.cancel()
+        if button is not None:
+            button.setEnabled(False)
+            button.setText("Cancelling...")
+
+    if button is not None:
+        button.clicked.connect(on_cancel)
+
+    def poll():
+        if mw.progress.want_cancel() and not cancel.cancelled:
+            on_cancel()
+
+    timer = mw.progress.timer(200, poll, True, requiresCollection=False, parent=mw)
+    return cancel, timer
 
 
 def _fix_zip_filename(name: str) -> str:
@@ -185,42 +310,81 @@ def _fix_zip_filename(name: str) -> str:
         return name
 
 
-def _extract_zip_to_media(zip_path: str) -> int:
-    """Extract all files from a zip into Anki's media folder. Returns count."""
-    media_dir = mw.col.media.dir()
-    count = 0
-    with zipfile.ZipFile(zip_path) as zf:
-        for info in zf.infolist():
-            if info.is_dir():
-                continue
-            name = _fix_zip_filename(os.path.basename(info.filename))
-            if not name:
-                continue
-            with zf.open(info) as src, open(os.path.join(media_dir, name), "wb") as dst:
-                dst.write(src.read())
-            count += 1
-    return count
+def _extract_zip_to_media(zip_path: str, manifest: dict,
+                          cancel: CancelToken | None = None) -> int:
+    """Extract the media *manifest* lists but the media folder lacks. Returns count.
 
+    Files already present are left alone, and each extracted one is checked
+    against its manifest SHA-256 as it streams (``zip_extract.DigestMismatch``,
+    a ``BadZipFile``, if not). Members are renamed into place once complete
+    and verified, so a re-run after an interrupted extraction picks up only
+    what is still missing (see zip_extract.py).
+    """
+    missing = {name: manifest[name] for name in _missing_media(manifest)}
+    if not missing:
+        return 0
+    return zip_extract.extract_flat(
+        zip_path, mw.col.media.dir(),
+        name_for=lambda member: _fix_zip_filename(os.path.basename(member)),
+        digests=missing,
+        cancel=cancel,
+    )
 
-def _get_sentence_field(note, model) -> str | None:
-    """Get the sentence text from a note for matching.
 
-    Prefers 'Sentence Furigana' (community Kaishi has this field).
-    Falls back to 'Sentence'.
+def _sentence_field_ords(model) -> list[int]:
+    """Indexes of the fields a note's sentence is read from, best first.
+
+    Prefers 'Sentence Furigana' (community Kaishi has this field), falling
+    back to 'Sentence'; ``_scan_sentence_keys`` takes the first non-empty one.
     """
-    for fld in model["flds"]:
-        name = fld["name"]
-        if "furigana" in name.lower() and "sentence" in name.lower():
-            try:
-                val = note[name]
-                if val:
-                    return val
-            except KeyError:
-                pass
-    try:
-        return note["Sentence"]
-    except KeyError:
-        return None
+    names = [fld["name"] for fld in model["flds"]]
+    ords = [i for i, name in enumerate(names)
+            if "furigana" in name.lower() and "sentence" in name.lower()]
+    return ords + [i for i, name in enumerate(names) if name == "Sentence"]
+
+
+def _scan_sentence_keys(models: list[dict], batch: int = _SCAN_BATCH):
+    """Yield ``(nid, mid, key)`` for every note of *models*; *key* is None without a sentence.
+
+    Reads ``id, flds`` straight from the notes table, one note type at a
+    time in pages of *batch*, each starting after the last id seen: the
+    ``(mid, id)`` index serves every page without a sort, memory stays flat
+    however big the collection, and no Note objects are built. The sentence
+    field is resolved once per note type.
+    """
+    for model in models:
+        mid = model["id"]
+        ords = _sentence_field_ords(model)
+        last = -1
+        while True:
+            rows = mw.col.db.all(
+                "select id, flds from notes where mid = ? and id > ? order by id limit ?",
+                mid, last, batch,
+            )
+            for nid, flds in rows:
+                fields = flds.split("\x1f")
+                sentence = next(
+                    (fields[i] for i in ords if i < len(fields) and fields[i]), None
+                )
+                yield nid, mid, _normalize_key(sentence) if sentence else None
+            if len(rows) < batch:
+                break
+            last = rows[-1][0]
+
+
+def _reviewed_note_ids(nids: list[int], batch: int = _SCAN_BATCH) -> set[int]:
+    """Those of *nids* with a card that isn't new (``type`` above 0).
+
+    One grouped query over the cards table per *batch* of ids; no Card
+    objects are loaded.
+    """
+    reviewed = set()
+    for i in range(0, len(nids), batch):
+        ids = ",".join(str(int(nid)) for nid in nids[i:i + batch])
+        reviewed.update(mw.col.db.list(
+            f"select nid from cards where nid in ({ids}) group by nid having max(type) > 0"
+        ))
+    return reviewed
 
 
 def _find_kaishi_note_types() -> list[str]:
@@ -303,31 +467,107 @@ def _missing_media(manifest: dict) -> list[str]:
     ]
 
 
-def _download_and_extract_zip(url: str, label: str) -> int:
-    """Download a zip to a temp file, extract to media dir, clean up."""
-    tmp = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
-    tmp_path = tmp.name
-    tmp.close()
+def _extract_missing_members(url: str, label: str, manifest: dict,
+                             cancel: CancelToken | None = None) -> int | None:
+    """Fetch and extract only the missing *manifest* media from the zip at *url*.
+
+    Reads the zip's directory by HTTP Range and downloads just the missing
+    members' bytes (see remote_zip.py). Returns the count extracted, or None
+    to download the whole zip instead: the server ignores Range, the missing
+    files add up to more than ``_MEMBER_FETCH_MAX`` of it, or the fetch
+    failed (the full download has the mirror failover and the part file).
+    """
+    missing = {n: manifest[n] for n in _missing_media(manifest)}
+    if not missing:
+        return 0
+    name = url.rsplit("/", 1)[-1]
+    session = _session()
+    source = session.sources(url, probe=True)[0]
+    path = os.path.join(_DOWNLOAD_DIR, name + ".members")
+    try:
+        archive = remote_zip.RemoteZip(source, opener=session.urlopen, cancel=cancel)
+        wanted = [m for m in archive.members
+                  if _fix_zip_filename(os.path.basename(m.filename)) in missing]
+        size = remote_zip.transfer_size(wanted)
+        if size > archive.size * _MEMBER_FETCH_MAX:
+            return None
+        print(f"[MvJ] Fetching {len(wanted)} files ({size:,} bytes) of {name}")
+        os.makedirs(_DOWNLOAD_DIR, exist_ok=True)
+        archive.fetch(wanted, path, on_progress=_progress_reporter(label, cancel))
+        mw.taskman.run_on_main(
+            lambda: mw.progress.update(label="Extracting files...")
+        )
+        return _extract_zip_to_media(path, manifest, cancel)
+    except (remote_zip.Unsupported, URLError, OSError, http.client.HTTPException,
+            IncompleteDownloadError, zipfile.BadZipFile) as e:
+        print(f"[MvJ] Fetching members of {name} failed ({e}); downloading all of it")
+        return None
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _download_and_extract_zip(url: str, label: str, manifest: dict,
+                              cancel: CancelToken | None = None) -> int:
+    """Extract a zip's missing *manifest* media, from the download cache or downloaded.
+
+    The cached copy is used when its SHA-256 is the published one, or (with
+    no published digest) when the server answers 304 for it. Otherwise the
+    zip downloads into ``_DOWNLOAD_DIR``, where an unfinished download stays
+    behind as ``<name>.part`` for the next attempt to resume, even after a
+    restart; once extracted, it moves into the cache for other profiles.
+    When only a few files are missing, just those are fetched, by byte range
+    (``_extract_missing_members``). *cancel* stops the download or the extraction (``DownloadCancelled``).
+    """
+    name = url.rsplit("/", 1)[-1]
+    sha256 = _zip_digest(name)
+    cache = _download_cache()
+    cached = None
+    if cache:
+        if sha256:
+            cached = cache.find(sha256)
+        else:
+            cached = cache.revalidate(_session().urlopen, url)
+    if cached:
+        print(f"[MvJ] Using cached {name}")
+        zip_path, validator = cached, None
+    else:
+        count = _extract_missing_members(url, label, manifest, cancel)
+        if count is not None:
+            return count
+        os.makedirs(_DOWNLOAD_DIR, exist_ok=True)
+        cleanup_partials(_DOWNLOAD_DIR)
+        zip_path = os.path.join(_DOWNLOAD_DIR, name)
     try:
-        _download_with_progress(url, tmp_path, label)
-        verify_zip(tmp_path)
+        if not cached:
+            validator = _download_with_progress(url, zip_path, label, sha256, cancel)
+        verify_zip(zip_path)
         mw.taskman.run_on_main(
             lambda: mw.progress.update(label="Extracting files...")
         )
         try:
-            return _extract_zip_to_media(tmp_path)
+            count = _extract_zip_to_media(zip_path, manifest, cancel)
         except zipfile.BadZipFile as e:
+            if cached:
+                cache.remove(os.path.basename(cached))
             # is_zipfile() passed but a member is corrupt (bad CRC / data) —
             # surface the same actionable message as a truncated download.
             raise CorruptDownloadError(
                 "The downloaded media file is corrupted (failed to extract). "
                 "Please try again."
             ) from e
+        if cache and not cached:
+            cache.put_file(url, zip_path, validator, sha256)
+        return count
     finally:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
+        # Only a finished, uncached zip; a .part is what the next attempt resumes.
+        if not cached:
+            try:
+                os.unlink(zip_path)
+            except OSError:
+                pass
 
 
 # ---------------------------------------------------------------------------
@@ -388,25 +628,35 @@ def run_install() -> None:
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        _start_install_download(deck_name, missing)
+        _start_install_download(deck_name, manifest if missing else None)
 
     mw.taskman.run_in_background(precheck_task, on_precheck)
 
 
-def _start_install_download(deck_name: str, missing: list[str]) -> None:
-    mw.progress.start(label="Downloading card data...", parent=mw)
+def _start_install_download(deck_name: str, manifest: dict | None) -> None:
+    cancel, timer = _start_cancellable_progress("Downloading card data...")
 
     def task():
-        tsv_data = _download_bytes(_CARDS_TSV_URL)
-        rows = _parse_cards_tsv(tsv_data)
-        if missing:
-            _download_and_extract_zip(_FULL_MEDIA_ZIP_URL, "Downloading media")
+        # cards.tsv arrives while the media zip downloads.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            tsv = executor.submit(_download_bytes, _CARDS_TSV_URL)
+            if manifest:
+                _download_and_extract_zip(
+                    _FULL_MEDIA_ZIP_URL, "Downloading media", manifest, cancel
+                )
+            rows = _parse_cards_tsv(tsv.result())
+        cancel.check()
         return rows
 
     def on_done(future):
+        timer.stop()
         mw.progress.finish()
         try:
             rows = future.result()
+        except DownloadCancelled:
+            showInfo("Download cancelled; nothing was installed. The media downloaded "
+                     "so far is kept, so installing again resumes from there.")
+            return
         except HTTPError as e:
             showWarning(f"Download failed: HTTP {e.code}")
             return
@@ -486,47 +736,20 @@ def run_migrate() -> None:
         skipped = 0
         total_scanned = 0
 
-        for type_name in kaishi_types:
-            model = mw.col.models.by_name(type_name)
-            if not model:
-                continue
-            note_ids = mw.col.find_notes(f'"note:{type_name}"')
-            for nid in note_ids:
-                total_scanned += 1
-                note = mw.col.get_note(nid)
-                sentence = _get_sentence_field(note, model)
-                if not sentence:
-                    skipped += 1
-                    continue
-                key = _normalize_key(sentence)
-                if key in key_index:
-                    matched[nid] = (key_index[key], model["id"])
-                else:
-                    skipped += 1
-
+        models = [m for m in map(mw.col.models.by_name, kaishi_types) if m]
         # Also scan existing 🇯🇵 MvJ notes for content updates
         mvj = mw.col.models.by_name(NOTE_TYPE_NAME)
         if mvj:
-            mvj_nids = mw.col.find_notes(f'"note:{NOTE_TYPE_NAME}"')
-            for nid in mvj_nids:
-                total_scanned += 1
-                note = mw.col.get_note(nid)
-                sentence = _get_sentence_field(note, mvj)
-                if not sentence:
-                    skipped += 1
-                    continue
-                key = _normalize_key(sentence)
-                if key in key_index:
-                    matched[nid] = (key_index[key], mvj["id"])
-                else:
-                    skipped += 1
+            models.append(mvj)
+        for nid, mid, key in _scan_sentence_keys(models):
+            total_scanned += 1
+            if key is not None and key in key_index:
+                matched[nid] = (key_index[key], mid)
+            else:
+                skipped += 1
 
         # Partition by card state so the user can choose new-only
-        new_nids = set()
-        for nid in matched:
-            cards = mw.col.get_note(nid).cards()
-            if all(c.type == 0 for c in cards):
-                new_nids.add(nid)
+        new_nids = set(matched) - _reviewed_note_ids(list(matched))
 
         return (matched, skipped, total_scanned, new_nids,
                 full_manifest, def_audio_manifest)
@@ -558,14 +781,17 @@ def run_migrate() -> None:
         ]
         if non_def_audio_missing:
             download_url = _FULL_MEDIA_ZIP_URL
+            download_manifest = full_manifest
             download_label = "Downloading media"
             download_size_msg = "Download ~200 MB of media"
         elif missing_full:
             download_url = _DEF_AUDIO_ZIP_URL
+            download_manifest = def_audio_manifest
             download_label = "Downloading definition audio"
             download_size_msg = "Download ~100 MB of definition audio"
         else:
             download_url = None
+            download_manifest = None
             download_label = ""
             download_size_msg = ""
 
@@ -633,7 +859,7 @@ def run_migrate() -> None:
             if reply != QMessageBox.StandardButton.Yes:
                 return
 
-        _start_migrate_download(matched, download_url, download_label)
+        _start_migrate_download(matched, download_url, download_manifest, download_label)
 
     mw.taskman.run_in_background(scan_task, on_scan_done)
 
@@ -641,22 +867,30 @@ def run_migrate() -> None:
 def _start_migrate_download(
     matched: dict,
     download_url: str | None,
+    download_manifest: dict | None,
     download_label: str,
 ) -> None:
     """Phase 2: download any missing media, then apply migration."""
-    mw.progress.start(
-        label=f"{download_label}..." if download_url else "Migrating...",
-        parent=mw,
+    cancel, timer = _start_cancellable_progress(
+        f"{download_label}..." if download_url else "Migrating..."
     )
 
     def download_task():
         if download_url:
-            _download_and_extract_zip(download_url, download_label)
+            _download_and_extract_zip(
+                download_url, download_label, download_manifest, cancel
+            )
+        cancel.check()
 
     def on_download_done(future):
+        timer.stop()
         mw.progress.finish()
         try:
             future.result()
+        except DownloadCancelled:
+            showInfo("Download cancelled; nothing was migrated. The media downloaded "
+                     "so far is kept, so migrating again resumes from there.")
+            return
         except HTTPError as e:
             showWarning(f"Download failed: HTTP {e.code}")
             return
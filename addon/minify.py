@@ -0,0 +1,324 @@
+"""Dependency-free, conservative minifier for the note type templates.
+
+Strips comments and layout whitespace from the card HTML, its inline
+``<script>`` blocks and the note type CSS at install time. It only removes
+what can't change behaviour:
+
+  * JS: comments go; whitespace collapses to nothing, one space, or one
+    newline. A line break is kept wherever automatic semicolon insertion
+    could depend on it. Strings, template literals and regex literals are
+    copied verbatim. Identifiers are never renamed.
+  * CSS: comments go and whitespace collapses. Whitespace next to
+    ``{ } ; ,`` is dropped; the single space after ``:`` is kept because
+    custom property values are read back by the card scripts. Strings and
+    ``url(...)`` are copied verbatim, and so is any region matched by *keep*
+    (the user's ``⚙ SETTINGS`` block).
+  * HTML: line indentation and blank lines go, so rendering doesn't change
+    (no template element uses ``white-space: pre``); ``<script>`` and
+    ``<style>`` contents go through the minifiers above.
+
+Pure Python; no Anki imports.
+"""
+
+import re
+from typing import Iterator, NamedTuple
+
+
+class Token(NamedTuple):
+    kind: str  # space, comment, string, template, regex, name, number, punct
+    text: str
+
+
+class TokenizeError(ValueError):
+    """The JS couldn't be lexed (unterminated literal or comment)."""
+
+
+# Longest first, so the greedy match picks "===" over "==" over "=".
+_PUNCTUATORS = sorted(
+    """>>>= ... === !== **= <<= >>= >>> &&= ||= ??= => == != <= >= && || ??
+    ++ -- += -= *= %= &= |= ^= ** << >>""".split(),
+    key=len,
+    reverse=True,
+)
+_REGEX_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+}
+_NAME_RE = re.compile(r"[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*")
+_NUMBER_RE = re.compile(r"\.?\d(?:[eE][+-]\d|[\w.])*")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _regex_allowed(prev: Token | None, prev_name_is_property: bool) -> bool:
+    """Whether a ``/`` after *prev* starts a regex literal rather than a division."""
+    if prev is None:
+        return True
+    if prev.kind == "punct":
+        return prev.text not in (")", "]", "++", "--")
+    if prev.kind == "name":
+        return not prev_name_is_property and prev.text in _REGEX_KEYWORDS
+    return False
+
+
+def tokenize_js(js: str) -> Iterator[Token]:
+    """Lex *js* into tokens whose texts concatenate back to *js*.
+
+    Not a parser: regex literals are told apart from division by the
+    previous token, the usual heuristic. Template literals come out as one
+    token, substitutions included. Raises ``TokenizeError`` on an
+    unterminated string, comment, regex or template literal.
+    """
+    i, n = 0, len(js)
+    prev: Token | None = None  # previous significant token
+    property_name = False  # prev is a name right after "." / "?."
+    while i < n:
+        c = js[i]
+        if c.isspace():
+            m = _SPACE_RE.match(js, i)
+            yield Token("space", m.group())
+            i = m.end()
+            continue
+        if js.startswith("//", i):
+            end = js.find("\n", i)
+            end = n if end < 0 else end
+            yield Token("comment", js[i:end])
+            i = end
+            continue
+        if js.startswith("/*", i):
+            end = js.find("*/", i + 2)
+            if end < 0:
+                raise TokenizeError("unterminated comment")
+            yield Token("comment", js[i : end + 2])
+            i = end + 2
+            continue
+        if c in "'\"":
+            j = i + 1
+            while j < n and js[j] != c:
+                if js[j] == "\n":
+                    raise TokenizeError("unterminated string")
+                j += 2 if js[j] == "\\" else 1
+            if j >= n:
+                raise TokenizeError("unterminated string")
+            tok = Token("string", js[i : j + 1])
+            i = j + 1
+        elif c == "`":
+            j = _skip_template(js, i + 1)
+            tok = Token("template", js[i:j])
+            i = j
+        elif c == "/" and _regex_allowed(prev, property_name):
+            j, in_class = i + 1, False
+            while j < n:
+                ch = js[j]
+                if ch == "\\":
+                    j += 2
+                    continue
+                if ch == "\n":
+                    raise TokenizeError("unterminated regex")
+                if ch == "[":
+                    in_class = True
+                elif ch == "]":
+                    in_class = False
+                elif ch == "/" and not in_class:
+                    break
+                j += 1
+            if j >= n:
+                raise TokenizeError("unterminated regex")
+            m = _NAME_RE.match(js, j + 1)
+            j = m.end() if m else j + 1
+            tok = Token("regex", js[i:j])
+            i = j
+        elif (m := _NAME_RE.match(js, i)) is not None:
+            tok = Token("name", m.group())
+            i = m.end()
+        elif (m := _NUMBER_RE.match(js, i)) is not None:
+            tok = Token("number", m.group())
+            i = m.end()
+        else:
+            text = c
+            for p in _PUNCTUATORS:
+                if js.startswith(p, i):
+                    text = p
+                    break
+            if js.startswith("?.", i) and not js[i + 2 : i + 3].isdigit():
+                text = "?."
+            tok = Token("punct", text)
+            i += len(text)
+        property_name = tok.kind == "name" and prev is not None and prev.text in (".", "?.")
+        prev = tok
+        yield tok
+
+
+def _skip_template(js: str, i: int) -> int:
+    """Index just past the template literal whose body starts at *i*."""
+    n = len(js)
+    while i < n:
+        c = js[i]
+        if c == "\\":
+            i += 2
+        elif c == "`":
+            return i + 1
+        elif js.startswith("${", i):
+            i = _skip_substitution(js, i + 2)
+        else:
+            i += 1
+    raise TokenizeError("unterminated template literal")
+
+
+def _skip_substitution(js: str, i: int) -> int:
+    """Index just past the ``}`` closing a ``${`` whose code starts at *i*."""
+    depth = 0
+    pos = i
+    for tok in tokenize_js(js[i:]):
+        if tok.kind == "punct" and tok.text == "{":
+            depth += 1
+        elif tok.kind == "punct" and tok.text == "}":
+            if depth == 0:
+                return pos + 1
+            depth -= 1
+        pos += len(tok.text)
+    raise TokenizeError("unterminated template substitution")
+
+
+# --------------------------------------------------------------------------- #
+# JS
+# --------------------------------------------------------------------------- #
+
+# After one of these (or before one of the closers), a line break can't be
+# where automatic semicolon insertion happens, so it can go.
+_CONTINUES_AFTER = {
+    "{", "(", "[", ",", ";", ":", "?", "?.", ".", "=>", "...",
+    "=", "==", "===", "!=", "!==", "<", ">", "<=", ">=", "+", "-", "*", "/",
+    "%", "**", "&", "|", "^", "!", "~", "&&", "||", "??", "<<", ">>", ">>>",
+    "+=", "-=", "*=", "/=", "%=", "**=", "&=", "|=", "^=", "<<=", ">>=",
+    ">>>=", "&&=", "||=", "??=",
+}
+_CONTINUES_BEFORE = {"}", ")", "]", ",", ";", ".", "?.", ":", "?", "="}
+# Pairs that would lex differently if glued together.
+_GLUE_HAZARDS = {("+", "+"), ("-", "-"), ("/", "/"), ("/", "*"), ("<", "!"), ("-", ">")}
+
+
+def _word_char(c: str) -> bool:
+    return c.isalnum() or c in "_$" or ord(c) > 0x7F
+
+
+def _needs_space(a: Token, b: Token) -> bool:
+    x, y = a.text[-1], b.text[0]
+    if _word_char(x) and _word_char(y):
+        return True
+    if a.kind == "regex" and _word_char(y):
+        return True  # would read as more flags
+    if a.kind == "number" and y == ".":
+        return True
+    if x == "." and b.kind == "number":
+        return True
+    return (x, y) in _GLUE_HAZARDS
+
+
+def minify_js(js: str) -> str:
+    """*js* without comments and layout whitespace; see the module docstring."""
+    out: list[str] = []
+    prev: Token | None = None
+    gap = ""  # "" (tokens were adjacent), " " or "\n"
+    for tok in tokenize_js(js):
+        if tok.kind in ("space", "comment"):
+            if "\n" in tok.text:
+                gap = "\n"
+            elif not gap:
+                gap = " "
+            continue
+        if prev is not None and gap:
+            if gap == "\n" and not (
+                (prev.kind == "punct" and prev.text in _CONTINUES_AFTER)
+                or (tok.kind == "punct" and tok.text in _CONTINUES_BEFORE)
+            ):
+                out.append("\n")
+            elif _needs_space(prev, tok):
+                out.append(" ")
+        out.append(tok.text)
+        prev, gap = tok, ""
+    return "".join(out)
+
+
+# --------------------------------------------------------------------------- #
+# CSS
+# --------------------------------------------------------------------------- #
+
+_CSS_TOKEN_RE = re.compile(
+    r"""
+      (?P<comment>/\*.*?\*/)
+    | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<url>url\(\s*[^"'\s)][^)]*\))
+    | (?P<space>\s+)
+    | (?P<other>[^\s"'/u]+|.)
+    """,
+    re.DOTALL | re.VERBOSE | re.IGNORECASE,
+)
+_CSS_TIGHT = set("{};,")
+
+
+def _minify_css_part(css: str) -> str:
+    out: list[str] = []
+    gap = False
+    for m in _CSS_TOKEN_RE.finditer(css):
+        kind = m.lastgroup
+        if kind in ("comment", "space"):
+            gap = True
+            continue
+        text = m.group()
+        if gap and out and out[-1][-1] not in _CSS_TIGHT and text[0] not in _CSS_TIGHT:
+            out.append(" ")
+        if text[0] == "}" and out and out[-1].endswith(";"):
+            out[-1] = out[-1][:-1]  # last declaration needs no ";"
+            if not out[-1]:
+                out.pop()
+        out.append(text)
+        gap = False
+    return "".join(out)
+
+
+def minify_css(css: str, keep: re.Pattern | None = None) -> str:
+    """*css* without comments and layout whitespace; regions matching *keep*
+    are left byte-for-byte as they are."""
+    if keep is None:
+        return _minify_css_part(css)
+    out, pos = [], 0
+    for m in keep.finditer(css):
+        out.append(_minify_css_part(css[pos : m.start()]))
+        out.append("\n" + m.group() + "\n")
+        pos = m.end()
+    out.append(_minify_css_part(css[pos:]))
+    return "".join(out).strip("\n") + "\n"
+
+
+# --------------------------------------------------------------------------- #
+# HTML
+# --------------------------------------------------------------------------- #
+
+_RAW_RE = re.compile(r"(<(script|style)\b[^>]*>)(.*?)(</\2>)", re.DOTALL | re.IGNORECASE)
+_HTML_COMMENT_RE = re.compile(r"<!--(?!\[).*?-->", re.DOTALL)
+
+
+def _minify_markup(html: str) -> str:
+    html = _HTML_COMMENT_RE.sub("", html)
+    html = re.sub(r"\s*\n\s*", "\n", html)
+    return re.sub(r"[ \t]{2,}", " ", html)
+
+
+def minify_html(html: str) -> str:
+    """*html* without indentation, blank lines and comments, its inline
+    scripts and styles minified. A script that can't be lexed is kept as is."""
+    out, pos = [], 0
+    for m in _RAW_RE.finditer(html):
+        out.append(_minify_markup(html[pos : m.start()]))
+        open_tag, tag, body, close_tag = m.group(1, 2, 3, 4)
+        if tag.lower() == "style":
+            body = _minify_css_part(body)
+        elif open_tag.lower() == "<script>":
+            try:
+                body = minify_js(body)
+            except TokenizeError:
+                pass
+        out.append(open_tag + body + close_tag)
+        pos = m.end()
+    out.append(_minify_markup(html[pos:]))
+    return "".join(out).strip() + "\n"
@@ -0,0 +1,87 @@
+"""Mirrors for the add-on's downloads, ranked by a quick probe.
+
+The ``mirrors`` config maps an upstream URL prefix to the prefixes of other
+places serving the same files, in order of preference, e.g.::
+
+    "mirrors": {
+        "https://github.com/mattvsjapan/mvj-notetype/releases/download/": [
+            "http://nas.local/mvj/releases/",
+            "file:///Volumes/Shared/mvj/releases/"
+        ]
+    }
+
+so a classroom or a slow connection can serve the Kaishi zips (or the note
+type files under ``raw.githubusercontent.com``) from a LAN box or a shared
+folder. A URL under a configured prefix is tried at each mirror and then at
+the upstream URL itself (``candidates``). ``rank`` times a small ranged GET
+against each candidate in parallel and puts the fastest first; the
+``Session`` remembers the ranking for a while, and ``download_to_file`` fails
+over along it when a source stalls.
+
+Pure module; no Anki imports.
+"""
+
+import http.client
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+
+_PROBE_BYTES = 128 * 1024
+_PROBE_TIMEOUT = 5.0
+
+
+def _prefix(url: str, mirrors: dict) -> str | None:
+    """The longest configured prefix *url* starts with, or None."""
+    matches = [p for p in mirrors if p and url.startswith(p)]
+    return max(matches, key=len) if matches else None
+
+
+def candidates(url: str, mirrors: dict) -> list[str]:
+    """*url* at each of its configured mirrors, in order, then *url* itself."""
+    prefix = _prefix(url, mirrors)
+    if prefix is None:
+        return [url]
+    rest = url[len(prefix):]
+    urls = [m + rest if m.endswith("/") or not rest else f"{m}/{rest}"
+            for m in mirrors[prefix] if isinstance(m, str) and m]
+    return list(dict.fromkeys(urls + [url]))
+
+
+def probe(url: str, opener, *, sample: int = _PROBE_BYTES,
+          timeout: float = _PROBE_TIMEOUT) -> float | None:
+    """Seconds taken to receive the first *sample* bytes of *url*, or None.
+
+    The time covers connecting and the first response bytes as well as the
+    transfer, so it ranks a nearby slow link against a distant fast one
+    the way a real download would. None means the source failed.
+    """
+    started = time.monotonic()
+    req = urllib.request.Request(url, headers={"Range": f"bytes=0-{sample - 1}"})
+    try:
+        with opener(req, timeout=timeout) as resp:
+            if (getattr(resp, "status", None) or 200) not in (200, 206):
+                return None
+            got = 0
+            while got < sample:
+                data = resp.read(min(65536, sample - got))
+                if not data:
+                    break
+                got += len(data)
+    except (URLError, OSError, ValueError, http.client.HTTPException):
+        return None
+    return time.monotonic() - started
+
+
+def rank(urls: list[str], opener, **probe_options) -> list[str]:
+    """*urls* fastest first by ``probe``, probed in parallel.
+
+    Sources that failed the probe keep their relative order at the end:
+    a hiccup during the probe shouldn't rule one out altogether.
+    """
+    if len(urls) < 2:
+        return list(urls)
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        times = list(executor.map(lambda u: probe(u, opener, **probe_options), urls))
+    order = sorted(range(len(urls)), key=lambda i: (times[i] is None, times[i] or 0.0, i))
+    return [urls[i] for i in order]
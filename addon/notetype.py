@@ -1,14 +1,24 @@
 """Download and install/update the 🇯🇵 MvJ note type from GitHub."""
 
+import hashlib
+import json
 import os
 import re
+import shutil
 import sys
-import urllib.request
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.error import HTTPError, URLError
 
 from aqt import mw
 from aqt.utils import showWarning
 
+from . import font_subset, http_session
+from .card_runtime import RUNTIME_FILE, extract_runtime, parse_runtime, referenced_blocks, render_runtime
+from .css_compile import compile_css
+from .http_session import Session
+from .minify import minify_css, minify_html
+
 NOTE_TYPE_NAME = "\U0001f1ef\U0001f1f5 MvJ"
 _OLD_NOTE_TYPE_NAMES = ["\U0001f1ef\U0001f1f5 MvJ Listening", "MvJ Listening"]
 
@@ -16,6 +26,9 @@ _BASE_URL = (
     "https://raw.githubusercontent.com/"
     "mattvsjapan/mvj-notetype/main/note-types/mvj/"
 )
+# Copy of the templates bundled by package_addon.sh, so a first install
+# needn't wait for GitHub.
+_SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "snapshot")
 _TEMPLATE_FILES = ["front.html", "back.html", "css.css"]
 _FONT_FILES = [
     "_pitch_num.woff2",
@@ -24,6 +37,29 @@ _FONT_FILES = [
     "_noto-serif-jp.woff2",
     "_yukyokasho-bold.woff2",
 ]
+# user_files survives add-on updates.
+_USER_FILES_DIR = os.path.join(os.path.dirname(__file__), "user_files")
+# Last downloaded templates + their HTTP validators, so "Update to Newest
+# Version" can send a conditional GET.
+_TEMPLATE_CACHE_DIR = os.path.join(_USER_FILES_DIR, "template_cache")
+# Font manifest (filename -> size + sha256), fetched and cached with the
+# templates; see note-types/mvj/build_font_manifest.py.
+_FONT_MANIFEST = "font-manifest.json"
+# Per media folder: {font: [size, mtime_ns, sha256]} as of its last successful
+# verification, so unchanged fonts are never re-hashed.
+_FONT_STATE_PATH = os.path.join(_USER_FILES_DIR, "font_state.json")
+# With "subset_fonts" on (and fontTools available), these large CJK fonts go
+# into the media folder subset to the characters the collection uses; the full
+# fonts they're built from stay in user_files. See font_subset.py.
+_SUBSET_FONTS = ["_noto-serif-jp.woff2", "_yukyokasho-bold.woff2"]
+_FULL_FONTS_DIR = os.path.join(_USER_FILES_DIR, "fonts")
+_SUBSET_CACHE_DIR = os.path.join(_USER_FILES_DIR, "font_subsets")
+# Per media folder: the characters its subsets cover and the cached subset
+# each font was last built from.
+_SUBSET_STATE_PATH = os.path.join(_SUBSET_CACHE_DIR, "collections.json")
+# Templates and fonts are fetched concurrently over a few keep-alive
+# connections; more than this just queues behind GitHub's per-client limits.
+_MAX_PARALLEL_DOWNLOADS = 4
 
 _JP_FONT = "YuMincho"
 #                (name, description, font, font_size)
@@ -86,36 +122,524 @@ def _merge_css_settings(old_css: str, new_css: str) -> str:
     return new_css
 
 
-def _download_file(url: str) -> bytes:
-    req = urllib.request.Request(url)
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return resp.read()
+class _TemplateCache:
+    """On-disk copy of the last downloaded templates plus ``ETag``/``Last-Modified``.
 
+    Templates are requested with ``If-None-Match``/``If-Modified-Since``; a 304
+    is answered from the cached body, after which ``_update_notetype`` finds
+    nothing to change and skips the write.
+    """
 
-def _download_all(skip_fonts: bool = False) -> dict:
-    """Download templates and fonts. Returns dict with keys for each file."""
-    results = {}
-    all_files = [(f, _BASE_URL + f) for f in _TEMPLATE_FILES]
-    if not skip_fonts:
-        all_files += [(f, _BASE_URL + "fonts/" + f) for f in _FONT_FILES]
-    total = len(all_files)
-    for i, (name, url) in enumerate(all_files):
-        mw.taskman.run_on_main(
-            lambda v=i + 1, n=name: mw.progress.update(
-                label=f"Downloading {n} ({v}/{total})...",
-                value=v,
+    _INDEX = "index.json"
+
+    def __init__(self, directory: str = _TEMPLATE_CACHE_DIR):
+        self._dir = directory
+        self._lock = threading.Lock()
+        try:
+            with open(os.path.join(directory, self._INDEX), encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+
+    def request_headers(self, name: str, url: str) -> dict:
+        """Conditional headers for *name*, or {} if we hold no usable copy."""
+        entry = self._index.get(name)
+        if not entry or entry.get("url") != url or not os.path.exists(self._path(name)):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, name: str):
+        """Cached body for *name*, or None if it has gone missing."""
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, name: str, url: str, body: bytes, headers) -> None:
+        os.makedirs(self._dir, exist_ok=True)
+        _write_atomic(self._path(name), body)
+        with self._lock:
+            self._index[name] = {
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+            }
+            data = json.dumps(self._index, indent=2).encode("utf-8")
+            _write_atomic(os.path.join(self._dir, self._INDEX), data)
+
+    def fetch(self, name: str, url: str, session: Session) -> bytes:
+        """Conditionally GET *url*, returning the fresh or cached body."""
+        status, headers, body = session.fetch(url, headers=self.request_headers(name, url))
+        if status == 304:
+            cached = self.load(name)
+            if cached is not None:
+                return cached
+            # Cache file vanished underneath us; fall back to a plain fetch.
+            status, headers, body = session.fetch(url)
+        self.store(name, url, body, headers)
+        return body
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class _DownloadProgress:
+    """Thread-safe "Downloaded <file> (n/total)" reporting to ``mw.progress``.
+
+    Counts and schedules under one lock so the bar only ever moves forward,
+    even with several downloads finishing at once. ``expect`` grows the total
+    when a later phase (font repair) adds files. With ``visible=False``
+    (background refresh) it only counts.
+    """
+
+    def __init__(self, total: int = 0, visible: bool = True):
+        self.total = total
+        self.done = 0
+        self.visible = visible
+        self._lock = threading.Lock()
+
+    def expect(self, count: int) -> None:
+        with self._lock:
+            self.total += count
+
+    def step(self, name: str) -> None:
+        with self._lock:
+            self.done += 1
+            if not self.visible:
+                return
+            mw.taskman.run_on_main(
+                lambda v=self.done, t=self.total, n=name: mw.progress.update(
+                    label=f"Downloaded {n} ({v}/{t})...",
+                    value=v,
+                    max=t,
+                )
             )
-        )
-        results[name] = _download_file(url)
+
+
+def _session() -> Session:
+    """The add-on wide session, with the configured ``mirrors`` (see mirrors.py)."""
+    return http_session.configured(mw.addonManager.getConfig(__name__) or {})
+
+
+def _download_files(
+    files: list, progress: _DownloadProgress, session: Session, cache=None,
+) -> dict:
+    """Fetch ``[(name, url), ...]`` concurrently; returns ``{name: bytes}``.
+
+    Up to ``_MAX_PARALLEL_DOWNLOADS`` run at once over *session*'s keep-alive
+    connections. The first failure cancels whatever hasn't started and is
+    re-raised. With a *cache*, every file is fetched conditionally through it.
+    Mirrors, if configured, are ranked once for the batch.
+    """
+    results = {}
+    if not files:
+        return results
+    session.sources(files[0][1], probe=True)
+
+    def fetch(name, url):
+        if cache is not None:
+            data = cache.fetch(name, url, session)
+        else:
+            data = session.get(url)
+        progress.step(name)
+        return name, data
+
+    workers = min(_MAX_PARALLEL_DOWNLOADS, len(files))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, n, u) for n, u in files]
+        try:
+            for future in as_completed(futures):
+                name, data = future.result()
+                results[name] = data
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
     return results
 
 
-def _install_fonts(files: dict) -> None:
+def _download_templates(
+    cache: _TemplateCache, progress: _DownloadProgress, session: Session,
+) -> dict:
+    """Templates plus the font manifest, conditionally through *cache*."""
+    files = [(f, _BASE_URL + f) for f in _TEMPLATE_FILES]
+    files.append((_FONT_MANIFEST, _BASE_URL + "fonts/manifest.json"))
+    return _download_files(files, progress, session, cache=cache)
+
+
+def _download_fonts(names: list, progress: _DownloadProgress, session: Session) -> dict:
+    files = [(f, _BASE_URL + "fonts/" + f) for f in names]
+    return _download_files(files, progress, session)
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_font_state() -> dict:
+    try:
+        with open(_FONT_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_font_state(state: dict) -> None:
+    os.makedirs(os.path.dirname(_FONT_STATE_PATH), exist_ok=True)
+    _write_atomic(_FONT_STATE_PATH, json.dumps(state, indent=2).encode("utf-8"))
+
+
+def _fonts_to_repair(media_dir: str, manifest: dict, subset=()) -> list:
+    """Fonts in *media_dir* that are missing or don't match *manifest*.
+
+    A present font is only hashed when its (size, mtime) differs from the stat
+    signature recorded the last time it verified, so a healthy install costs a
+    few ``stat()`` calls. Fonts the manifest doesn't list are checked for
+    existence only. Fonts in *subset* are checked in ``_FULL_FONTS_DIR``
+    instead: the media copy is a subset built from that full font.
+    """
+    state = _load_font_state()
+    repair = []
+    for name in _FONT_FILES:
+        font_dir = _FULL_FONTS_DIR if name in subset else media_dir
+        verified = state.setdefault(font_dir, {})
+        path = os.path.join(font_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            repair.append(name)
+            continue
+        expected = manifest.get(name)
+        if not expected:
+            continue
+        signature = [st.st_size, st.st_mtime_ns, expected["sha256"]]
+        if verified.get(name) == signature:
+            continue
+        if st.st_size == expected["size"] and _sha256_file(path) == expected["sha256"]:
+            verified[name] = signature
+        else:
+            verified.pop(name, None)
+            repair.append(name)
+    _save_font_state(state)
+    return repair
+
+
+def _verify_fonts(files: dict, manifest: dict) -> None:
+    """Raise if a downloaded font doesn't match its manifest entry."""
+    for name in _FONT_FILES:
+        expected = manifest.get(name)
+        if name not in files or not expected:
+            continue
+        data = files[name]
+        if len(data) != expected["size"] or hashlib.sha256(data).hexdigest() != expected["sha256"]:
+            raise ValueError(f"{name} failed verification (corrupted download)")
+
+
+def _install_fonts(files: dict, manifest: dict, subset=()) -> None:
+    """Write the downloaded fonts and record their verified stat signatures.
+
+    Fonts in *subset* go to ``_FULL_FONTS_DIR``; ``refresh_font_subsets``
+    puts their subsets in the media folder.
+    """
     media_dir = mw.col.media.dir()
+    state = _load_font_state()
     for name in _FONT_FILES:
-        path = os.path.join(media_dir, name)
+        if name not in files:
+            continue
+        font_dir = _FULL_FONTS_DIR if name in subset else media_dir
+        os.makedirs(font_dir, exist_ok=True)
+        path = os.path.join(font_dir, name)
         with open(path, "wb") as f:
             f.write(files[name])
+        expected = manifest.get(name)
+        if expected:
+            st = os.stat(path)
+            state.setdefault(font_dir, {})[name] = [st.st_size, st.st_mtime_ns, expected["sha256"]]
+    _save_font_state(state)
+
+
+# ---------------------------------------------------------------------------
+# Font subsetting (optional; see font_subset.py)
+# ---------------------------------------------------------------------------
+
+# One background build at a time; notes added meanwhile queue one more.
+_subset_job = {"running": False, "pending": False, "extra": []}
+
+
+def _subset_fonts_enabled() -> bool:
+    config = mw.addonManager.getConfig(__name__) or {}
+    return bool(config.get("subset_fonts", False)) and font_subset.available()
+
+
+def _load_subset_state() -> dict:
+    try:
+        with open(_SUBSET_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_subset_state(state: dict) -> None:
+    os.makedirs(os.path.dirname(_SUBSET_STATE_PATH), exist_ok=True)
+    _write_atomic(_SUBSET_STATE_PATH, json.dumps(state, ensure_ascii=False).encode("utf-8"))
+
+
+def _build_font_subsets(texts, media_dir: str) -> tuple[str, dict]:
+    """Background half of ``refresh_font_subsets``: ``(chars, {font: subset path})``."""
+    chars = font_subset.glyph_set(texts)
+    cache = font_subset.SubsetCache(_SUBSET_CACHE_DIR)
+    body = _TemplateCache().load(_FONT_MANIFEST)
+    manifest = json.loads(body.decode("utf-8")) if body else {}
+    built = {}
+    for name in _SUBSET_FONTS:
+        expected = manifest.get(name)
+        full = os.path.join(_FULL_FONTS_DIR, name)
+        if not os.path.exists(full):
+            # Subsetting was just switched on: the media copy is still the
+            # full font, so seed user_files from it rather than downloading.
+            media = os.path.join(media_dir, name)
+            if not (expected and os.path.exists(media) and _sha256_file(media) == expected["sha256"]):
+                continue
+            os.makedirs(_FULL_FONTS_DIR, exist_ok=True)
+            shutil.copyfile(media, full)
+        sha = expected["sha256"] if expected else _sha256_file(full)
+        built[name] = cache.build(name, full, sha, chars)
+    return "".join(sorted(chars)), built
+
+
+def _install_font_subsets(media_dir: str, built: dict) -> list:
+    """Copy built subsets into *media_dir* where the media copy differs."""
+    state = _load_font_state()
+    verified = state.setdefault(media_dir, {})
+    written = []
+    for name, subset_path in built.items():
+        with open(subset_path, "rb") as f:
+            data = f.read()
+        sha = hashlib.sha256(data).hexdigest()
+        path = os.path.join(media_dir, name)
+        try:
+            st = os.stat(path)
+            current = [st.st_size, st.st_mtime_ns, sha] == verified.get(name)
+        except OSError:
+            current = False
+        if current:
+            continue
+        _write_atomic(path, data)
+        st = os.stat(path)
+        verified[name] = [st.st_size, st.st_mtime_ns, sha]
+        written.append(name)
+    _save_font_state(state)
+    return written
+
+
+def _template_texts(model, media_dir: str) -> list[str]:
+    """The text *model* shows besides its notes: templates, CSS and card scripts.
+
+    With ``shared_runtime`` the card scripts (and any "—" or "→" they write to
+    the card) live in ``_mvj_runtime.js``, not the templates, so the blocks
+    the templates call are read from there.
+    """
+    texts = [t["qfmt"] + t["afmt"] for t in model["tmpls"]] + [model["css"]]
+    called = set()
+    for text in texts[:-1]:
+        called |= referenced_blocks(text)
+    if called:
+        try:
+            with open(os.path.join(media_dir, RUNTIME_FILE), encoding="utf-8") as f:
+                blocks = parse_runtime(f.read())
+        except OSError:
+            blocks = {}
+        texts += [js for bid, js in blocks.items() if bid in called]
+    return texts
+
+
+def refresh_font_subsets(extra_texts=()) -> None:
+    """Rebuild the subset fonts in the background from the collection's notes.
+
+    No-op unless subsetting is enabled. Reads every MvJ note's fields plus the
+    templates (and their card scripts, see ``_template_texts``), builds (or
+    reuses from the cache) a subset per font for that glyph set, and updates
+    the media copies that changed. *extra_texts* covers notes not in the
+    database yet (``note_will_be_added``).
+    """
+    if not mw.col or not _subset_fonts_enabled():
+        return
+    _subset_job["extra"].extend(extra_texts)
+    if _subset_job["running"]:
+        _subset_job["pending"] = True
+        return
+    model = mw.col.models.by_name(NOTE_TYPE_NAME)
+    if not model:
+        return
+    col = mw.col
+    media_dir = col.media.dir()
+    start_profile = mw.pm.name if mw.pm else None
+    texts = _template_texts(model, media_dir) + _subset_job["extra"]
+    _subset_job["extra"] = []
+    _subset_job["running"] = True
+
+    def task():
+        rows = col.db.list("select flds from notes where mid = ?", model["id"])
+        return _build_font_subsets(texts + rows, media_dir)
+
+    def on_done(future):
+        _subset_job["running"] = False
+        try:
+            chars, built = future.result()
+        except Exception as e:
+            print(f"[MvJ] Font subsetting failed: {e}")
+            return
+        if mw.col and (not mw.pm or mw.pm.name == start_profile):
+            written = _install_font_subsets(media_dir, built)
+            state = _load_subset_state()
+            state[media_dir] = {"chars": chars, "fonts": built}
+            _save_subset_state(state)
+            font_subset.SubsetCache(_SUBSET_CACHE_DIR).prune(
+                {path for entry in state.values() for path in entry["fonts"].values()}
+            )
+            if written:
+                print(f"[MvJ] Font subsets updated ({len(chars)} chars): {', '.join(written)}")
+        if _subset_job["pending"]:
+            _subset_job["pending"] = False
+            refresh_font_subsets()
+
+    mw.taskman.run_in_background(task, on_done)
+
+
+def note_needs_font_subset(fields) -> bool:
+    """Whether a new note has characters the current subsets weren't built for."""
+    if not _subset_fonts_enabled():
+        return False
+    entry = _load_subset_state().get(mw.col.media.dir())
+    if not entry:
+        return False
+    return not font_subset.glyph_set(fields) <= set(entry["chars"])
+
+
+def _build_options() -> tuple[bool, bool]:
+    """``(minify, shared_runtime)`` from the add-on config.
+
+    ``"minify_templates": false`` is the debug switch: templates and CSS go in
+    exactly as downloaded, comments and all.
+    """
+    config = mw.addonManager.getConfig(__name__) or {}
+    return config.get("minify_templates", True), config.get("shared_runtime", True)
+
+
+def _build_templates(front: str, back: str, css: str) -> tuple[str, str, str, dict]:
+    """Install-time build: minify, then move the inline scripts into runtime blocks.
+
+    Returns ``(front, back, css, blocks)``. The CSS's SETTINGS region is
+    never minified, so ``_merge_css_settings`` and the settings dialog see it
+    exactly as written. ``blocks`` is empty with ``shared_runtime`` off.
+    """
+    minify, shared_runtime = _build_options()
+    if minify:
+        sizes = len(front) + len(back) + len(css)
+        front, back = minify_html(front), minify_html(back)
+        css = minify_css(css, keep=_SETTINGS_RE)
+        saved = sizes - len(front) - len(back) - len(css)
+        print(f"[MvJ] Minified templates: {sizes:,} -> {sizes - saved:,} chars")
+    blocks = {}
+    if shared_runtime:
+        front, front_blocks = extract_runtime(front)
+        back, back_blocks = extract_runtime(back)
+        blocks = {**front_blocks, **back_blocks}
+    return front, back, css, blocks
+
+
+# Note type key holding the editable CSS while "css" holds the compiled CSS
+# (see css_compile). Anki keeps unknown note type keys and syncs them.
+_CSS_SOURCE_KEY = "mvjCssSource"
+
+
+def _css_source(model: dict) -> str:
+    """*model*'s editable CSS: the stored source if its ``css`` is compiled."""
+    return model.get(_CSS_SOURCE_KEY) or model["css"]
+
+
+def _set_css(model: dict, source: str, compiled: bool | None = None) -> None:
+    """Set *model*'s CSS from the editable *source*.
+
+    Compiled (``compiled=True``, or left as it was by default), ``css`` gets
+    only the rules the settings can reach and the source is stored alongside
+    for the settings dialog and later updates.
+    """
+    if compiled is None:
+        compiled = _CSS_SOURCE_KEY in model
+    if compiled:
+        model["css"] = compile_css(source)
+        model[_CSS_SOURCE_KEY] = source
+    else:
+        model["css"] = source
+        model.pop(_CSS_SOURCE_KEY, None)
+
+
+def _notetypes_containing(snippet: str) -> list[dict]:
+    """Note types with a template containing *snippet*.
+
+    Searches the templates table directly instead of loading every note type;
+    falls back to ``models.all()`` if the query fails on this Anki version.
+    """
+    try:
+        ids = mw.col.db.list(
+            "select distinct ntid from templates where instr(config, cast(? as blob)) > 0",
+            snippet,
+        )
+    except Exception as e:
+        print(f"[MvJ] Template query failed ({e}); scanning all note types")
+        return [
+            m for m in mw.col.models.all()
+            if any(snippet in t["qfmt"] or snippet in t["afmt"] for t in m["tmpls"])
+        ]
+    return [m for m in map(mw.col.models.get, ids) if m]
+
+
+def _install_runtime(blocks: dict, exclude_id=None) -> None:
+    """Write the shared runtime media file for a note type being installed.
+
+    Keeps *blocks* plus any blocks of the existing file that other note types
+    (not *exclude_id*, the one being replaced) still call, and drops the rest.
+    Left untouched when the content is unchanged, so media sync has nothing
+    to re-upload.
+    """
+    path = os.path.join(mw.col.media.dir(), RUNTIME_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = None
+    if not blocks and current is None:
+        return
+    keep = {}
+    if current:
+        in_use = set()
+        for model in _notetypes_containing("__mvjRun("):
+            if model.get("id") == exclude_id:
+                continue
+            for tmpl in model["tmpls"]:
+                in_use |= referenced_blocks(tmpl["qfmt"]) | referenced_blocks(tmpl["afmt"])
+        keep = {bid: js for bid, js in parse_runtime(current).items() if bid in in_use}
+    content = render_runtime({**keep, **blocks})
+    if content != current:
+        _write_atomic(path, content.encode("utf-8"))
 
 
 def _create_notetype(front: str, back: str, css: str) -> None:
@@ -138,9 +662,62 @@ def _create_notetype(front: str, back: str, css: str) -> None:
     mm.add(model)
 
 
+def _notetype_changes(
+    model: dict, front: str, back: str, css: str, *, reset_css: bool = False,
+) -> list[str]:
+    """Which parts of *model* an update to these sources would change.
+
+    Mirrors ``_update_notetype`` without touching the model. An empty list
+    means the update is a no-op and the note type need not be written.
+    """
+    changes = []
+    names = [f["name"] for f in model["flds"]]
+    renamed = []
+    for name in names:
+        new_name = _FIELD_RENAMES.get(name)
+        renamed.append(new_name if new_name and new_name not in names else name)
+    if renamed != names:
+        changes.append("field names")
+    if any(
+        name not in renamed
+        for name, *_ in _FIELDS
+        if name not in _CREATE_ONLY_FIELDS
+    ):
+        changes.append("fields")
+    tmpl = model["tmpls"][0]
+    if tmpl["qfmt"] != front:
+        changes.append("front template")
+    if tmpl["afmt"] != back:
+        changes.append("back template")
+    new_css = css if reset_css else _merge_css_settings(_css_source(model), css)
+    if new_css != _css_source(model):
+        changes.append("css")
+    field_map = {name: (desc, font, size) for name, desc, font, size in _FIELDS}
+    for fld, name in zip(model["flds"], renamed):
+        if name not in field_map:
+            continue
+        desc, font, size = field_map[name]
+        if (
+            fld.get("description") != desc
+            or (font and fld.get("font") != font)
+            or (size and fld.get("size") != size)
+        ):
+            changes.append("field metadata")
+            break
+    return changes
+
+
 def _update_notetype(
     model: dict, front: str, back: str, css: str, *, reset_css: bool = False,
-) -> None:
+) -> list[str]:
+    """Bring *model* up to date; returns the changed parts (see ``_notetype_changes``).
+
+    Skips ``update_dict`` entirely when nothing would change, so an unchanged
+    update neither bumps the note type's mtime nor pushes it to synced devices.
+    """
+    changes = _notetype_changes(model, front, back, css, reset_css=reset_css)
+    if not changes:
+        return changes
     mm = mw.col.models
     # Rename fields first (e.g. Translation → Notes)
     existing_names = {f["name"] for f in model["flds"]}
@@ -166,7 +743,7 @@ def _update_notetype(
     # Now safe to update templates — all referenced fields exist
     model["tmpls"][0]["qfmt"] = front
     model["tmpls"][0]["afmt"] = back
-    model["css"] = css if reset_css else _merge_css_settings(model["css"], css)
+    _set_css(model, css if reset_css else _merge_css_settings(_css_source(model), css))
     # Update field metadata for existing fields
     field_map = {name: (desc, font, size) for name, desc, font, size in _FIELDS}
     for fld in model["flds"]:
@@ -178,12 +755,7 @@ def _update_notetype(
             if size:
                 fld["size"] = size
     mm.update_dict(model)
-
-
-def _fonts_exist() -> bool:
-    """Check whether all font files are already in the media folder."""
-    media_dir = mw.col.media.dir()
-    return all(os.path.exists(os.path.join(media_dir, f)) for f in _FONT_FILES)
+    return changes
 
 
 def _get_mvj_japanese_manager():
@@ -320,74 +892,182 @@ def _configure_mvj_japanese(start_profile=None) -> None:
         )
 
 
-def install_notetype(on_success=None, *, reset_css: bool = False) -> None:
+def _local_templates(cache: _TemplateCache):
+    """Templates available without the network, as ``{name: bytes}``.
+
+    The last download in *cache* if complete, else the snapshot bundled with
+    the add-on; None if neither is.
+    """
+    files = {name: cache.load(name) for name in _TEMPLATE_FILES}
+    if all(body is not None for body in files.values()):
+        return files
+    files = {}
+    for name in _TEMPLATE_FILES:
+        try:
+            with open(os.path.join(_SNAPSHOT_DIR, name), "rb") as f:
+                files[name] = f.read()
+        except OSError:
+            return None
+    return files
+
+
+def _report(message: str, background: bool) -> None:
+    """Warn about *message*, or just log it during a background refresh."""
+    if background:
+        print(f"[MvJ] {message}")
+    else:
+        showWarning(message)
+
+
+def _apply_templates(files: dict, *, reset_css: bool = False, background: bool = False) -> bool:
+    """Build the templates in *files* and create or update the note type.
+
+    Reports a failed step (see ``_report``) and returns False.
+    """
+    front = files["front.html"].decode("utf-8")
+    back = files["back.html"].decode("utf-8")
+    css = files["css.css"].decode("utf-8")
+    existing = mw.col.models.by_name(NOTE_TYPE_NAME)
+
+    # Build, then install the runtime before the templates that call it. The
+    # installed templates keep their blocks until the update has gone through.
+    try:
+        front, back, css, blocks = _build_templates(front, back, css)
+        _install_runtime(blocks)
+    except Exception as e:
+        _report(f"Failed to install {RUNTIME_FILE}: {e}", background)
+        return False
+
+    try:
+        if existing:
+            changes = _update_notetype(existing, front, back, css, reset_css=reset_css)
+            if changes:
+                print(f"[MvJ] Updated {NOTE_TYPE_NAME}: {', '.join(changes)}")
+            else:
+                print(f"[MvJ] {NOTE_TYPE_NAME} already up to date; not rewritten")
+        else:
+            _create_notetype(front, back, css)
+    except Exception as e:
+        _report(f"Failed to update note type: {e}", background)
+        return False
+
+    if existing:
+        try:
+            _install_runtime(blocks, existing["id"])
+        except Exception as e:
+            print(f"[MvJ] Failed to prune {RUNTIME_FILE}: {e}")
+    _remove_cardgen_guard()
+    return True
+
+
+def _finish_install(start_profile, on_success) -> None:
+    try:
+        _configure_mvj_japanese(start_profile)
+    except Exception as e:
+        # Never let MvJ Japanese integration break note type install
+        print(f"[MvJ] MvJ Japanese auto-config failed: {e}")
+
+    if on_success:
+        on_success()
+
+
+# Collection config key set while a note type installed from local templates
+# still lacks the download (fonts, newer templates); cleared once it's done.
+_REFRESH_PENDING_KEY = "mvjRefreshPending"
+
+
+def finish_pending_install() -> None:
+    """Retry the background refresh of an earlier local install, if still owed.
+
+    Called on every profile open, so an install made offline gets its fonts
+    the first time the download goes through.
+    """
+    if mw.col and mw.col.get_config(_REFRESH_PENDING_KEY, False):
+        install_notetype(background=True)
+
+
+def install_notetype(on_success=None, *, reset_css: bool = False, background: bool = False) -> None:
     """Main entry point — download files then create or update note type.
 
+    A note type that doesn't exist yet is created straight away from local
+    templates (see ``_local_templates``); the download then runs as a
+    background refresh that adds the fonts and applies any newer version,
+    retried by ``finish_pending_install`` until it succeeds.
+
     Args:
         on_success: Optional callback invoked (on the main thread) after a
             successful install or update.
         reset_css: If True, overwrite all CSS instead of preserving the
             user's SETTINGS region.
+        background: Download without a progress dialog, and only log
+            failures. Used for the refresh after a local install.
     """
-    skip_fonts = _fonts_exist()
-    total_files = len(_TEMPLATE_FILES) + (0 if skip_fonts else len(_FONT_FILES))
     # Remember which profile started this; the download is async and the user
     # could switch profiles before it finishes. Note type ids are per-collection.
     start_profile = mw.pm.name if mw.pm else None
-    mw.progress.start(max=total_files, label="Starting download...", parent=mw)
+    cache = _TemplateCache()
+    if not background and not mw.col.models.by_name(NOTE_TYPE_NAME):
+        files = _local_templates(cache)
+        if files is not None:
+            if _apply_templates(files):
+                print(f"[MvJ] Installed {NOTE_TYPE_NAME} from local templates; checking for updates")
+                mw.col.set_config(_REFRESH_PENDING_KEY, True)
+                _finish_install(start_profile, on_success)
+                install_notetype(background=True)
+            return
+
+    media_dir = mw.col.media.dir()
+    subset = _SUBSET_FONTS if _subset_fonts_enabled() else []
+    if not background:
+        mw.progress.start(
+            max=len(_TEMPLATE_FILES) + 1, label="Starting download...", parent=mw
+        )
 
     def task():
-        return _download_all(skip_fonts=skip_fonts)
+        progress = _DownloadProgress(len(_TEMPLATE_FILES) + 1, visible=not background)
+        session = _session()
+        files = _download_templates(cache, progress, session)
+        manifest = json.loads(files[_FONT_MANIFEST].decode("utf-8"))
+        repair = _fonts_to_repair(media_dir, manifest, subset)
+        progress.expect(len(repair))
+        fonts = _download_fonts(repair, progress, session)
+        _verify_fonts(fonts, manifest)
+        files.update(fonts)
+        return files, manifest
 
     def on_done(future):
-        mw.progress.finish()
+        if not background:
+            mw.progress.finish()
         if not mw.col or (mw.pm and mw.pm.name != start_profile):
             # Profile switched (or closed) mid-download — abort to avoid
             # writing the note type / config into the wrong collection.
             return
         try:
-            files = future.result()
-        except HTTPError as e:
-            showWarning(f"Download failed: HTTP {e.code} for {e.url}")
-            return
-        except URLError as e:
-            showWarning(f"Connection failed: {e.reason}")
-            return
+            files, manifest = future.result()
         except Exception as e:
-            showWarning(f"Download failed: {e}")
-            return
-
-        if not skip_fonts:
-            try:
-                _install_fonts(files)
-            except Exception as e:
-                showWarning(f"Failed to install fonts: {e}")
-                return
-
-        front = files["front.html"].decode("utf-8")
-        back = files["back.html"].decode("utf-8")
-        css = files["css.css"].decode("utf-8")
-
-        try:
-            existing = mw.col.models.by_name(NOTE_TYPE_NAME)
-            if existing:
-                _update_notetype(existing, front, back, css, reset_css=reset_css)
+            if background:
+                print(f"[MvJ] Background update check failed: {e}")
+            elif isinstance(e, HTTPError):
+                showWarning(f"Download failed: HTTP {e.code} for {e.url}")
+            elif isinstance(e, URLError):
+                showWarning(f"Connection failed: {e.reason}")
             else:
-                _create_notetype(front, back, css)
-        except Exception as e:
-            showWarning(f"Failed to update note type: {e}")
+                showWarning(f"Download failed: {e}")
             return
 
-        _remove_cardgen_guard()
-
         try:
-            _configure_mvj_japanese(start_profile)
+            _install_fonts(files, manifest, subset)
         except Exception as e:
-            # Never let MvJ Japanese integration break note type install
-            print(f"[MvJ] MvJ Japanese auto-config failed: {e}")
+            _report(f"Failed to install fonts: {e}", background)
+            return
 
-        if on_success:
-            on_success()
+        if not _apply_templates(files, reset_css=reset_css, background=background):
+            return
+        if mw.col.get_config(_REFRESH_PENDING_KEY, False):
+            mw.col.remove_config(_REFRESH_PENDING_KEY)
+        refresh_font_subsets()
+        if not background:
+            _finish_install(start_profile, on_success)
 
     mw.taskman.run_in_background(task, on_done)
 
@@ -399,10 +1079,23 @@ def install_notetype(on_success=None, *, reset_css: bool = False) -> None:
 _CARDGEN_SNIPPET = '<script>window.__cardGen=(window.__cardGen||0)+1;</script>'
 
 
+# Collection config key set once the guard has been cleaned out, so later
+# installs and updates skip the search. Synced with the collection.
+_CARDGEN_CLEANED_KEY = "mvjCardgenGuardRemoved"
+
+
 def _remove_cardgen_guard():
-    """Remove the legacy cardGen snippet from non-MvJ front templates."""
-    mm = mw.col.models
-    for model in mm.all():
+    """Remove the legacy cardGen snippet from non-MvJ front templates.
+
+    Runs once per collection: only note types whose templates contain the
+    snippet are loaded, and a collection config marker records that the
+    cleanup is done.
+    """
+    col = mw.col
+    if col.get_config(_CARDGEN_CLEANED_KEY, False):
+        return
+    mm = col.models
+    for model in _notetypes_containing(_CARDGEN_SNIPPET):
         if model["name"] == NOTE_TYPE_NAME:
             continue
         changed = False
@@ -413,6 +1106,7 @@ def _remove_cardgen_guard():
                 changed = True
         if changed:
             mm.update_dict(model)
+    col.set_config(_CARDGEN_CLEANED_KEY, True)
 
 
 # ---------------------------------------------------------------------------
@@ -31,6 +31,16 @@ with open(path, 'w') as f:
     f.write('\n')
 " "$ADDON_DIR/manifest.json" "$VERSION"
 
+# Bundle the current templates, so a first install works without GitHub
+# (see _local_templates in notetype.py).
+SNAPSHOT_DIR="$ADDON_DIR/snapshot"
+rm -rf "$SNAPSHOT_DIR"
+mkdir -p "$SNAPSHOT_DIR"
+cp "$REPO_DIR/note-types/mvj/front.html" \
+   "$REPO_DIR/note-types/mvj/back.html" \
+   "$REPO_DIR/note-types/mvj/css.css" \
+   "$SNAPSHOT_DIR/"
+
 OUTPUT_NAME="${1:-$PACKAGE_NAME}-${TIMESTAMP}.ankiaddon"
 OUTPUT_PATH="$REPO_DIR/$OUTPUT_NAME"
 
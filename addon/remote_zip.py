@@ -0,0 +1,254 @@
+"""Fetch chosen members of a remote zip with HTTP Range requests.
+
+Repairing thirty missing files shouldn't mean downloading the whole ~200 MB
+Kaishi media zip. ``RemoteZip`` reads the archive's central directory from
+its tail -- one suffix ``Range`` request, plus one more when the directory
+is longer than the tail -- which gives every member's offset. ``fetch`` then
+requests only the spans of the members asked for, merging neighbours (and
+gaps under ``_MERGE_GAP``) into one request, and writes them out as a small
+zip of their own for ``zip_extract`` to unpack and verify. A dropped
+connection resumes at its byte offset, and every request carries
+``If-Range``, so a zip replaced on the server mid-way is never spliced.
+
+A server that ignores ``Range`` (a plain 200), a file that changed, or an
+archive this doesn't handle (Zip64, multi-disk) raises ``Unsupported``:
+download the whole zip instead.
+
+Pure module; no Anki imports.
+"""
+
+import http.client
+import struct
+import urllib.request
+from dataclasses import dataclass
+from urllib.error import HTTPError, URLError
+
+from .downloader import (
+    _RETRYABLE_HTTP,
+    IncompleteDownloadError,
+    _parse_content_range,
+    _pause,
+    _Progress,
+    _validator,
+    _watch,
+)
+
+# The end-of-central-directory record plus the longest comment it can carry.
+_TAIL = 22 + 0xFFFF
+# A gap this small costs less to download than another request's round trip.
+_MERGE_GAP = 64 * 1024
+_BUFFER = 256 * 1024
+# Consecutive attempts without a byte of progress before a span gives up.
+_RETRIES = 4
+
+_END = struct.Struct("<4s4H2LH")
+_END_SIG = b"PK\x05\x06"
+_ZIP64_LOCATOR_SIG = b"PK\x06\x07"
+_CENTRAL = struct.Struct("<4s4B4HL2L5H2L")
+_CENTRAL_SIG = b"PK\x01\x02"
+_CENTRAL_OFFSET = 42  # of the local header offset, within a central record
+_UTF8_FLAG = 0x800
+
+
+class Unsupported(Exception):
+    """The server or the archive can't serve members on their own."""
+
+
+@dataclass(frozen=True)
+class Member:
+    """A file in the archive and the bytes it occupies there."""
+
+    filename: str  # as ``ZipInfo.filename`` would have it
+    start: int  # its local header
+    end: int  # the next member's local header, or the central directory
+    central: bytes  # its central directory record, as stored
+
+
+def _runs(members, gap: int = _MERGE_GAP) -> list[tuple[int, int, list[Member]]]:
+    """*members* grouped into ``(start, end, members)`` spans, one request each."""
+    runs = []
+    for member in sorted(members, key=lambda m: m.start):
+        if runs and member.start - runs[-1][1] <= gap:
+            runs[-1][1] = max(runs[-1][1], member.end)
+            runs[-1][2].append(member)
+        else:
+            runs.append([member.start, member.end, [member]])
+    return [tuple(run) for run in runs]
+
+
+def transfer_size(members) -> int:
+    """Bytes ``fetch`` downloads for *members* (merged gaps included)."""
+    return sum(end - start for start, end, _ in _runs(members))
+
+
+class RemoteZip:
+    """The zip at *url*, its member list read from the server (``members``).
+
+    Args:
+        opener: a ``urlopen``-compatible callable, e.g. ``Session.urlopen``.
+        cancel: a ``downloader.CancelToken``; cancelling closes the response
+            being read and raises ``DownloadCancelled``.
+
+    Raises:
+        Unsupported: see the module docstring; also when there is no end
+            record to be found (not a zip at all).
+    """
+
+    def __init__(self, url: str, *, opener=urllib.request.urlopen, timeout: float = 30,
+                 cancel=None):
+        self.url = url
+        self._opener = opener
+        self._timeout = timeout
+        self._cancel = cancel
+        self.size = 0
+        self.validator = None
+        self.members = self._read_directory()
+
+    def _read_directory(self) -> list[Member]:
+        with self._open(f"bytes=-{_TAIL}") as resp, _watch(self._cancel, resp):
+            start, self.size = _parse_content_range(resp)
+            self.validator = _validator(resp.headers)
+            tail = resp.read()
+        if len(tail) != self.size - start:
+            raise IncompleteDownloadError(len(tail), self.size - start)
+
+        pos = tail.rfind(_END_SIG)
+        while pos >= 0 and (len(tail) - pos < _END.size
+                            or _END.unpack_from(tail, pos)[-1] != len(tail) - pos - _END.size):
+            pos = tail.rfind(_END_SIG, 0, pos)
+        if pos < 0:
+            raise Unsupported("no end of central directory record")
+        _, disk, cd_disk, disk_count, count, cd_size, cd_offset, _ = _END.unpack_from(tail, pos)
+        if disk or cd_disk or disk_count != count:
+            raise Unsupported("multi-disk archive")
+        if (count == 0xFFFF or 0xFFFFFFFF in (cd_size, cd_offset)
+                or tail[max(0, pos - 20):pos - 16] == _ZIP64_LOCATOR_SIG):
+            raise Unsupported("Zip64 archive")
+
+        end_record = start + pos
+        cd_start = end_record - cd_size
+        concat = cd_start - cd_offset  # bytes in front of the archive proper
+        if cd_start < 0 or concat < 0:
+            raise Unsupported("central directory out of bounds")
+        if cd_start >= start:
+            directory = tail[cd_start - start:pos]
+        else:
+            directory = b"".join(self._stream(cd_start, start)) + tail[:pos]
+
+        entries = []
+        i = 0
+        while i < len(directory):
+            if (directory[i:i + 4] != _CENTRAL_SIG
+                    or len(directory) - i < _CENTRAL.size):
+                raise Unsupported("corrupt central directory")
+            record = _CENTRAL.unpack_from(directory, i)
+            flags, csize, usize = record[5], record[10], record[11]
+            name_len, extra_len, comment_len, offset = record[12:15] + record[18:19]
+            if 0xFFFFFFFF in (csize, usize, offset):
+                raise Unsupported("Zip64 member")
+            name = directory[i + _CENTRAL.size:i + _CENTRAL.size + name_len]
+            length = _CENTRAL.size + name_len + extra_len + comment_len
+            entries.append((offset + concat,
+                            name.decode("utf-8" if flags & _UTF8_FLAG else "cp437"),
+                            directory[i:i + length]))
+            i += length
+        if len(entries) != count:
+            raise Unsupported("corrupt central directory")
+        # Members are laid out back to back: each runs up to the next one.
+        entries.sort(key=lambda e: e[0])
+        ends = [e[0] for e in entries[1:]] + [cd_start]
+        return [Member(name, offset, end, central)
+                for (offset, name, central), end in zip(entries, ends)]
+
+    def fetch(self, members, dest: str, *, on_progress=None) -> int:
+        """Write *members* (from ``members``) to *dest* as a zip of their own.
+
+        ``on_progress`` gets ``downloader.TransferStats`` as for
+        ``download_to_file``. Returns the bytes downloaded.
+        """
+        runs = _runs({m.start: m for m in members}.values())
+        total = sum(end - start for start, end, _ in runs)
+        progress = _Progress(on_progress, total)
+        written = []  # (member, its offset in dest), in order
+        with open(dest, "wb") as out:
+            for start, end, run in runs:
+                pos, k = start, 0
+                for chunk in self._stream(start, end, progress):
+                    chunk_end = pos + len(chunk)
+                    view = memoryview(chunk)
+                    while k < len(run):
+                        member = run[k]
+                        lo, hi = max(pos, member.start), min(chunk_end, member.end)
+                        if lo < hi:
+                            if lo == member.start:
+                                written.append((member, out.tell()))
+                            out.write(view[lo - pos:hi - pos])
+                        if member.end > chunk_end:
+                            break
+                        k += 1
+                    pos = chunk_end
+
+            cd_start = out.tell()
+            for member, offset in written:
+                record = bytearray(member.central)
+                struct.pack_into("<L", record, _CENTRAL_OFFSET, offset)
+                out.write(record)
+            out.write(_END.pack(_END_SIG, 0, 0, len(written), len(written),
+                                out.tell() - cd_start, cd_start, 0))
+        return total
+
+    def _open(self, byte_range: str, pos: int | None = None):
+        """Request *byte_range*; the response, if it's the 206 asked for."""
+        headers = {"Range": byte_range}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        resp = self._opener(urllib.request.Request(self.url, headers=headers),
+                            timeout=self._timeout)
+        status = getattr(resp, "status", None) or 200
+        start, total = _parse_content_range(resp) if status == 206 else (None, None)
+        if start is None or (pos is not None and start != pos) or (
+                self.size and total != self.size):
+            resp.close()
+            raise Unsupported(
+                f"HTTP {status} for {byte_range}" if status != 206
+                else f"unexpected Content-Range for {byte_range}"
+            )
+        return resp
+
+    def _stream(self, start: int, end: int, progress=None):
+        """Yield the bytes ``[start, end)``, resuming after a dropped connection."""
+        pos, stalls = start, 0
+        while pos < end:
+            if self._cancel:
+                self._cancel.check()
+            attempt_start, err = pos, None
+            try:
+                with self._open(f"bytes={pos}-{end - 1}", pos) as resp, \
+                        _watch(self._cancel, resp):
+                    while pos < end:
+                        data = resp.read(min(_BUFFER, end - pos))
+                        if not data:
+                            break
+                        pos += len(data)
+                        if progress:
+                            progress.add(len(data))
+                        yield data
+            except HTTPError as e:
+                if e.code not in _RETRYABLE_HTTP:
+                    raise
+                err = e
+            except (URLError, OSError, http.client.HTTPException) as e:
+                err = e
+            if pos >= end:
+                return
+            if self._cancel:
+                self._cancel.check()
+            stalls = stalls + 1 if pos == attempt_start else 0
+            if stalls >= _RETRIES:
+                if err is not None:
+                    raise err
+                raise IncompleteDownloadError(pos - start, end - start)
+            if progress:
+                progress.retried()
+            if stalls:
+                _pause(min(2 ** (stalls - 1), 8), self._cancel)
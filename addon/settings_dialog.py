@@ -40,7 +40,14 @@ from aqt.theme import theme_manager
 from aqt.utils import showInfo, showWarning, tooltip
 from aqt.webview import AnkiWebView, AnkiWebViewKind
 
-from .notetype import NOTE_TYPE_NAME, _OLD_NOTE_TYPE_NAMES, install_notetype, change_notes_to_mvj
+from .notetype import (
+    NOTE_TYPE_NAME,
+    _OLD_NOTE_TYPE_NAMES,
+    _css_source,
+    _set_css,
+    change_notes_to_mvj,
+    install_notetype,
+)
 
 _SAMPLE_MEDIA_DIR = os.path.join(os.path.dirname(__file__), "sample_media")
 _SAMPLE_IMAGE = "_mvj_sample.webp"
@@ -564,7 +571,7 @@ class SettingsDialog(QDialog):
         available_h = screen.availableGeometry().height() if screen else 1200
         self.resize(1200, min(1200, available_h - 50))
 
-        css = self._model["css"]
+        css = _css_source(self._model)
         self._color_schemes = _parse_color_schemes(css)
         self._defaults = _parse_settings(css)
         self._modes = _parse_modes(css)
@@ -679,6 +686,12 @@ class SettingsDialog(QDialog):
         self._auto_install_cb = QCheckBox("Auto Install Note Type")
         self._auto_install_cb.setChecked(config.get("auto_install", True))
         btn_box.addButton(self._auto_install_cb, QDialogButtonBox.ButtonRole.ActionRole)
+        self._compile_css_cb = QCheckBox("Compile CSS")
+        self._compile_css_cb.setToolTip(
+            "On save, keep only the CSS for the color schemes and switches your settings and modes use"
+        )
+        self._compile_css_cb.setChecked(config.get("compile_css", False))
+        btn_box.addButton(self._compile_css_cb, QDialogButtonBox.ButtonRole.ActionRole)
         convert_btn = QPushButton("Convert [sound:] \u2192 [audio:]")
         convert_btn.clicked.connect(self._convert_sound_to_audio)
         btn_box.addButton(convert_btn, QDialogButtonBox.ButtonRole.ActionRole)
@@ -1114,7 +1127,7 @@ class SettingsDialog(QDialog):
 
         settings = self._get_effective_settings()
         model_copy = copy.deepcopy(self._model)
-        model_copy["css"] = _apply_settings(model_copy["css"], settings)
+        model_copy["css"] = _apply_settings(_css_source(model_copy), settings)
 
         card = self._note.ephemeral_card(
             0, custom_note_type=model_copy
@@ -1174,8 +1187,8 @@ class SettingsDialog(QDialog):
             model = mw.col.models.by_name(NOTE_TYPE_NAME)
             if model:
                 self._sync_current_to_data()
-                model["css"] = _apply_settings(model["css"], self._defaults)
-                model["css"] = _apply_modes(model["css"], self._modes)
+                css = _apply_settings(_css_source(model), self._defaults)
+                _set_css(model, _apply_modes(css, self._modes))
                 mw.col.models.update_dict(model)
         install_notetype(on_success=self._build_ui, reset_css=reset_css)
 
@@ -1187,8 +1200,8 @@ class SettingsDialog(QDialog):
             model = mw.col.models.by_name(NOTE_TYPE_NAME)
             if model:
                 self._sync_current_to_data()
-                model["css"] = _apply_settings(model["css"], self._defaults)
-                model["css"] = _apply_modes(model["css"], self._modes)
+                css = _apply_settings(_css_source(model), self._defaults)
+                _set_css(model, _apply_modes(css, self._modes))
                 mw.col.models.update_dict(model)
         dev_sync.sync_local_templates(reset_css=reset_css)
         self._build_ui()
@@ -1517,13 +1530,18 @@ class SettingsDialog(QDialog):
             return
 
         self._sync_current_to_data()
-        model["css"] = _apply_settings(model["css"], self._defaults)
-        model["css"] = _apply_modes(model["css"], self._modes)
+        compiled = self._compile_css_cb.isChecked()
+        css = _apply_settings(_css_source(model), self._defaults)
+        css = _apply_modes(css, self._modes)
+        _set_css(model, css, compiled)
+        if compiled:
+            print(f"[MvJ] Compiled CSS: {len(css):,} -> {len(model['css']):,} chars")
         mw.col.models.update_dict(model)
 
         # Save addon-level config
         config = mw.addonManager.getConfig(__name__) or {}
         config["auto_install"] = self._auto_install_cb.isChecked()
+        config["compile_css"] = compiled
         mw.addonManager.writeConfig(__name__, config)
 
         self._cleanup()
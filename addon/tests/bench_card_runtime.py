@@ -0,0 +1,141 @@
+"""Benchmark: card script compile cost, inline templates vs _mvj_runtime.js.
+
+Builds the real MvJ and Chinese templates both ways and times, in fresh Node
+processes (V8, as in Anki's desktop webview and AnkiDroid), the script text
+each card render has to compile:
+
+  * inline        -- today: every inline script of the front, and on answer
+                     reveal the front again (via {{FrontSide}}) plus the back
+  * runtime cold  -- the runtime file compiled from source (first card after
+                     an install/update, or a webview without a code cache)
+                     plus the bootstraps
+  * runtime warm  -- the runtime compiled against V8's code cache (what the
+                     webview does for a cached external script) plus the
+                     bootstraps
+  * runtime in doc -- the document already ran this runtime version (desktop
+                     reviewer keeps one document): bootstraps + guarded reload
+
+Only compilation and the runtime's own top-level registration are timed; the
+blocks themselves need a DOM and run the same code either way. Function
+bodies compile lazily on first call in both layouts. Run directly:
+
+    python3 addon/tests/bench_card_runtime.py [repeats]
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.card_runtime as cr  # noqa: E402
+
+_HARNESS = r"""
+const vm = require('vm');
+const {performance} = require('perf_hooks');
+const [mode, runtime, front, back, cached] = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const ctx = {console}; ctx.window = ctx; vm.createContext(ctx);
+// Unique names keep V8's in-process compilation cache out of the "cold" numbers.
+let n = 0;
+const compile = (src, opts) => new vm.Script(src, {filename: `s${n++}.js`, ...opts});
+function side(scripts) {
+    const t0 = performance.now();
+    for (const s of scripts) compile(s);
+    return performance.now() - t0;
+}
+function loadRuntime(useCache) {
+    const t0 = performance.now();
+    const opts = useCache ? {cachedData: Buffer.from(cached, 'base64')} : {};
+    const script = compile(runtime, opts);
+    if (useCache && script.cachedDataRejected) throw new Error('code cache rejected');
+    script.runInContext(ctx);
+    return [performance.now() - t0, script];
+}
+let out = {};
+if (mode === 'produce') {
+    const [, script] = loadRuntime(false);
+    out = script.createCachedData().toString('base64');
+} else if (mode === 'inline') {
+    out = {front: side(front), back: side(front.concat(back))};
+} else {
+    // front / reveal: each in a fresh document; reload: reveal in the same
+    // document, where the runtime's version guard returns straight away.
+    const [load] = loadRuntime(mode === 'warm');
+    const boot = side(front);
+    const reveal = side(front.concat(back));
+    const [reload] = loadRuntime(true);
+    out = {front: load + boot, back: load + reveal, reload: reload + reveal};
+}
+console.log(JSON.stringify(out));
+"""
+
+
+def _node(node, payload):
+    out = subprocess.run(
+        [node, "-e", _HARNESS], input=json.dumps(payload),
+        capture_output=True, text=True, timeout=120,
+    )
+    if out.returncode:
+        raise RuntimeError(out.stderr)
+    return json.loads(out.stdout)
+
+
+def _scripts(html):
+    return [m.group(1) for m in cr._SCRIPT_RE.finditer(html)]
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main() -> int:
+    node = shutil.which("node")
+    if not node:
+        print("node not found")
+        return 1
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    sources, built, blocks = {}, {}, {}
+    for nt in ("mvj", "chinese"):
+        for side in ("front", "back"):
+            with open(os.path.join(ROOT, "note-types", nt, f"{side}.html"), encoding="utf-8") as f:
+                html = f.read()
+            out, found = cr.extract_runtime(html)
+            sources[nt, side], built[nt, side] = html, out
+            blocks.update(found)
+    runtime = cr.render_runtime(blocks)
+    print(f"_mvj_runtime.js: {len(runtime) / 1024:.0f} KB, {len(blocks)} blocks")
+    for nt in ("mvj", "chinese"):
+        front, back = sources[nt, "front"], sources[nt, "back"]
+        bfront, bback = built[nt, "front"], built[nt, "back"]
+        print(f"\n{nt}: template bytes front {len(front):,} -> {len(bfront):,}, "
+              f"back {len(back):,} -> {len(bback):,}")
+        inline = [_scripts(front), _scripts(back)]
+        boots = [[s for s in _scripts(bfront) if "__mvjRun(" in s],
+                 [s for s in _scripts(bback) if "__mvjRun(" in s]]
+        cached = _node(node, ["produce", runtime, [], [], None])
+        rows = {
+            "inline": [_node(node, ["inline", runtime, *inline, None]) for _ in range(repeats)],
+            "runtime cold": [_node(node, ["cold", runtime, *boots, cached]) for _ in range(repeats)],
+            "runtime warm": [_node(node, ["warm", runtime, *boots, cached]) for _ in range(repeats)],
+        }
+        print(f"  {'compile ms (median of ' + str(repeats) + ')':28} {'front':>7} {'reveal':>7}")
+        for label, runs in rows.items():
+            front_ms = _median([r["front"] for r in runs])
+            back_ms = _median([r["back"] for r in runs])
+            print(f"  {label:28} {front_ms:7.2f} {back_ms:7.2f}")
+        reload_ms = _median([r["reload"] for r in rows["runtime warm"]])
+        print(f"  {'runtime in doc (reveal)':28} {'':7} {reload_ms:7.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Benchmark: CSS compiled to the active settings vs the full note type CSS.
+
+For the MvJ CSS as shipped (minified, as installed) and for a few settings
+combinations, prints the bytes and the number of style rules and selectors
+the webview has to match. Style recalc time itself needs a browser engine,
+which isn't available here; selector count is the part of it compiling
+changes. Run directly:
+
+    python3 addon/tests/bench_css_compile.py
+"""
+
+import gzip
+import os
+import re
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.css_compile as cc  # noqa: E402
+import addon.minify as mn  # noqa: E402
+
+_SETTINGS_RE = re.compile(
+    r"(/\*\s*═+\s*\n\s*⚙\s+SETTINGS\b.*?\n[ \t]*/\*\s*═+\s*\*/)",
+    re.DOTALL,
+)
+
+
+def _counts(css):
+    """``(style rules, selectors)``, counted on the comment-free text."""
+    css = cc._COMMENT_RE.sub("", css)
+    rules = selectors = 0
+    for prelude in re.findall(r"([^{};]+)\{", css):
+        prelude = prelude.strip()
+        if prelude.startswith("@") or re.fullmatch(r"from|to|[\d.%, ]+", prelude):
+            continue
+        rules += 1
+        selectors += len(cc._split_selectors(prelude))
+    return rules, selectors
+
+
+def _mode_free(css):
+    return re.sub(r"--mode-\d+-(?:tategaki|color-scheme|debug|audio-labels|card-transparency):[^;]*;", "", css)
+
+
+def main() -> int:
+    with open(os.path.join(ROOT, "note-types", "mvj", "css.css"), encoding="utf-8") as f:
+        src = mn.minify_css(f.read(), keep=_SETTINGS_RE)
+    cases = {
+        "shipped settings + modes": src,
+        "no mode overrides": _mode_free(src),
+        "white, tategaki off": _mode_free(src).replace("--color-scheme: black", "--color-scheme: white"),
+    }
+    rules, selectors = _counts(src)
+    print(f"{'full CSS':28} {len(src.encode()):8,} B {len(gzip.compress(src.encode())):7,} gz "
+          f"{rules:5} rules {selectors:5} selectors")
+    for label, css in cases.items():
+        out = cc.compile_css(css).encode()
+        rules, selectors = _counts(out.decode())
+        print(f"{label:28} {len(out):8,} B {len(gzip.compress(out)):7,} gz "
+              f"{rules:5} rules {selectors:5} selectors")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
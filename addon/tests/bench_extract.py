@@ -0,0 +1,98 @@
+"""Benchmark: extracting a media zip -- wall time and peak memory.
+
+Extracts a zip into an empty folder in a fresh child process per run, which
+reports its own wall time and peak RSS:
+
+    read       the old loop: ``dst.write(src.read())`` per member, in order
+    stream-1   ``zip_extract.extract_flat`` on one thread (bounded buffers)
+    stream     ``extract_flat`` as shipped (``default_workers()`` threads)
+
+Pass the real Kaishi zip (e.g. ``kaishi-media-full-v2.zip``) to measure it;
+without one, a synthetic zip of the same shape is built: ~4,500 deflated,
+incompressible members averaging 45 KB (~200 MB), plus a few 5 MB ones, as a
+worst case for whole-member buffering. Peak RSS is ``VmHWM`` on Linux (see
+bench_receive.py). Run directly:
+
+    python3 addon/tests/bench_extract.py [zip_path] [repeats]
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import os, resource, sys, time, zipfile
+sys.path.insert(0, sys.argv[1])
+import zip_extract
+
+mode, zip_path, out = sys.argv[2:5]
+wall = time.perf_counter()
+if mode == "read":
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = os.path.basename(info.filename)
+            with zf.open(info) as src, open(os.path.join(out, name), "wb") as dst:
+                dst.write(src.read())
+else:
+    zip_extract.extract_flat(zip_path, out, workers=1 if mode == "stream-1" else None)
+wall = time.perf_counter() - wall
+try:
+    with open("/proc/self/status") as f:
+        peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # bytes on macOS
+print(wall, peak)
+"""
+
+
+def _synthetic_zip(path: str) -> None:
+    rng = random.Random(0)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(4500):
+            zf.writestr(f"media/kaishi_{i:05d}.mp3", os.urandom(rng.randint(20_000, 70_000)))
+        for i in range(4):
+            zf.writestr(f"media/large_{i}.mp4", os.urandom(5_000_000))
+
+
+def main() -> int:
+    zip_path = sys.argv[1] if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    tmp = tempfile.mkdtemp()
+    try:
+        if not zip_path:
+            zip_path = os.path.join(tmp, "synthetic.zip")
+            _synthetic_zip(zip_path)
+        with zipfile.ZipFile(zip_path) as zf:
+            members = [i for i in zf.infolist() if not i.is_dir()]
+        size = sum(i.file_size for i in members)
+        print(f"{os.path.basename(zip_path)}: {len(members)} files, {size / 1e6:.0f} MB, "
+              f"median of {repeats}")
+        print(f"{'variant':9} {'wall s':>8} {'MB/s':>8} {'peak RSS MB':>12}")
+        out = os.path.join(tmp, "out")
+        for mode in ("read", "stream-1", "stream"):
+            runs = []
+            for _ in range(repeats):
+                shutil.rmtree(out, ignore_errors=True)
+                os.makedirs(out)
+                result = subprocess.run(
+                    [sys.executable, "-c", _CHILD, ADDON_DIR, mode, zip_path, out],
+                    capture_output=True, text=True, check=True,
+                )
+                runs.append(tuple(float(x) for x in result.stdout.split()))
+            wall, peak = sorted(runs)[len(runs) // 2]
+            print(f"{mode:9} {wall:8.2f} {size / wall / 1e6:8.0f} {peak / 1e6:12.1f}")
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
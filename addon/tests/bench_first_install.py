@@ -0,0 +1,82 @@
+"""Benchmark: time until a first install creates the note type, online and offline.
+
+Runs ``install_notetype`` for a profile without the note type, with the
+note type write itself stubbed (it needs Anki) but the template build
+(minify + shared runtime) real. Upstream is the local HTTP stand-in from
+``bench_notetype_download`` with a simulated round trip; "offline" is a
+refused connection. Compares a first install with no local templates (the
+old, download-first path) against one from the bundled snapshot. Run directly:
+
+    python3 addon/tests/bench_first_install.py [rtt_ms]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_notetype_download import SRC, _files  # noqa: E402
+from http_stub import StubServer  # noqa: E402
+from test_notetype_install import FakeMw, _TempDirs, notetype  # noqa: E402
+
+_OFFLINE_URL = "http://127.0.0.1:9/"
+
+
+def _first_install(tmp, base_url, snapshot):
+    """``(ms until the note type exists or None, ms until install_notetype returns)``."""
+    created = []
+    t0 = time.perf_counter()
+
+    def apply(files, reset_css=False):
+        text = [files[n].decode("utf-8") for n in ("front.html", "back.html", "css.css")]
+        notetype._build_templates(*text)
+        if not created:
+            created.append(time.perf_counter() - t0)
+        return True
+
+    saved = {
+        name: getattr(notetype, name)
+        for name in ("_apply_templates", "_TemplateCache", "_SNAPSHOT_DIR", "_BASE_URL",
+                     "refresh_font_subsets", "_configure_mvj_japanese", "showWarning")
+    }
+    notetype._apply_templates = apply
+    notetype._TemplateCache = lambda d=tmp.cache: saved["_TemplateCache"](d)
+    notetype._SNAPSHOT_DIR = str(SRC) if snapshot else os.path.join(tmp.root, "none")
+    notetype._BASE_URL = base_url
+    notetype.refresh_font_subsets = lambda: None
+    notetype._configure_mvj_japanese = lambda profile: None
+    notetype.showWarning = lambda msg: None
+    mw = notetype.mw = FakeMw()
+    mw.pm = None
+    mw.progress.start = mw.progress.finish = lambda *a, **k: None
+    mw.col = type("Col", (), {})()
+    mw.col.media = type("Media", (), {"dir": staticmethod(lambda: tmp.media)})()
+    mw.col.models = type("Models", (), {"by_name": staticmethod(lambda name: None)})()
+    # FakeMw runs the background task inline, so the call returns only once
+    # the download (and the refresh after a local install) has finished.
+    try:
+        notetype.install_notetype()
+    finally:
+        for name, value in saved.items():
+            setattr(notetype, name, value)
+    total = time.perf_counter() - t0
+    return (created[0] * 1000 if created else None), total * 1000
+
+
+def main() -> int:
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 60.0) / 1000
+    files = _files()
+    print(f"simulated RTT {rtt * 1000:.0f} ms; 'created' = note type written, "
+          "'done' = download/refresh finished")
+    for label, snapshot in (("download first", False), ("local snapshot", True)):
+        for online in (True, False):
+            with StubServer(files, connect_delay=2 * rtt, request_delay=rtt) as server, _TempDirs() as tmp:
+                created, done = _first_install(tmp, server.url("/") if online else _OFFLINE_URL, snapshot)
+            state = f"{created:7.0f} ms" if created is not None else "  never   "
+            print(f"{label}  {'online ' if online else 'offline'}  created {state}   done {done:7.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
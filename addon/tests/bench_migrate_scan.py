@@ -0,0 +1,161 @@
+"""Benchmark: Migrate's collection scan -- per-note loads vs. paged SQL.
+
+Builds a synthetic collection (an SQLite ``notes`` table shaped like Anki's,
+three quarters Kaishi-like notes and a quarter of another note type) and
+times matching every Kaishi note's sentence key three ways:
+
+    per-note   the old loop: ``find_notes``, then one lookup per note id and
+               the sentence field found by name on the loaded note
+    all-rows   one ``select id, flds`` for every note, in memory at once
+    paged      ``kaishi._scan_sentence_keys`` as shipped (``_SCAN_BATCH`` pages)
+
+Peak memory is Python's (``tracemalloc``), from a second, untimed scan.
+The per-note variant only pays a SQLite lookup and a dict per note; in Anki
+each ``get_note`` is a round trip through the Rust backend that builds a
+Note object, so the real gap is wider. Run directly:
+
+    python3 addon/tests/bench_migrate_scan.py [notes ...]
+"""
+
+import importlib.util
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+_aqt = types.ModuleType("aqt")
+_aqt.mw = None
+_aqt_qt = types.ModuleType("aqt.qt")
+_aqt_qt.QMessageBox = object
+_aqt_utils = types.ModuleType("aqt.utils")
+_aqt_utils.showInfo = _aqt_utils.showWarning = lambda *a, **k: None
+sys.modules.setdefault("aqt", _aqt)
+sys.modules.setdefault("aqt.qt", _aqt_qt)
+sys.modules.setdefault("aqt.utils", _aqt_utils)
+
+_spec = importlib.util.spec_from_file_location("addon.kaishi", os.path.join(ADDON_DIR, "kaishi.py"))
+kaishi = importlib.util.module_from_spec(_spec)
+sys.modules["addon.kaishi"] = kaishi
+_spec.loader.exec_module(kaishi)
+
+KAISHI = {"id": 1, "name": "Kaishi 1.5k",
+          "flds": [{"name": n} for n in ("Word", "Word Reading", "Sentence",
+                                         "Sentence Furigana", "Sentence Audio", "Picture")]}
+OTHER_MID = 2
+_KANA = [chr(c) for c in range(0x3041, 0x3097)]
+_KANJI = [chr(c) for c in range(0x4E00, 0x4E00 + 2000)]
+
+
+class _Db:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+
+    def all(self, sql, *args):
+        return self.conn.execute(sql, args).fetchall()
+
+    def list(self, sql, *args):
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+
+def _sentence(rng):
+    parts = []
+    for _ in range(rng.randint(4, 9)):
+        word = "".join(rng.choice(_KANJI) for _ in range(rng.randint(1, 2)))
+        parts.append(f" {word}[{''.join(rng.choice(_KANA) for _ in range(3))}]")
+        parts.append("".join(rng.choice(_KANA) for _ in range(rng.randint(1, 4))))
+    parts.insert(2, "<b>")
+    parts.insert(5, "</b>")
+    return "".join(parts) + "。"
+
+
+def _build(path, count):
+    rng = random.Random(count)
+    conn = sqlite3.connect(path)
+    conn.execute("create table notes (id integer primary key, guid text, mid integer, "
+                 "mod integer, usn integer, tags text, flds text, sfld integer, "
+                 "csum integer, flags integer, data text)")
+    conn.execute("create index idx_notes_mid on notes (mid)")
+    nid = 1_600_000_000_000
+    rows = []
+    for i in range(count):
+        nid += rng.randint(1, 50)
+        furigana = _sentence(rng)
+        fields = ["語", "ご", kaishi._normalize_key(furigana), furigana,
+                  f"[sound:kaishi_{i}.mp3]", f'<img src="kaishi_{i}.webp">']
+        mid = KAISHI["id"] if i % 4 else OTHER_MID
+        rows.append((nid, f"g{i}", mid, 0, 0, "", "\x1f".join(fields), 0, 0, 0, ""))
+        if len(rows) == 10_000:
+            conn.executemany("insert into notes values (?,?,?,?,?,?,?,?,?,?,?)", rows)
+            rows = []
+    conn.executemany("insert into notes values (?,?,?,?,?,?,?,?,?,?,?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _per_note(db, key_index):
+    names = [f["name"] for f in KAISHI["flds"]]
+    matched = 0
+    for nid in db.list("select id from notes where mid = ?", KAISHI["id"]):
+        (flds,) = db.all("select flds from notes where id = ?", nid)[0]
+        note = dict(zip(names, flds.split("\x1f")))
+        sentence = note.get("Sentence Furigana") or note.get("Sentence")
+        if sentence and kaishi._normalize_key(sentence) in key_index:
+            matched += 1
+    return matched
+
+
+def _all_rows(db, key_index):
+    ords = kaishi._sentence_field_ords(KAISHI)
+    matched = 0
+    for _, flds in db.all("select id, flds from notes where mid = ?", KAISHI["id"]):
+        fields = flds.split("\x1f")
+        sentence = next((fields[i] for i in ords if fields[i]), None)
+        if sentence and kaishi._normalize_key(sentence) in key_index:
+            matched += 1
+    return matched
+
+
+def _paged(db, key_index):
+    return sum(1 for _, _, key in kaishi._scan_sentence_keys([KAISHI])
+               if key is not None and key in key_index)
+
+
+def main() -> int:
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'notes':>8} {'variant':9} {'scan s':>8} {'notes/s':>10} {'peak MB':>8}")
+        for count in sizes:
+            path = os.path.join(tmp, f"c{count}.anki2")
+            _build(path, count)
+            db = _Db(path)
+            kaishi.mw = types.SimpleNamespace(col=types.SimpleNamespace(db=db))
+            # A key index the size of the real one (~1,500 rows, three keys each).
+            sample = db.list("select flds from notes where mid = ? limit 4500", KAISHI["id"])
+            key_index = {kaishi._normalize_key(f.split("\x1f")[3]): {} for f in sample}
+            results = set()
+            for name, fn in (("per-note", _per_note), ("all-rows", _all_rows), ("paged", _paged)):
+                started = time.perf_counter()
+                results.add(fn(db, key_index))
+                took = time.perf_counter() - started
+                tracemalloc.start()  # a second run: tracing slows allocation down
+                fn(db, key_index)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{count:8} {name:9} {took:8.2f} {count * 3 / 4 / took:10.0f} "
+                      f"{peak / 1e6:8.1f}")
+            assert len(results) == 1, f"variants disagree: {results}"
+            db.conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
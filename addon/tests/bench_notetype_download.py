@@ -0,0 +1,76 @@
+"""Benchmark: note type template + font download, serial vs pooled/parallel.
+
+Serves the real templates and fonts from ``note-types/mvj`` through a local
+HTTP stand-in that sleeps *connect_delay* per new connection (TCP + TLS
+handshake) and *request_delay* per request (one round trip), then times:
+
+  * serial   -- the old loop: one ``urlopen`` (fresh connection) per file
+  * parallel -- the install task: templates + font manifest, then the fonts
+                that need repair (bounded workers, keep-alive pool, cold
+                template cache, empty media folder)
+
+Run directly:
+
+    python3 addon/tests/bench_notetype_download.py [rtt_ms]
+"""
+
+import os
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from http_stub import StubServer  # noqa: E402
+from test_notetype_install import FakeMw, _download_everything, _TempDirs, notetype  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "note-types" / "mvj"
+
+
+def _files():
+    files = {f"/{n}": (SRC / n).read_bytes() for n in notetype._TEMPLATE_FILES}
+    for name in notetype._FONT_FILES:
+        path = SRC / "fonts" / name
+        # Not every font is checked in; stand in with a same-order-size blob.
+        files[f"/fonts/{name}"] = path.read_bytes() if path.exists() else os.urandom(500_000)
+    files["/fonts/manifest.json"] = (SRC / "fonts" / "manifest.json").read_bytes()
+    return files
+
+
+def _serial(base):
+    names = [(f, base + f) for f in notetype._TEMPLATE_FILES]
+    names += [(f, base + "fonts/" + f) for f in notetype._FONT_FILES]
+    out = {}
+    for name, url in names:
+        with urllib.request.urlopen(urllib.request.Request(url), timeout=30) as resp:
+            out[name] = resp.read()
+    return out
+
+
+def main() -> int:
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 60.0) / 1000
+    files = _files()
+    size = sum(map(len, files.values()))
+    print(f"{len(files)} files, {size / 1e6:.1f} MB, simulated RTT {rtt * 1000:.0f} ms "
+          f"(handshake = 2 RTT)")
+    for label, run in (("serial  ", _serial), ("parallel", None)):
+        with StubServer(files, connect_delay=2 * rtt, request_delay=rtt) as server:
+            base = server.url("/")
+            notetype._BASE_URL = base
+            notetype.mw = FakeMw()
+            t0 = time.perf_counter()
+            if run:
+                got = run(base)
+            else:
+                with _TempDirs() as tmp:
+                    got = _download_everything(tmp.cache)
+            elapsed = time.perf_counter() - t0
+            assert len(got) >= len(files) - 1
+            print(f"{label}  {elapsed * 1000:7.0f} ms  connections={server.connections}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Benchmark: single-stream vs segmented ``download_to_file`` on a throttled link.
+
+Serves a random file from the local HTTP stand-in with a per-connection rate
+cap (the throttling some ISPs and proxies apply) and a simulated round trip,
+then times ``download_to_file`` with 1, 2, 4 and 8 segments. Run directly:
+
+    python3 addon/tests/bench_segmented_download.py [size_mb] [mb_per_s] [rtt_ms]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ADDON_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from http_stub import StubServer  # noqa: E402
+
+import downloader  # noqa: E402
+
+
+def main() -> int:
+    size = int(float(sys.argv[1]) * 1e6) if len(sys.argv) > 1 else 24_000_000
+    rate = int(float(sys.argv[2]) * 1e6) if len(sys.argv) > 2 else 4_000_000
+    rtt = (float(sys.argv[3]) if len(sys.argv) > 3 else 60.0) / 1000
+    body = os.urandom(size)
+    print(f"{size / 1e6:.0f} MB, {rate / 1e6:.0f} MB/s per connection, RTT {rtt * 1000:.0f} ms")
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        for segments in (1, 2, 4, 8):
+            with StubServer({"/media.zip": body}, connect_delay=2 * rtt, request_delay=rtt,
+                            ranges=True, rate=rate) as server:
+                t0 = time.perf_counter()
+                downloader.download_to_file(server.url("/media.zip"), path, segments=segments)
+                elapsed = time.perf_counter() - t0
+            with open(path, "rb") as f:
+                assert f.read() == body
+            print(f"segments={segments}  {elapsed:6.2f} s  {size / elapsed / 1e6:6.1f} MB/s  "
+                  f"connections={server.connections}")
+    finally:
+        os.unlink(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
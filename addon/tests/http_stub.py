@@ -0,0 +1,170 @@
+"""Local HTTP/1.1 stand-in server for the download tests and benchmarks.
+
+Serves an in-memory ``{path: bytes}`` map from a background thread on
+127.0.0.1, with optional per-connection / per-request delays to mimic the
+handshake and round-trip cost of a real high-latency link. Not a test module
+itself (no ``test_`` prefix); imported by the tests and ``bench_*.py`` scripts.
+"""
+
+import hashlib
+import http.server
+import threading
+import time
+
+
+class StubServer:
+    """Serve *files* on localhost; counts connections and records requests.
+
+    Args:
+        files: ``{"/path": b"body"}``.
+        connect_delay: seconds slept once per new TCP connection (stands in
+            for the TCP + TLS handshake).
+        request_delay: seconds slept before answering each request (one RTT).
+        redirects: ``{"/from": "/to"}`` answered with a 302.
+        ranges: honour ``Range: bytes=a-b`` / ``bytes=a-`` / ``bytes=-n`` with a 206, unless
+            an ``If-Range`` names another version (then it's a full 200).
+        rate: bytes per second each connection sends bodies at (0 = no cap),
+            like a link that throttles every connection separately.
+        stall_after: send only this many bytes of each body, then go silent
+            for *stall_for* seconds and drop the connection (a hung mirror;
+            with ``stall_for=0``, just a dropped one).
+
+    Every file gets a strong ``ETag`` (its SHA-1) and a fixed ``Last-Modified``;
+    a matching ``If-None-Match`` is answered with an empty 304.
+    """
+
+    LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+    def __init__(self, files, *, connect_delay=0.0, request_delay=0.0, redirects=None,
+                 ranges=False, rate=0, stall_after=None, stall_for=5.0):
+        self.files = dict(files)
+        self.connect_delay = connect_delay
+        self.request_delay = request_delay
+        self.redirects = dict(redirects or {})
+        self.ranges = ranges
+        self.rate = rate
+        self.stall_after = stall_after
+        self.stall_for = stall_for
+        self.connections = 0
+        self.requests = []
+        self.bytes_sent = 0  # response bodies only
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.connect_delay:
+                    time.sleep(server.connect_delay)
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:
+                    pass  # the client closed a connection it hadn't read to the end
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((self.path, self.headers))
+                if server.request_delay:
+                    time.sleep(server.request_delay)
+                if self.path in server.redirects:
+                    self.send_response(302)
+                    self.send_header("Location", server.redirects[self.path])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                start, end = 0, len(body)
+                spec = self.headers.get("Range", "")
+                if_range = self.headers.get("If-Range")
+                current = if_range in (None, etag, server.LAST_MODIFIED)
+                if server.ranges and spec.startswith("bytes=") and current:
+                    first, _, last = spec[len("bytes="):].partition("-")
+                    if not first:  # the last *last* bytes
+                        start, end = max(0, len(body) - int(last)), len(body)
+                    else:
+                        start = int(first)
+                        end = min(int(last) + 1, len(body)) if last else len(body)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", server.LAST_MODIFIED)
+                self.end_headers()
+                self._send_body(body[start:end])
+
+            def _send_body(self, body):
+                if server.stall_after is not None and len(body) > server.stall_after:
+                    body = body[:server.stall_after]
+                    self.close_connection = True
+                    with server._lock:
+                        server.bytes_sent += len(body)
+                    try:
+                        self.wfile.write(body)
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    time.sleep(server.stall_for)
+                    return
+                with server._lock:
+                    server.bytes_sent += len(body)
+                if not server.rate:
+                    self.wfile.write(body)
+                    return
+                step = max(1, server.rate // 50)
+                t0 = time.monotonic()
+                try:
+                    for pos in range(0, len(body), step):
+                        self.wfile.write(body[pos:pos + step])
+                        ahead = (pos + step) / server.rate - (time.monotonic() - t0)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client stopped reading (e.g. a segment was done)
+
+        return Handler
@@ -0,0 +1,238 @@
+"""Tests for addon/card_runtime.py (moving inline card scripts into _mvj_runtime.js).
+
+Pure module, no Anki needed. The execution checks run the generated runtime
+under Node when it's on PATH and are skipped otherwise. Run directly:
+
+    python3 addon/tests/test_card_runtime.py
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.card_runtime as cr  # noqa: E402
+
+TEMPLATES = [
+    os.path.join(ROOT, "note-types", nt, name)
+    for nt in ("mvj", "chinese")
+    for name in ("front.html", "back.html")
+]
+
+NODE = shutil.which("node")
+
+
+def _run_node(js: str) -> str:
+    out = subprocess.run([NODE, "-"], input=js, capture_output=True, text=True, timeout=30)
+    assert out.returncode == 0, out.stderr
+    return out.stdout
+
+
+def _scripts(html: str) -> list[str]:
+    """Bodies of the bare inline ``<script>`` blocks, in page order."""
+    return [m.group(1) for m in cr._SCRIPT_RE.finditer(html)]
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_scan_globals_finds_top_level_declarations():
+    js = """
+        function a() { var local = 1; function inner() {} }
+        async function b() {}
+        var x = { f: function () { var y; }, m() { var z; } };
+        if (ok) { for (var i = 0; i < 2; i++) {} }
+        const c = (p) => { var w; };
+        let s = "function notMe() {", t = `${ {a: "}"}.a } var no`, r = /[/}]var/g;
+        class K { method() { var q; } }
+    """
+    functions, variables = cr.scan_globals(js)
+    assert functions == ["a", "b"], functions
+    assert variables == ["x", "i", "c", "s", "K"], variables
+
+
+def test_scan_globals_ignores_nested_and_comments():
+    js = """
+        // function commented() {}
+        /* var gone; */
+        (function () { var hidden; function helper() {} })();
+        window.addEventListener("x", function () { let y = 1; });
+        obj.function = 1; x = a / b / c;
+    """
+    assert cr.scan_globals(js) == ([], [])
+
+
+def test_scan_globals_rejects_unbalanced():
+    for bad in ("function f() {", "var s = 'open", "x = `a ${b`", "a)"):
+        try:
+            cr.scan_globals(bad)
+        except cr.ScanError:
+            continue
+        raise AssertionError(f"no ScanError for {bad!r}")
+
+
+def test_extract_runtime_moves_only_safe_blocks():
+    html = (
+        "<div>{{Word}}</div>\n"
+        "  <script>function show() { return 1; }</script>\n"
+        "<script>var leaked = 1;</script>\n"
+        '<script src="other.js"></script>\n'
+        "<script>show();</script>\n"
+    )
+    out, blocks = cr.extract_runtime(html)
+    assert len(blocks) == 2, blocks
+    assert "var leaked = 1;" in out and '<script src="other.js">' in out
+    assert "window.show = show;" in "".join(blocks.values())
+    loader = out.index(cr.RUNTIME_FILE)
+    assert loader < out.index("__mvjRun("), "loader must precede the first bootstrap"
+    assert out.startswith("<div>{{Word}}</div>\n  <script src="), out
+    assert cr.referenced_blocks(out) == set(blocks)
+    assert cr.extract_runtime("<p>no scripts</p>") == ("<p>no scripts</p>", {})
+
+
+def test_real_templates_fully_extracted():
+    blocks = {}
+    for path in TEMPLATES:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        out, found = cr.extract_runtime(html)
+        assert found, f"{path}: nothing moved"
+        left = [s for s in _scripts(out) if "__mvjRun(" not in s]
+        assert len(left) == 1, f"{path}: scripts left inline besides the loader fallback"
+        assert len(out) < len(html) // 10, (path, len(out), len(html))
+        blocks.update(found)
+    runtime = cr.render_runtime(blocks)
+    assert cr.parse_runtime(runtime) == blocks
+    assert cr.render_runtime(cr.parse_runtime(runtime)) == runtime
+
+
+def test_runtime_matches_inline_execution():
+    if not NODE:
+        print("  (node not found; skipped)")
+        return
+    html = (
+        "<script>log.push('a:' + typeof later); function helper(x) { return x * 2; }</script>\n"
+        "<script>log.push('b:' + helper(2)); throw new Error('boom');</script>\n"
+        "<script>log.push('c:' + (this === window));</script>\n"
+    )
+    out, blocks = cr.extract_runtime(html)
+    harness = """
+        const vm = require('vm');
+        function run(runtime, scripts) {
+            const ctx = {log: [], console};
+            ctx.window = ctx;
+            vm.createContext(ctx);
+            if (runtime) vm.runInContext(runtime, ctx);
+            for (const s of scripts) { try { vm.runInContext(s, ctx); } catch (e) {} }
+            // Run the front again, as {{FrontSide}} does on the back.
+            for (const s of scripts) { try { vm.runInContext(s, ctx); } catch (e) {} }
+            return ctx.log;
+        }
+        const [runtime, inline, built] = %s;
+        console.log(JSON.stringify([run(null, inline), run(runtime, built)]));
+    """ % json.dumps([cr.render_runtime(blocks), _scripts(html), _scripts(out)[1:]])
+    inline, built = json.loads(_run_node(harness))
+    assert inline == ["a:undefined", "b:4", "c:true"] * 2, inline
+    assert built == inline, built
+
+
+def test_real_runtime_loads_under_node():
+    if not NODE:
+        print("  (node not found; skipped)")
+        return
+    blocks = {}
+    for path in TEMPLATES:
+        with open(path, encoding="utf-8") as f:
+            blocks.update(cr.extract_runtime(f.read())[1])
+    runtime = cr.render_runtime(blocks)
+    harness = """
+        const vm = require('vm');
+        const ctx = {console}; ctx.window = ctx; vm.createContext(ctx);
+        const src = %s;
+        vm.runInContext(src, ctx);
+        vm.runInContext(src, ctx);
+        console.log(JSON.stringify([Object.keys(ctx.__mvjBlocks).length, typeof ctx.__mvjRun]));
+    """ % json.dumps(runtime)
+    count, run = json.loads(_run_node(harness))
+    assert count == len(blocks) and run == "function", (count, run)
+
+
+def test_stale_runtime_shows_banner_per_card():
+    if not NODE:
+        print("  (node not found; skipped)")
+        return
+    old_html = "<script>log.push('a');</script>\n"
+    new_html = old_html + "<script>log.push('b');</script>\n<script>log.push('c');</script>\n"
+    old_runtime = cr.render_runtime(cr.extract_runtime(old_html)[1])
+    new_template = cr.extract_runtime(new_html)[0]
+    # One window across cards, as in the reviewer's webview; each card gets a
+    # fresh body.
+    harness = """
+        const vm = require('vm');
+        function show(runtime, scripts) {
+            const ctx = {log: [], banners: [], console: {error() {}}};
+            ctx.window = ctx;
+            vm.createContext(ctx);
+            if (runtime) vm.runInContext(runtime, ctx);
+            for (let card = 0; card < 2; card++) {
+                const body = [];
+                ctx.document = {
+                    body: {insertAdjacentHTML: (where, html) => {
+                        body.push(html);
+                        ctx.banners.push(html);
+                    }},
+                    getElementById: id => body.find(h => h.includes(`id="${id}"`)) || null,
+                };
+                for (const s of scripts) vm.runInContext(s, ctx);
+            }
+            return [ctx.log, ctx.banners];
+        }
+        const [runtime, scripts] = %s;
+        console.log(JSON.stringify([show(runtime, scripts), show(null, scripts)]));
+    """ % json.dumps([old_runtime, _scripts(new_template)])
+    (log, banners), (missing_log, missing_banners) = json.loads(_run_node(harness))
+    assert log == ["a", "a"], log
+    assert len(banners) == 2 and "out of date" in banners[0], banners
+    assert missing_log == [] and missing_banners == banners, missing_banners
+
+
+def main() -> int:
+    tests = [
+        ("scan_globals: top-level functions and globals", test_scan_globals_finds_top_level_declarations),
+        ("scan_globals: nested scopes, comments, division", test_scan_globals_ignores_nested_and_comments),
+        ("scan_globals: unbalanced input rejected", test_scan_globals_rejects_unbalanced),
+        ("extract_runtime: globals and src scripts stay inline", test_extract_runtime_moves_only_safe_blocks),
+        ("real templates: every script moved, runtime round-trips", test_real_templates_fully_extracted),
+        ("runtime runs blocks like inline scripts (node)", test_runtime_matches_inline_execution),
+        ("real runtime compiles and registers once (node)", test_real_runtime_loads_under_node),
+        ("new template, old runtime: a red line per card (node)", test_stale_runtime_shows_banner_per_card),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Tests for addon/css_compile.py (settings-aware CSS compiler).
+
+Pure module, no Anki needed. Run directly:
+
+    python3 addon/tests/test_css_compile.py
+"""
+
+import os
+import re
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.css_compile as cc  # noqa: E402
+import addon.minify as mn  # noqa: E402
+
+# Same pattern as notetype._SETTINGS_RE (notetype itself needs aqt).
+_SETTINGS_RE = re.compile(
+    r"(/\*\s*═+\s*\n\s*⚙\s+SETTINGS\b.*?\n[ \t]*/\*\s*═+\s*\*/)",
+    re.DOTALL,
+)
+
+_CSS = """\
+:root {
+    /* ═══
+       ⚙  SETTINGS
+       ═══ */
+    --tategaki: off;        /* on | off */
+    --color-scheme: black;  /* blue | black | red */
+    --debug: off;
+    /* —— Mode 1: Reading —— */
+    --mode-1-tag: reading;
+    --mode-1-color-scheme: red;
+    /* ═══ */
+    --bg: blue;
+}
+
+:root[data-color-scheme="black"] { --bg: black; }
+
+:root[data-color-scheme="white"] { --bg: white; }
+
+:root[data-color-scheme="red"],
+:root[data-color-scheme="white"] .x { --bg: red; }
+
+[data-debug="on"] .a { outline: 1px solid red; }
+:not([data-debug="on"]) .b { color: inherit; }
+
+@media (hover: none) {
+    .tategaki .c { top: 0; }
+    html:not(.tategaki) .c { left: 0; }
+}
+@keyframes fade { from { opacity: 0; } }
+"""
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_reachable_states_include_modes():
+    states = cc.reachable_states(_CSS)
+    assert states["color-scheme"] == {"black", "red"}, states
+    assert states["tategaki"] == {"off"} and states["debug"] == {"off"}, states
+    assert states["audio-labels"] == set(), states
+    # Empty values fall back the way the card scripts do.
+    assert cc.reachable_states("--color-scheme: ;")["color-scheme"] == {"blue"}
+
+
+def test_compile_drops_unreachable_rules():
+    out = cc.compile_css(_CSS)
+    assert '"black"] { --bg: black; }' in out and "white" not in out.split("*/", 3)[-1], out
+    assert ':root[data-color-scheme="red"] { --bg: red; }' in out, out
+    assert '[data-debug="on"] .a' not in out and ':not([data-debug="on"]) .b' in out, out
+    assert ".tategaki .c" not in out and "html:not(.tategaki) .c" in out, out
+    assert "@keyframes fade { from { opacity: 0; } }" in out, out
+    assert "\n\n\n" not in out, repr(out)
+
+
+def test_compile_keeps_settings_region_and_is_stable():
+    out = cc.compile_css(_CSS)
+    assert _SETTINGS_RE.search(out).group() == _SETTINGS_RE.search(_CSS).group()
+    assert cc.compile_css(out) == out
+    # With tategaki on in a mode, both branches stay.
+    both = cc.compile_css(_CSS.replace("--mode-1-tag", "--mode-1-tategaki: on;\n    --mode-1-tag"))
+    assert ".tategaki .c" in both and "html:not(.tategaki) .c" in both
+
+
+def test_real_css_compiles_minified_or_not():
+    for nt in ("mvj", "chinese"):
+        with open(os.path.join(ROOT, "note-types", nt, "css.css"), encoding="utf-8") as f:
+            css = f.read()
+        for src in (css, mn.minify_css(css, keep=_SETTINGS_RE)):
+            out = cc.compile_css(src)
+            assert out.count("{") == out.count("}"), nt
+            if _SETTINGS_RE.search(src):
+                assert _SETTINGS_RE.search(out).group() == _SETTINGS_RE.search(src).group()
+            states = cc.reachable_states(src)
+            for scheme in re.findall(r'data-color-scheme="([^"]+)"', cc._COMMENT_RE.sub("", out)):
+                assert scheme in states["color-scheme"], (nt, scheme)
+            if nt == "chinese":
+                assert out == src, "nothing to compile away without the switches"
+
+
+def main() -> int:
+    tests = [
+        ("reachable_states: defaults plus every mode", test_reachable_states_include_modes),
+        ("compile drops rules needing unreachable states", test_compile_drops_unreachable_rules),
+        ("compile keeps SETTINGS byte-for-byte, idempotent", test_compile_keeps_settings_region_and_is_stable),
+        ("real CSS compiles, minified or not", test_real_css_compiles_minified_or_not),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Tests for addon/download_cache.py (cross-profile download cache).
+
+The cache runs against the local HTTP stand-in; the last test drives
+``kaishi._download_and_extract_zip`` for two "profiles" (two media folders)
+with ``aqt`` stubbed. Run directly:
+
+    python3 addon/tests/test_download_cache.py
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import zipfile
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+_aqt = types.ModuleType("aqt")
+_aqt.mw = None
+_aqt_qt = types.ModuleType("aqt.qt")
+_aqt_qt.QMessageBox = object
+_aqt_utils = types.ModuleType("aqt.utils")
+_aqt_utils.showInfo = _aqt_utils.showWarning = lambda *a, **k: None
+sys.modules.setdefault("aqt", _aqt)
+sys.modules.setdefault("aqt.qt", _aqt_qt)
+sys.modules.setdefault("aqt.utils", _aqt_utils)
+
+from http_stub import StubServer  # noqa: E402
+
+import addon.kaishi as kaishi  # noqa: E402
+from addon.download_cache import DownloadCache  # noqa: E402
+from addon.http_session import Session  # noqa: E402
+
+
+def _zip(files):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_get_revalidates_with_304():
+    server = StubServer({"/cards.tsv": b"a\tb\n" * 1000}).start()
+    tmp = tempfile.mkdtemp()
+    try:
+        with Session() as session:
+            url = server.url("/cards.tsv")
+            assert DownloadCache(tmp, 10**6).get(session, url) == b"a\tb\n" * 1000
+            sent = server.bytes_sent
+            # A fresh instance, as another profile would have, reads the index.
+            again = DownloadCache(tmp, 10**6)
+            assert again.get(session, url) == b"a\tb\n" * 1000
+        assert server.bytes_sent == sent, "body sent again despite the cached copy"
+        assert server.requests[-1][1].get("If-None-Match"), "not a conditional request"
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def test_put_file_find_and_revalidate():
+    body = os.urandom(5000)
+    server = StubServer({"/media.zip": body}).start()
+    tmp = tempfile.mkdtemp()
+    try:
+        url = server.url("/media.zip")
+        download = os.path.join(tmp, "media.zip")
+        with open(download, "wb") as f:
+            f.write(body)
+        cache = DownloadCache(os.path.join(tmp, "cache"), 10**6)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        blob = cache.put_file(url, download, etag)
+        assert not os.path.exists(download), "download not moved into the cache"
+        assert cache.find(hashlib.sha256(body).hexdigest().upper()) == blob
+        with Session() as session:
+            assert cache.revalidate(session.urlopen, url) == blob
+            server.files["/media.zip"] = b"changed"
+            assert cache.revalidate(session.urlopen, url) is None
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def test_lru_eviction_under_cap():
+    tmp = tempfile.mkdtemp()
+    try:
+        cache = DownloadCache(tmp, 250)
+        a = cache.put_bytes("http://x.test/a", b"a" * 100, '"a"')
+        b = cache.put_bytes("http://x.test/b", b"b" * 100, '"b"')
+        assert cache.find(hashlib.sha256(b"a" * 100).hexdigest()) == a  # a is now newer
+        cache.put_bytes("http://x.test/c", b"c" * 100, '"c"')
+        assert os.path.exists(a) and not os.path.exists(b), "evicted the wrong blob"
+        assert cache.request_headers("http://x.test/b") == {}
+        assert cache.put_bytes("http://x.test/big", b"x" * 300, '"x"') is None
+        with open(os.path.join(tmp, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        assert sum(e["size"] for e in index["blobs"].values()) <= 250, index
+    finally:
+        shutil.rmtree(tmp)
+
+
+class _FakeMw:
+    def __init__(self, media_dir, config):
+        self.col = types.SimpleNamespace(media=types.SimpleNamespace(dir=lambda: media_dir))
+        self.addonManager = types.SimpleNamespace(getConfig=lambda name: config)
+        self.taskman = types.SimpleNamespace(run_on_main=lambda fn: fn())
+        self.progress = types.SimpleNamespace(update=lambda **kw: None)
+
+
+def test_second_profile_installs_without_transfer():
+    media = {"a.mp3": os.urandom(3000), "b.png": os.urandom(2000)}
+    body = _zip(media)
+    server = StubServer({"/kaishi-media.zip": body, "/zip-digests.json": json.dumps(
+        {"kaishi-media.zip": hashlib.sha256(body).hexdigest()}).encode()}).start()
+    tmp = tempfile.mkdtemp()
+    saved = (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+             kaishi._cache)
+    try:
+        kaishi._CACHE_DIR = os.path.join(tmp, "cache")
+        kaishi._DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+        kaishi._ZIP_DIGESTS_URL = server.url("/zip-digests.json")
+        kaishi._cache = None
+        manifest = {name: hashlib.sha256(data).hexdigest() for name, data in media.items()}
+        sent = []
+        for profile in ("one", "two"):
+            media_dir = os.path.join(tmp, profile)
+            os.makedirs(media_dir)
+            if profile == "two":
+                with open(os.path.join(media_dir, "a.mp3"), "wb") as f:
+                    f.write(b"the user's own copy")
+            kaishi.mw = _FakeMw(media_dir, {"download_cache_mb": 10})
+            before = server.bytes_sent
+            count = kaishi._download_and_extract_zip(
+                server.url("/kaishi-media.zip"), "x", manifest)
+            assert count == (2 if profile == "one" else 1), (profile, count)
+            sent.append(server.bytes_sent - before)
+            with open(os.path.join(media_dir, "b.png"), "rb") as f:
+                assert f.read() == media["b.png"], profile
+        with open(os.path.join(tmp, "one", "a.mp3"), "rb") as f:
+            assert f.read() == media["a.mp3"]
+        with open(os.path.join(tmp, "two", "a.mp3"), "rb") as f:
+            assert f.read() == b"the user's own copy", "present media overwritten"
+        assert sent[0] >= len(body) and sent[1] == 0, sent
+        assert os.listdir(kaishi._DOWNLOAD_DIR) == [], "downloaded zip left behind"
+    finally:
+        server.stop()
+        (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+         kaishi._cache) = saved
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    tests = [
+        ("get: a second instance revalidates, 304, no body", test_get_revalidates_with_304),
+        ("put_file moves the download; find by digest; revalidate", test_put_file_find_and_revalidate),
+        ("LRU eviction keeps the blobs under the cap", test_lru_eviction_under_cap),
+        ("kaishi: second profile extracts only missing media, no transfer",
+         test_second_profile_installs_without_transfer),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
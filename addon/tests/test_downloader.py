@@ -5,19 +5,31 @@ Pure unit tests driven by a fake ``urlopen`` -- no network, no Anki. Run directl
     python3 addon/tests/test_downloader.py
 """
 
+import hashlib
 import http.client
 import os
+import shutil
 import sys
 import tempfile
+import threading
+import time
 import types
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError, URLError
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from http_stub import StubServer  # noqa: E402
 
 import downloader  # noqa: E402
 from downloader import (  # noqa: E402
+    CancelToken,
+    ChecksumMismatchError,
+    ConnectionPool,
     CorruptDownloadError,
+    DownloadCancelled,
     IncompleteDownloadError,
     download_to_file,
     verify_zip,
@@ -25,7 +37,8 @@ from downloader import (  # noqa: E402
 
 # Don't actually sleep during backoff. Rebinding the module's ``time`` name (vs.
 # mutating the shared time module) keeps the patch local to the downloader.
-downloader.time = types.SimpleNamespace(sleep=lambda *a, **k: None)
+downloader.time = types.SimpleNamespace(
+    sleep=lambda *a, **k: None, monotonic=time.monotonic, time=time.time)
 
 URL = "http://example.test/media.zip"
 DATA = bytes(i % 256 for i in range(100))
@@ -50,6 +63,9 @@ class FakeResp:
         self._pos += len(chunk)
         return chunk
 
+    def close(self):
+        pass
+
     def __enter__(self):
         return self
 
@@ -116,7 +132,7 @@ def test_complete():
     progress = []
     path = _tmp_path()
     try:
-        download_to_file(URL, path, on_progress=lambda d, t: progress.append((d, t)),
+        download_to_file(URL, path, on_progress=lambda st: progress.append((st.downloaded, st.total)),
                          opener=opener)
         assert _read(path) == DATA, "file content mismatch"
         assert progress[-1] == (len(DATA), len(DATA)), f"final progress {progress[-1]}"
@@ -260,6 +276,562 @@ def test_verify_zip():
         _rm(bad)
 
 
+def _fetch(pool, url):
+    with pool.urlopen(url, timeout=5) as resp:
+        return resp.read()
+
+
+def test_pool_reuses_connection():
+    files = {f"/f{i}": bytes([i]) * 1000 for i in range(3)}
+    with StubServer(files) as server, ConnectionPool() as pool:
+        for path, body in files.items():
+            assert _fetch(pool, server.url(path)) == body
+        assert server.connections == 1, f"expected 1 keep-alive connection, got {server.connections}"
+        assert pool.connections_opened == 1
+
+
+def test_pool_concurrent_bounded():
+    files = {f"/f{i}": os.urandom(5000) for i in range(8)}
+    with StubServer(files, request_delay=0.02) as server, ConnectionPool() as pool:
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            got = list(ex.map(lambda p: _fetch(pool, server.url(p)), files))
+        assert got == list(files.values()), "concurrent bodies mismatch"
+        assert server.connections <= 4, f"opened {server.connections} connections for 4 workers"
+
+
+def test_pool_redirect_and_404():
+    with StubServer({"/real": DATA}, redirects={"/moved": "/real"}) as server, \
+            ConnectionPool() as pool:
+        assert _fetch(pool, server.url("/moved")) == DATA, "redirect not followed"
+        err = None
+        try:
+            _fetch(pool, server.url("/missing"))
+        except HTTPError as e:
+            err = e
+        assert err is not None and err.code == 404, "expected HTTPError 404"
+        # The error body was drained, so the connection is still reusable.
+        assert _fetch(pool, server.url("/real")) == DATA
+        assert server.connections == 1, server.connections
+
+
+def test_pool_as_download_opener():
+    with StubServer({"/media.zip": DATA}) as server, ConnectionPool() as pool:
+        path = _tmp_path()
+        try:
+            download_to_file(server.url("/media.zip"), path, opener=pool.urlopen)
+            assert _read(path) == DATA
+        finally:
+            _rm(path)
+
+
+class Crash(BaseException):
+    """Stands in for Anki quitting mid-download: nothing catches it."""
+
+
+class CrashResp(FakeResp):
+    """Delivers *body* up to *crash_at* bytes, then "crashes"."""
+
+    def __init__(self, body, crash_at, status=200, headers=None):
+        super().__init__(body, status, headers)
+        self._crash_at = crash_at
+
+    def read(self, n):
+        if self._pos >= self._crash_at:
+            raise Crash()
+        return super().read(min(n, self._crash_at - self._pos))
+
+
+class RangeOpener:
+    """Serves *body* honouring ``Range``; the first reply at each offset in *cut* stops after 5000 bytes.
+
+    Replies at an offset in *crash* deliver 5000 bytes and then raise ``Crash``.
+    """
+
+    def __init__(self, body, cut=(), ranges=True, etag='"v1"', crash=()):
+        self.body = body
+        self.cut = set(cut)
+        self.crash = set(crash)
+        self.serve_ranges = ranges
+        self.etag = etag
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    def __call__(self, req, timeout=None):
+        spec = req.get_header("Range")
+        with self._lock:
+            self.ranges.append(spec)
+        headers = {"ETag": self.etag}
+        if not spec or not self.serve_ranges:
+            return FakeResp(self.body, 200, {"Content-Length": str(len(self.body)), **headers})
+        first, _, last = spec[len("bytes="):].partition("-")
+        start, end = int(first), int(last) + 1 if last else len(self.body)
+        part = self.body[start:end]
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(self.body)}"
+        with self._lock:
+            if start in self.crash:
+                return CrashResp(part, 5000, 206, headers)
+            if start in self.cut:
+                self.cut.discard(start)
+                part = part[:5000]
+        return FakeResp(part, 206, headers)
+
+
+def _segmented(opener, **kw):
+    progress = []
+    path = _tmp_path()
+    try:
+        download_to_file(URL, path, opener=opener, segments=4, chunk_size=1000,
+                         on_progress=lambda st: progress.append((st.downloaded, st.total)), **kw)
+        return _read(path), progress
+    finally:
+        _rm(path)
+
+
+def test_segmented_download():
+    body = os.urandom(40_000)
+    downloader._MIN_SEGMENT, saved = 1000, downloader._MIN_SEGMENT
+    try:
+        opener = RangeOpener(body)
+        got, progress = _segmented(opener)
+        assert got == body, "segmented content mismatch"
+        assert opener.ranges[0] == "bytes=0-", opener.ranges
+        assert sorted(opener.ranges[1:]) == ["bytes=10000-19999", "bytes=20000-29999",
+                                             "bytes=30000-39999"], opener.ranges
+        assert progress[-1] == (len(body), len(body)), progress[-1]
+        assert [d for d, _ in progress] == sorted(d for d, _ in progress), "progress went back"
+    finally:
+        downloader._MIN_SEGMENT = saved
+
+
+def test_segment_resumes_on_its_own():
+    body = os.urandom(40_000)
+    downloader._MIN_SEGMENT, saved = 1000, downloader._MIN_SEGMENT
+    try:
+        # The probe (segment 0) and segment 2 are both cut off halfway.
+        opener = RangeOpener(body, cut={0, 20000})
+        got, _ = _segmented(opener)
+        assert got == body, "resumed segments mismatch"
+        assert "bytes=5000-9999" in opener.ranges and "bytes=25000-29999" in opener.ranges, opener.ranges
+        assert opener.ranges.count("bytes=10000-19999") == 1, "an intact segment was refetched"
+    finally:
+        downloader._MIN_SEGMENT = saved
+
+
+def test_segmented_falls_back_without_range():
+    opener = RangeOpener(DATA, ranges=False)
+    got, _ = _segmented(opener)
+    assert got == DATA
+    assert opener.ranges == ["bytes=0-", None], opener.ranges
+
+
+def test_segmented_against_stub_server():
+    body = os.urandom(300_000)
+    downloader._MIN_SEGMENT, saved = 50_000, downloader._MIN_SEGMENT
+    try:
+        with StubServer({"/media.zip": body}, ranges=True) as server, ConnectionPool() as pool:
+            path = _tmp_path()
+            try:
+                download_to_file(server.url("/media.zip"), path, opener=pool.urlopen, segments=3)
+                assert _read(path) == body
+                assert server.connections == 3, server.connections
+            finally:
+                _rm(path)
+    finally:
+        downloader._MIN_SEGMENT = saved
+
+
+def _crash(fn):
+    try:
+        fn()
+    except Crash:
+        return
+    raise AssertionError("expected the simulated crash")
+
+
+def test_resumable_survives_restart():
+    downloader._PARTIAL_SAVE_INTERVAL, saved = 0, downloader._PARTIAL_SAVE_INTERVAL
+    path = _tmp_path()
+    try:
+        first = FakeOpener([CrashResp(DATA, 60, 200, {"Content-Length": "100", "ETag": '"v1"'})])
+        _crash(lambda: download_to_file(URL, path, opener=first, chunk_size=10, resumable=True))
+        assert os.path.exists(path + ".part") and os.path.exists(path + ".part.json")
+
+        # "After the restart": a new call picks up at byte 60.
+        second = FakeOpener([FakeResp(DATA[60:], 206, {
+            "Content-Range": "bytes 60-99/100", "ETag": '"v1"'})])
+        download_to_file(URL, path, opener=second, resumable=True)
+        assert second.ranges == ["bytes=60-"], second.ranges
+        assert _read(path) == DATA
+        assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
+    finally:
+        downloader._PARTIAL_SAVE_INTERVAL = saved
+        for p in (path, path + ".part", path + ".part.json"):
+            _rm(p)
+
+
+def test_resumable_restarts_when_file_changed():
+    downloader._PARTIAL_SAVE_INTERVAL, saved = 0, downloader._PARTIAL_SAVE_INTERVAL
+    path = _tmp_path()
+    new = bytes(reversed(DATA))
+    try:
+        first = FakeOpener([CrashResp(DATA, 60, 200, {"Content-Length": "100", "ETag": '"v1"'})])
+        _crash(lambda: download_to_file(URL, path, opener=first, chunk_size=10, resumable=True))
+        second = FakeOpener([
+            FakeResp(new[60:], 206, {"Content-Range": "bytes 60-99/100", "ETag": '"v2"'}),
+            FakeResp(new, 200, {"Content-Length": "100", "ETag": '"v2"'}),
+        ])
+        download_to_file(URL, path, opener=second, resumable=True)
+        assert second.ranges == ["bytes=60-", None], second.ranges
+        assert _read(path) == new, "stale prefix kept after the file changed"
+    finally:
+        downloader._PARTIAL_SAVE_INTERVAL = saved
+        for p in (path, path + ".part", path + ".part.json"):
+            _rm(p)
+
+
+def test_segmented_resumable_fetches_only_missing():
+    body = os.urandom(40_000)
+    downloader._MIN_SEGMENT, saved_min = 1000, downloader._MIN_SEGMENT
+    downloader._PARTIAL_SAVE_INTERVAL, saved = 0, downloader._PARTIAL_SAVE_INTERVAL
+    path = _tmp_path()
+    try:
+        first = RangeOpener(body, crash={20000})
+        _crash(lambda: download_to_file(URL, path, opener=first, segments=4, chunk_size=1000,
+                                        resumable=True))
+        second = RangeOpener(body)
+        download_to_file(URL, path, opener=second, segments=4, chunk_size=1000, resumable=True)
+        assert _read(path) == body
+        # Each segment the crash cut short resumes where its bytes end.
+        assert any(r.startswith("bytes=25000-") for r in second.ranges), second.ranges
+        starts = [int(r[len("bytes="):].partition("-")[0]) for r in second.ranges]
+        assert all(start % 10000 for start in starts), f"saved bytes refetched: {second.ranges}"
+    finally:
+        downloader._MIN_SEGMENT = saved_min
+        downloader._PARTIAL_SAVE_INTERVAL = saved
+        for p in (path, path + ".part", path + ".part.json"):
+            _rm(p)
+
+
+def test_cleanup_partials():
+    tmp = tempfile.mkdtemp()
+    try:
+        def touch(name, age_days=0):
+            p = os.path.join(tmp, name)
+            with open(p, "w") as f:
+                f.write("x")
+            t = time.time() - age_days * 86400
+            os.utime(p, (t, t))
+
+        touch("old.zip.part", 30)
+        touch("old.zip.part.json", 30)
+        touch("new.zip.part", 1)
+        touch("new.zip.part.json", 1)
+        touch("orphan.zip.part.json")
+        touch("kept.zip", 30)
+        downloader.cleanup_partials(tmp, max_age_days=14)
+        assert sorted(os.listdir(tmp)) == ["kept.zip", "new.zip.part", "new.zip.part.json"], os.listdir(tmp)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_sha256_streamed_and_resumed():
+    want = hashlib.sha256(DATA).hexdigest()
+    opener = FakeOpener([_ok200(DATA[0:60], total=100), _part206(DATA[60:100], 60, 100)])
+    path = _tmp_path()
+    try:
+        download_to_file(URL, path, opener=opener, chunk_size=7, sha256=want.upper())
+        assert _read(path) == DATA
+    finally:
+        _rm(path)
+
+
+def test_sha256_mismatch_deletes_download():
+    path = _tmp_path()
+    try:
+        try:
+            download_to_file(URL, path, opener=FakeOpener([_ok200(DATA)]),
+                             sha256=hashlib.sha256(b"other").hexdigest())
+        except ChecksumMismatchError as e:
+            assert isinstance(e, CorruptDownloadError)
+            assert e.actual == hashlib.sha256(DATA).hexdigest()
+        else:
+            raise AssertionError("mismatch not detected")
+        assert not os.path.exists(path), "corrupt download left in place"
+    finally:
+        _rm(path)
+
+
+def test_sha256_resumable_hashes_prefix_once():
+    downloader._PARTIAL_SAVE_INTERVAL, saved = 0, downloader._PARTIAL_SAVE_INTERVAL
+    path = _tmp_path()
+    try:
+        first = FakeOpener([CrashResp(DATA, 60, 200, {"Content-Length": "100", "ETag": '"v1"'})])
+        _crash(lambda: download_to_file(URL, path, opener=first, chunk_size=10, resumable=True,
+                                        sha256=hashlib.sha256(DATA).hexdigest()))
+        second = FakeOpener([FakeResp(DATA[60:], 206, {
+            "Content-Range": "bytes 60-99/100", "ETag": '"v1"'})])
+        download_to_file(URL, path, opener=second, resumable=True,
+                         sha256=hashlib.sha256(DATA).hexdigest())
+        assert _read(path) == DATA
+    finally:
+        downloader._PARTIAL_SAVE_INTERVAL = saved
+        for p in (path, path + ".part", path + ".part.json"):
+            _rm(p)
+
+
+def test_segmented_sha256():
+    body = os.urandom(40_000)
+    downloader._MIN_SEGMENT, saved = 1000, downloader._MIN_SEGMENT
+    reads = []
+    real = downloader._StreamHash.catch_up
+
+    def catch_up(self, upto):
+        reads.append(max(0, upto - self.pos))
+        real(self, upto)
+
+    downloader._StreamHash.catch_up = catch_up
+    try:
+        got, _ = _segmented(RangeOpener(body, cut={0, 20000}),
+                            sha256=hashlib.sha256(body).hexdigest())
+        assert got == body
+        # Segment 0 is hashed as it streams; only the later ones come off disk.
+        assert sum(reads) <= len(body) - 10000, sum(reads)
+        try:
+            _segmented(RangeOpener(body), sha256=hashlib.sha256(body[::-1]).hexdigest())
+        except ChecksumMismatchError:
+            pass
+        else:
+            raise AssertionError("segmented mismatch not detected")
+    finally:
+        downloader._StreamHash.catch_up = real
+        downloader._MIN_SEGMENT = saved
+
+
+class ReadintoResp(FakeResp):
+    """A FakeResp that also offers ``readinto``, recording each read's size."""
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.sizes = []
+
+    def readinto(self, b):
+        data = super().read(len(b))
+        b[:len(data)] = data
+        self.sizes.append(len(b))
+        return len(data)
+
+
+def test_receive_reuses_buffer_and_adapts():
+    body = os.urandom(300_000)
+    resp = ReadintoResp(body, 200, {"Content-Length": str(len(body))})
+    path = _tmp_path()
+    try:
+        download_to_file(URL, path, opener=FakeOpener([resp]), chunk_size=1000,
+                         max_chunk_size=64_000)
+        assert _read(path) == body
+        # Fast reads: the buffer doubles from 1000 and levels off at the cap.
+        assert resp.sizes[:4] == [1000, 2000, 4000, 8000], resp.sizes[:4]
+        assert max(resp.sizes) == 64_000 and len(resp.sizes) < 20, resp.sizes
+    finally:
+        _rm(path)
+
+    sizes = []
+    chunks = downloader._receive(ReadintoResp(body[:10_000], 200), 1000, 4000, limit=6500)
+    for chunk in chunks:
+        sizes.append(len(chunk))
+        assert isinstance(chunk, memoryview)
+    assert sum(sizes) == 6500 and max(sizes) <= 4000, sizes
+
+
+def test_progress_coalesced():
+    body = os.urandom(100_000)
+    clock = [0.0]
+
+    def monotonic():
+        clock[0] += 0.01  # each call: ~10 ms later
+        return clock[0]
+
+    reports = []
+    saved = downloader.time.monotonic
+    downloader.time.monotonic = monotonic
+    path = _tmp_path()
+    try:
+        download_to_file(URL, path, opener=FakeOpener([_ok200(body)]), chunk_size=100,
+                         max_chunk_size=100, on_progress=reports.append)
+        # 1000 chunks, yet a few reports per simulated second.
+        assert 10 <= len(reports) <= clock[0] / downloader._PROGRESS_INTERVAL + 2, (
+            len(reports), clock[0])
+        assert reports[-1].downloaded == reports[-1].total == len(body)
+        assert reports[-1].fraction == 1.0 and reports[-1].eta == 0
+        assert reports[0].bytes_per_sec > 0 and reports[0].eta > 0, reports[0]
+    finally:
+        downloader.time.monotonic = saved
+        _rm(path)
+
+
+def test_progress_counts_retries_and_resumes():
+    reports = []
+    opener = FakeOpener([_ok200(DATA[0:60], total=100), _part206(DATA[60:100], 60, 100)])
+    path = _tmp_path()
+    try:
+        download_to_file(URL, path, opener=opener, on_progress=reports.append)
+        assert (reports[-1].retries, reports[-1].resumes) == (1, 1), reports[-1]
+
+        reports.clear()
+        body = os.urandom(40_000)
+        downloader._MIN_SEGMENT, saved = 1000, downloader._MIN_SEGMENT
+        try:
+            download_to_file(URL, path, opener=RangeOpener(body, cut={0, 20000}), segments=4,
+                             chunk_size=1000, on_progress=reports.append)
+        finally:
+            downloader._MIN_SEGMENT = saved
+        assert (reports[-1].retries, reports[-1].resumes) == (2, 2), reports[-1]
+    finally:
+        _rm(path)
+
+
+def test_progress_rate_excludes_resumed_prefix():
+    downloader._PARTIAL_SAVE_INTERVAL, saved = 0, downloader._PARTIAL_SAVE_INTERVAL
+    body, cut, rate = os.urandom(2_000_000), 1_800_000, 400_000
+    server = StubServer({"/media.zip": body}, ranges=True, rate=rate).start()
+    path = _tmp_path()
+    url = server.url("/media.zip")
+    try:
+        # A part file left by an earlier run, 90% done.
+        partial = downloader._Partial.load(path + ".part", url)
+        with open(partial.path, "wb") as f:
+            f.write(body[:cut])
+        partial.start(len(body), '"%s"' % hashlib.sha1(body).hexdigest(),
+                      [[cut, len(body)]])
+        reports = []
+        download_to_file(url, path, resumable=True, on_progress=reports.append)
+        assert _read(path) == body
+        assert reports[-1].downloaded == len(body), reports[-1]
+        # Only the 200 KB fetched count, at about the server's 400 KB/s.
+        assert rate / 3 < reports[-1].bytes_per_sec < rate * 2, reports[-1]
+        assert all(r.bytes_per_sec < rate * 5 for r in reports), reports
+    finally:
+        downloader._PARTIAL_SAVE_INTERVAL = saved
+        server.stop()
+        for p in (path, path + ".part", path + ".part.json"):
+            _rm(p)
+
+
+def _replace_on_first_report(server, path, new_body):
+    """An ``on_progress`` that swaps the served file (and ends the cuts) once."""
+    def on_progress(stats):
+        if server.files[path] is not new_body:
+            server.files[path] = new_body
+            server.stall_after = None
+    return on_progress
+
+
+def test_if_range_resume():
+    old, new = os.urandom(300_000), os.urandom(300_000)
+    etag = '"%s"' % hashlib.sha1(old).hexdigest()
+    server = StubServer({"/media.zip": old}, ranges=True, stall_after=100_000, stall_for=0).start()
+    path = _tmp_path()
+    try:
+        # Unchanged: the tail is resumed, nothing is sent twice.
+        download_to_file(server.url("/media.zip"), path,
+                         on_progress=lambda stats: setattr(server, "stall_after", None))
+        assert _read(path) == old
+        assert server.requests[-1][1].get("If-Range") == etag, "resume without If-Range"
+        assert server.bytes_sent == len(old), f"{server.bytes_sent} bytes sent for {len(old)}"
+
+        # Replaced between attempts: the resume comes back whole, and is used.
+        server.requests.clear()
+        server.bytes_sent = 0
+        server.stall_after = 100_000
+        download_to_file(server.url("/media.zip"), path,
+                         on_progress=_replace_on_first_report(server, "/media.zip", new))
+        assert _read(path) == new, "old prefix concatenated with the new file"
+        assert server.requests[-1][1].get("If-Range") == etag
+        assert server.bytes_sent <= 100_000 + len(new), "refetched after the 200"
+    finally:
+        server.stop()
+        _rm(path)
+
+
+def test_if_range_segmented_file_replaced():
+    old, new = os.urandom(400_000), os.urandom(350_000)
+    server = StubServer({"/media.zip": old}, ranges=True, stall_after=60_000, stall_for=0).start()
+    tmp = tempfile.mkdtemp()
+    dest = os.path.join(tmp, "media.zip")
+    downloader._MIN_SEGMENT, saved = 50_000, downloader._MIN_SEGMENT
+    try:
+        download_to_file(server.url("/media.zip"), dest, segments=4, resumable=True,
+                         on_progress=_replace_on_first_report(server, "/media.zip", new))
+        assert _read(dest) == new
+        assert any(h.get("If-Range") for _p, h in server.requests), "segments resumed blind"
+        assert not os.path.exists(dest + ".part.json")
+    finally:
+        downloader._MIN_SEGMENT = saved
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def _cancelled_after(cancel, delay, fn, *args, **kwargs):
+    """Run *fn*, cancelling *cancel* after *delay* s; returns the seconds it took."""
+    timer = threading.Timer(delay, cancel.cancel)
+    timer.start()
+    started = time.monotonic()
+    try:
+        fn(*args, cancel=cancel, **kwargs)
+    except DownloadCancelled:
+        return time.monotonic() - started
+    finally:
+        timer.cancel()
+    raise AssertionError("DownloadCancelled not raised")
+
+
+def test_cancel_unblocks_a_stalled_read():
+    body = os.urandom(200_000)
+    server = StubServer({"/media.zip": body}, ranges=True, stall_after=100_000,
+                        stall_for=10).start()
+    tmp = tempfile.mkdtemp()
+    dest = os.path.join(tmp, "media.zip")
+    try:
+        with ConnectionPool() as pool:
+            for resumable in (False, True):
+                took = _cancelled_after(CancelToken(), 0.3, download_to_file, server.url("/media.zip"),
+                                        dest, opener=pool.urlopen, timeout=30, resumable=resumable)
+                assert took < 2, f"cancel took {took:.1f}s: the blocked read wasn't woken"
+                assert not os.path.exists(dest)
+                assert os.path.exists(dest + ".part") == resumable, os.listdir(tmp)
+            server.stall_after = None
+            download_to_file(server.url("/media.zip"), dest, opener=pool.urlopen, resumable=True)
+        with open(dest, "rb") as f:
+            assert f.read() == body
+        assert server.requests[-1][1].get("Range", "bytes=0-") != "bytes=0-", "didn't resume"
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def test_cancel_segments_and_backoff():
+    body = os.urandom(400_000)
+    server = StubServer({"/media.zip": body}, ranges=True, stall_after=50_000,
+                        stall_for=10).start()
+    path = _tmp_path()
+    downloader._MIN_SEGMENT, saved = 50_000, downloader._MIN_SEGMENT
+    try:
+        took = _cancelled_after(CancelToken(), 0.3, download_to_file, server.url("/media.zip"),
+                                path, timeout=30, segments=4)
+        assert took < 2, f"segmented cancel took {took:.1f}s"
+        assert not os.path.exists(path), "unfinished download left behind"
+
+        # Between attempts the backoff wait (real here) ends on cancel too.
+        opener = FakeOpener([URLError("down")] * 10)
+        took = _cancelled_after(CancelToken(), 0.3, download_to_file, URL, path,
+                                opener=opener, max_stalls=10)
+        assert took < 1.5 and opener.calls < 5, (took, opener.calls)
+    finally:
+        downloader._MIN_SEGMENT = saved
+        server.stop()
+        _rm(path)
+
+
 def main() -> int:
     tests = [
         ("complete download", test_complete),
@@ -272,6 +844,32 @@ def main() -> int:
         ("transient HTTP 503 retried", test_transient_503_retried),
         ("HTTP 404 not retried", test_404_not_retried),
         ("verify_zip valid/invalid", test_verify_zip),
+        ("pool reuses one keep-alive connection", test_pool_reuses_connection),
+        ("pool bounded under concurrency", test_pool_concurrent_bounded),
+        ("pool follows redirects, raises HTTPError", test_pool_redirect_and_404),
+        ("pool usable as download_to_file opener", test_pool_as_download_opener),
+        ("segmented: probe + parallel ranges, monotonic progress", test_segmented_download),
+        ("segmented: a cut segment resumes on its own", test_segment_resumes_on_its_own),
+        ("segmented: falls back when Range is ignored", test_segmented_falls_back_without_range),
+        ("segmented: over the pool against the stub server", test_segmented_against_stub_server),
+        ("resumable: picks up after a restart", test_resumable_survives_restart),
+        ("resumable: starts over when the file changed", test_resumable_restarts_when_file_changed),
+        ("resumable segmented: fetches only missing ranges", test_segmented_resumable_fetches_only_missing),
+        ("cleanup_partials: stale parts and orphan sidecars", test_cleanup_partials),
+        ("sha256: hashed while streaming, across a resume", test_sha256_streamed_and_resumed),
+        ("sha256: mismatch raises and deletes the file", test_sha256_mismatch_deletes_download),
+        ("sha256: resumable prefix hashed after a restart", test_sha256_resumable_hashes_prefix_once),
+        ("sha256: segmented download, mismatch detected", test_segmented_sha256),
+        ("progress: coalesced to a few reports a second", test_progress_coalesced),
+        ("receive: readinto into one buffer, size adapts", test_receive_reuses_buffer_and_adapts),
+        ("progress: stats count retries and resumes", test_progress_counts_retries_and_resumes),
+        ("progress: a resumed prefix isn't counted in the rate",
+         test_progress_rate_excludes_resumed_prefix),
+        ("cancel: wakes a stalled read; resumable keeps the part",
+         test_cancel_unblocks_a_stalled_read),
+        ("cancel: stops every segment and cuts backoff short", test_cancel_segments_and_backoff),
+        ("If-Range: unchanged resumes, replaced restarts from the 200", test_if_range_resume),
+        ("If-Range: segmented download of a replaced file", test_if_range_segmented_file_replaced),
     ]
     failed = 0
     for label, fn in tests:
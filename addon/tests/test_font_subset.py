@@ -0,0 +1,116 @@
+"""Tests for addon/font_subset.py (optional per-collection font subsetting).
+
+Needs fontTools + brotli, which Anki doesn't ship; every test is skipped when
+they aren't importable. Uses the small JetBrains Mono font from
+note-types/mvj/fonts. Run directly:
+
+    python3 addon/tests/test_font_subset.py
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+FONT = os.path.join(ROOT, "note-types", "mvj", "fonts", "_jetbrains-mono.woff2")
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.font_subset as fs  # noqa: E402
+
+
+def _sha(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _cmap(path):
+    from fontTools.ttLib import TTFont
+
+    font = TTFont(path)
+    try:
+        return {chr(c) for c in font.getBestCmap()}
+    finally:
+        font.close()
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_glyph_set_includes_base_and_drops_controls():
+    chars = fs.glyph_set(["語\x1f彙\n", "<b>x</b>"])
+    assert {"語", "彙", "x", "あ", "ア", "。"} <= chars
+    assert "\x1f" not in chars and "\n" not in chars
+
+
+def test_subset_covers_the_requested_chars():
+    if not fs.available():
+        print("  (fontTools/brotli not installed; skipped)")
+        return
+    tmp = tempfile.mkdtemp()
+    try:
+        cache = fs.SubsetCache(tmp)
+        path = cache.build("_jetbrains-mono.woff2", FONT, _sha(FONT), {"a", "b", "{", "語"})
+        cmap = _cmap(path)
+        # Layout closure may pull in a few related glyphs (e.g. "}" for "{").
+        assert {"a", "b", "{"} <= cmap and "z" not in cmap and len(cmap) < 10, sorted(cmap)
+        assert os.path.getsize(path) < os.path.getsize(FONT) // 5
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_cache_key_ignores_chars_the_font_lacks():
+    if not fs.available():
+        print("  (fontTools/brotli not installed; skipped)")
+        return
+    tmp = tempfile.mkdtemp()
+    try:
+        cache = fs.SubsetCache(tmp)
+        sha = _sha(FONT)
+        first = cache.build("_jetbrains-mono.woff2", FONT, sha, {"a", "b"})
+        mtime = os.stat(first).st_mtime_ns
+        # The font has no emoji/kanji glyphs: same subset, served from cache.
+        again = cache.build("_jetbrains-mono.woff2", FONT, sha, {"a", "b", "😀", "語"})
+        assert again == first and os.stat(again).st_mtime_ns == mtime
+        other = cache.build("_jetbrains-mono.woff2", FONT, sha, {"a", "b", "c"})
+        assert other != first
+
+        cache.prune({other})
+        assert not os.path.exists(first) and os.path.exists(other)
+        assert any(n.startswith("coverage-") for n in os.listdir(tmp)), "coverage pruned"
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    tests = [
+        ("glyph_set: base ranges in, control chars out", test_glyph_set_includes_base_and_drops_controls),
+        ("subset covers the requested chars, little else", test_subset_covers_the_requested_chars),
+        ("cache key ignores uncovered chars; prune keeps coverage", test_cache_key_ignores_chars_the_font_lacks),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Tests for addon/http_session.py (the shared HTTP session).
+
+Pure module, no Anki needed; uses fake openers and the local HTTP stand-in.
+Run directly:
+
+    python3 addon/tests/test_http_session.py
+"""
+
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+import types
+from urllib.error import HTTPError, URLError
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+from http_stub import StubServer  # noqa: E402
+
+import addon.downloader as downloader  # noqa: E402
+import addon.http_session as http_session  # noqa: E402
+
+# No real backoff sleeps.
+http_session.time = types.SimpleNamespace(sleep=lambda *a, **k: None, monotonic=time.monotonic)
+
+
+class FakeResp(io.BytesIO):
+    def __init__(self, body, status=200, headers=None):
+        super().__init__(body)
+        self.status = status
+        self.headers = headers or {}
+
+
+class FakeOpener:
+    """Returns (or raises) the queued results in order, recording requests."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.requests = []
+
+    def __call__(self, req, timeout=None):
+        self.requests.append((req, timeout))
+        result = self.results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_get_decodes_gzip():
+    opener = FakeOpener([FakeResp(gzip.compress(b"hello"), 200, {"Content-Encoding": "gzip"})])
+    session = http_session.Session(opener=opener, timeout=7)
+    assert session.get("http://x.test/a") == b"hello"
+    req, timeout = opener.requests[0]
+    assert req.get_header("Accept-encoding") == "gzip" and timeout == 7
+
+    plain = FakeOpener([FakeResp(b"plain")])
+    assert http_session.Session(opener=plain, gzip=False).get("http://x.test/a") == b"plain"
+    assert plain.requests[0][0].get_header("Accept-encoding") is None
+
+
+def test_fetch_retries_transient_not_404():
+    opener = FakeOpener([
+        URLError("reset"),
+        HTTPError("http://x.test/a", 503, "busy", {}, None),
+        FakeResp(b"ok"),
+    ])
+    assert http_session.Session(opener=opener, retries=2).get("http://x.test/a") == b"ok"
+    assert len(opener.requests) == 3
+
+    opener = FakeOpener([HTTPError("http://x.test/a", 404, "missing", {}, None), FakeResp(b"")])
+    try:
+        http_session.Session(opener=opener).get("http://x.test/a")
+    except HTTPError as e:
+        assert e.code == 404
+    else:
+        raise AssertionError("404 swallowed")
+    assert len(opener.requests) == 1, "404 retried"
+
+    opener = FakeOpener([URLError("down")] * 3)
+    try:
+        http_session.Session(opener=opener, retries=2).get("http://x.test/a")
+    except URLError:
+        pass
+    else:
+        raise AssertionError("persistent failure swallowed")
+
+
+def test_fetch_304_is_a_result():
+    headers = {"ETag": '"v1"'}
+    opener = FakeOpener([
+        HTTPError("http://x.test/a", 304, "Not Modified", headers, None),  # urllib
+        FakeResp(b"", 304, headers),  # pooled opener
+    ])
+    session = http_session.Session(opener=opener)
+    for _ in range(2):
+        status, got, body = session.fetch("http://x.test/a", headers={"If-None-Match": '"v1"'})
+        assert (status, body) == (304, b"") and got["ETag"] == '"v1"'
+
+
+def test_one_connection_for_small_files_and_download():
+    body = os.urandom(200_000)
+    server = StubServer({"/cards.tsv": b"a\tb\n", "/manifest.json": b"{}",
+                         "/media.zip": body}).start()
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        with http_session.Session() as session:
+            assert session.get(server.url("/cards.tsv")) == b"a\tb\n"
+            assert session.get(server.url("/manifest.json")) == b"{}"
+            downloader.download_to_file(server.url("/media.zip"), path, opener=session.urlopen)
+        with open(path, "rb") as f:
+            assert f.read() == body
+        assert server.connections == 1, f"{server.connections} connections for 3 requests"
+    finally:
+        server.stop()
+        os.unlink(path)
+
+
+def test_shared_is_one_session():
+    assert http_session.shared() is http_session.shared()
+
+
+def main() -> int:
+    tests = [
+        ("get: gzip requested and decoded, timeout default", test_get_decodes_gzip),
+        ("fetch: retries transient failures, not a 404", test_fetch_retries_transient_not_404),
+        ("fetch: 304 returned from either opener", test_fetch_304_is_a_result),
+        ("session: small files and a download share a connection",
+         test_one_connection_for_small_files_and_download),
+        ("shared(): one add-on wide session", test_shared_is_one_session),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Run directly:
 """
 
 import importlib.util
+import sqlite3
 import sys
 import types
 from pathlib import Path
@@ -88,11 +89,79 @@ def test_v24_original_sentence_aliases_match():
     return all(index[kaishi._normalize_key(key)]["Word"] == word for key, word in cases)
 
 
+class _FakeDb:
+    """``mw.col.db`` over an in-memory SQLite notes table."""
+
+    def __init__(self, notes):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create table notes (id integer primary key, mid integer, flds text)")
+        self.conn.executemany("insert into notes values (?, ?, ?)", notes)
+        self.queries = 0
+
+    def all(self, sql, *args):
+        self.queries += 1
+        return self.conn.execute(sql, args).fetchall()
+
+    def list(self, sql, *args):
+        return [row[0] for row in self.all(sql, *args)]
+
+
+def test_scan_reads_sentence_fields_in_pages():
+    kaishi_model = {"id": 1, "flds": [{"name": n} for n in ("Word", "Sentence", "Sentence Furigana")]}
+    mvj_model = {"id": 2, "flds": [{"name": n} for n in ("Sentence", "Translation")]}
+    notes = [
+        (10, 1, "w\x1f<b>plain</b>\x1f<b>漢字[かんじ]</b>"),  # furigana field wins
+        (11, 1, "w\x1f<i>only</i> plain\x1f"),  # empty furigana: Sentence
+        (12, 1, "w\x1f\x1f"),  # no sentence at all
+        (13, 3, "other note type\x1f"),
+        (14, 2, "mvj sentence\x1fx"),
+        (15, 2, "short"),
+        (16, 1, "w"),  # fewer fields than the note type
+    ]
+    saved = kaishi.mw
+    db = _FakeDb(notes)
+    try:
+        kaishi.mw = types.SimpleNamespace(col=types.SimpleNamespace(db=db))
+        got = list(kaishi._scan_sentence_keys([kaishi_model, mvj_model], batch=2))
+    finally:
+        kaishi.mw = saved
+    return got == [
+        (10, 1, "<b>漢字</b>"),
+        (11, 1, "only plain"),
+        (12, 1, None),
+        (16, 1, None),
+        (14, 2, "mvj sentence"),
+        (15, 2, "short"),
+    ] and db.queries == 5
+
+
+def test_reviewed_note_ids_from_grouped_card_query():
+    db = _FakeDb([])
+    db.conn.execute("create table cards (id integer primary key, nid integer, type integer)")
+    db.conn.executemany("insert into cards (nid, type) values (?, ?)", [
+        (1, 0), (1, 0),  # all new
+        (2, 0), (2, 2),  # one card reviewed
+        (3, 1),  # learning
+        (4, 3),  # relearning
+        (6, 2),  # not asked about
+    ])
+    saved = kaishi.mw
+    try:
+        kaishi.mw = types.SimpleNamespace(col=types.SimpleNamespace(db=db))
+        reviewed = kaishi._reviewed_note_ids([1, 2, 3, 4, 5], batch=2)
+    finally:
+        kaishi.mw = saved
+    return reviewed == {2, 3, 4} and db.queries == 3
+
+
 def main() -> int:
     failed = 0
     failed += _check("alias separator expands legacy keys", test_alias_separator_expands_legacy_keys())
     failed += _check("current + old + v2.4 出来る keys match", test_current_and_legacy_dekiru_keys_match_same_row())
     failed += _check("v2.4 original sentence aliases match", test_v24_original_sentence_aliases_match())
+    failed += _check("scan reads sentence fields in id pages", test_scan_reads_sentence_fields_in_pages())
+    failed += _check("reviewed notes from a grouped cards query",
+                     test_reviewed_note_ids_from_grouped_card_query())
     return 1 if failed else 0
 
 
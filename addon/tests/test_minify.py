@@ -0,0 +1,194 @@
+"""Tests for addon/minify.py (install-time template/CSS minifier).
+
+Pure module, no Anki needed. The real-template checks compare ASTs with the
+acorn parser bundled inside Node when it's available, and are skipped
+otherwise. Run directly:
+
+    python3 addon/tests/test_minify.py
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(ADDON_DIR)
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.minify as mn  # noqa: E402
+
+NODE = shutil.which("node")
+
+# Same pattern as notetype._SETTINGS_RE (notetype itself needs aqt).
+_SETTINGS_RE = re.compile(
+    r"(/\*\s*═+\s*\n\s*⚙\s+SETTINGS\b.*?\n[ \t]*/\*\s*═+\s*\*/)",
+    re.DOTALL,
+)
+
+_ACORN_EQUAL = r"""
+const acorn = require('internal/deps/acorn/acorn/dist/acorn');
+const pairs = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const ast = src => JSON.stringify(acorn.parse(src, {ecmaVersion: 'latest'}),
+    (k, v) => (k === 'start' || k === 'end') ? undefined : v);
+console.log(JSON.stringify(pairs.map(([a, b]) => ast(a) === ast(b))));
+"""
+
+
+def _read(*parts):
+    with open(os.path.join(ROOT, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_tokenize_round_trips():
+    js = "a = b / c; r = /[/]x\\//g.test(`${ {k: '}'}.k } /* no */`); // end"
+    tokens = list(mn.tokenize_js(js))
+    assert "".join(t.text for t in tokens) == js
+    kinds = [t.kind for t in tokens if t.kind not in ("space",)]
+    assert kinds.count("regex") == 1 and kinds.count("template") == 1, kinds
+    assert kinds[-1] == "comment", kinds
+
+
+def test_minify_js_keeps_line_breaks_asi_needs():
+    js = "function f() {\n    return\n        x;\n}\na\n++b\nc\n(d)\nlet e = 1\n"
+    out = mn.minify_js(js)
+    assert "return\nx" in out, out
+    assert "a\n++b" in out and "c\n(d)" in out, out
+    assert out.startswith("function f(){return"), out
+
+
+def test_minify_js_glue_hazards():
+    cases = {
+        "a + +b": "a+ +b",
+        "a - -b": "a- -b",
+        "x = 1 .toString()": "x=1 .toString()",
+        "t = /re/ instanceof RegExp": "t=/re/ instanceof RegExp",
+        "y = a / /re/.source": "y=a/ /re/.source",
+        "return typeof x": "return typeof x",
+    }
+    for src, want in cases.items():
+        got = mn.minify_js(src)
+        assert got == want, (src, got)
+
+
+def test_minify_js_strips_comments_not_literals():
+    js = (
+        "// leading\n"
+        "var s = '/* not a comment */', t = `  keep\n  spaces  `; /* gone */\n"
+        "var u = \"// nor this\";\n"
+    )
+    out = mn.minify_js(js)
+    assert "leading" not in out and "gone" not in out, out
+    assert "'/* not a comment */'" in out and "`  keep\n  spaces  `" in out
+    assert '"// nor this"' in out
+
+
+def test_minify_css_keeps_settings_region():
+    css = (
+        "/* header */\n"
+        "/* ══════\n   ⚙  SETTINGS\n   ══════ */\n"
+        ":root {\n    --x: on;   /* a comment kept here */\n}\n"
+        "/* ══════ */\n"
+        "\n.card  >  .a ,\n.b {\n    color : red ;\n    --y:  #fff;\n}\n"
+        "@media (hover: none) and (min-width: 768px) {\n  .c { background: url( a b.png ); }\n}\n"
+        '.d::after { content: "  two  spaces  ;" }\n'
+    )
+    out = mn.minify_css(css, keep=_SETTINGS_RE)
+    assert _SETTINGS_RE.search(out).group() == _SETTINGS_RE.search(css).group()
+    assert "header" not in out
+    assert ".card > .a,.b{color : red;--y: #fff}" in out, out
+    assert "@media (hover: none) and (min-width: 768px){.c{background: url( a b.png )}}" in out, out
+    assert '"  two  spaces  ;"' in out, out
+
+
+def test_minify_html_strips_layout_only():
+    html = (
+        "<div class=\"a\">\n"
+        "    <span>one</span> <span>two</span>\n"
+        "\n"
+        "    {{#Word}}<b>{{Word}}</b>{{/Word}}\n"
+        "</div>\n"
+        "<script>\n    // note\n    var x = 1;\n</script>\n"
+        "<script src=\"x.js\">  </script>\n"
+    )
+    out = mn.minify_html(html)
+    assert out == (
+        '<div class="a">\n<span>one</span> <span>two</span>\n'
+        "{{#Word}}<b>{{Word}}</b>{{/Word}}\n</div>\n"
+        "<script>var x=1;</script>\n"
+        '<script src="x.js">  </script>\n'
+    ), repr(out)
+
+
+def test_real_templates_minify_equivalently():
+    blocks, minified = [], []
+    for nt in ("mvj", "chinese"):
+        for name in ("front.html", "back.html"):
+            html = _read("note-types", nt, name)
+            out = mn.minify_html(html)
+            assert len(out) < len(html) * 0.8, (nt, name, len(out), len(html))
+            assert mn.minify_html(out) == out, f"{nt}/{name}: not idempotent"
+            src = re.findall(r"<script>(.*?)</script>", html, re.DOTALL)
+            got = re.findall(r"<script>(.*?)</script>", out, re.DOTALL)
+            assert len(src) == len(got), (nt, name)
+            blocks += src
+            minified += got
+        css = _read("note-types", nt, "css.css")
+        out = mn.minify_css(css, keep=_SETTINGS_RE)
+        assert len(out) < len(css), nt
+        if _SETTINGS_RE.search(css):
+            assert _SETTINGS_RE.search(out).group() == _SETTINGS_RE.search(css).group()
+    if not NODE:
+        print("  (node not found; AST comparison skipped)")
+        return
+    run = subprocess.run(
+        [NODE, "--expose-internals", "-e", _ACORN_EQUAL],
+        input=json.dumps(list(zip(blocks, minified))), capture_output=True, text=True,
+    )
+    if run.returncode and "Cannot find module" in run.stderr:
+        print("  (node has no bundled acorn; AST comparison skipped)")
+        return
+    assert run.returncode == 0, run.stderr
+    same = json.loads(run.stdout)
+    assert all(same), f"AST changed in blocks {[i for i, s in enumerate(same) if not s]}"
+
+
+def main() -> int:
+    tests = [
+        ("tokenize_js round-trips, regex/template/comment kinds", test_tokenize_round_trips),
+        ("minify_js keeps line breaks ASI depends on", test_minify_js_keeps_line_breaks_asi_needs),
+        ("minify_js keeps spaces that separate tokens", test_minify_js_glue_hazards),
+        ("minify_js strips comments, not string/template contents", test_minify_js_strips_comments_not_literals),
+        ("minify_css leaves the SETTINGS region byte-for-byte", test_minify_css_keeps_settings_region),
+        ("minify_html strips indentation, minifies bare scripts", test_minify_html_strips_layout_only),
+        ("real templates: same JS ASTs, SETTINGS intact", test_real_templates_minify_equivalently),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Tests for addon/mirrors.py and mirror failover in the downloader and session.
+
+Everything runs against local stand-ins: HTTP mirrors from ``http_stub`` (one
+of them slow, one that hangs mid-body) and a ``file://`` directory. The last
+test drives ``kaishi._download_and_extract_zip`` with ``aqt`` stubbed. Run
+directly:
+
+    python3 addon/tests/test_mirrors.py
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import types
+import zipfile
+from pathlib import Path
+from urllib.error import HTTPError
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+_aqt = types.ModuleType("aqt")
+_aqt.mw = None
+_aqt_qt = types.ModuleType("aqt.qt")
+_aqt_qt.QMessageBox = object
+_aqt_utils = types.ModuleType("aqt.utils")
+_aqt_utils.showInfo = _aqt_utils.showWarning = lambda *a, **k: None
+sys.modules.setdefault("aqt", _aqt)
+sys.modules.setdefault("aqt.qt", _aqt_qt)
+sys.modules.setdefault("aqt.utils", _aqt_utils)
+
+from http_stub import StubServer  # noqa: E402
+
+import addon.downloader as downloader  # noqa: E402
+import addon.kaishi as kaishi  # noqa: E402
+import addon.mirrors as mirrors  # noqa: E402
+from addon.http_session import Session  # noqa: E402
+
+
+def _dead_url(path: str) -> str:
+    """A URL on a local port nothing listens on (connection refused)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}{path}"
+
+
+def _ranges_from(server, path):
+    return [h.get("Range") for p, h in server.requests if p == path]
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_candidates():
+    config = {
+        "https://up.test/": ["http://lan.test/all/"],
+        "https://up.test/releases/": ["http://nas.test/rel", "file:///srv/rel/"],
+    }
+    assert mirrors.candidates("https://up.test/releases/v2/m.zip", config) == [
+        "http://nas.test/rel/v2/m.zip",
+        "file:///srv/rel/v2/m.zip",
+        "https://up.test/releases/v2/m.zip",
+    ], "longest prefix, mirrors in order, upstream last"
+    assert mirrors.candidates("https://up.test/a.css", config) == [
+        "http://lan.test/all/a.css", "https://up.test/a.css",
+    ]
+    assert mirrors.candidates("https://elsewhere.test/x", config) == ["https://elsewhere.test/x"]
+    assert mirrors.candidates("https://up.test/x", {}) == ["https://up.test/x"]
+
+
+def test_rank_fastest_first_dead_last():
+    body = os.urandom(300_000)
+    fast = StubServer({"/f": body}, ranges=True).start()
+    slow = StubServer({"/f": body}, ranges=True, request_delay=0.3).start()
+    try:
+        dead = _dead_url("/f")
+        with Session() as session:
+            urls = [dead, slow.url("/f"), fast.url("/f")]
+            assert mirrors.rank(urls, session.urlopen) == [fast.url("/f"), slow.url("/f"), dead]
+        assert _ranges_from(fast, "/f") == ["bytes=0-%d" % (mirrors._PROBE_BYTES - 1)]
+    finally:
+        fast.stop()
+        slow.stop()
+
+
+def test_download_fails_over_mid_transfer_at_offset():
+    body = os.urandom(400_000)
+    hung = StubServer({"/m.zip": body}, ranges=True, stall_after=150_000, stall_for=3).start()
+    good = StubServer({"/m.zip": body}, ranges=True).start()
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        downloader.download_to_file(
+            hung.url("/m.zip"), path, timeout=0.5,
+            sources=[hung.url("/m.zip"), good.url("/m.zip")],
+            sha256=hashlib.sha256(body).hexdigest(),
+        )
+        with open(path, "rb") as f:
+            assert f.read() == body
+        # Resumed where the last whole chunk from the hung mirror ended.
+        ranges = _ranges_from(good, "/m.zip")
+        assert len(ranges) == 1 and ranges[0].startswith("bytes="), ranges
+        offset = int(ranges[0][len("bytes="):-1])
+        assert 0 < offset <= 150_000, f"didn't resume on the mirror at the offset: {ranges}"
+        assert good.bytes_sent == len(body) - offset, good.bytes_sent
+    finally:
+        hung.stop()
+        good.stop()
+        os.unlink(path)
+
+
+def test_segments_fail_over_independently():
+    body = os.urandom(4 * 300_000)
+    hung = StubServer({"/m.zip": body}, ranges=True, stall_after=100_000, stall_for=3).start()
+    good = StubServer({"/m.zip": body}, ranges=True).start()
+    tmp = tempfile.mkdtemp()
+    dest = os.path.join(tmp, "m.zip")
+    downloader._MIN_SEGMENT, saved = 100_000, downloader._MIN_SEGMENT
+    try:
+        downloader.download_to_file(
+            hung.url("/m.zip"), dest, timeout=0.5, segments=4, resumable=True,
+            sources=[hung.url("/m.zip"), good.url("/m.zip")],
+        )
+        with open(dest, "rb") as f:
+            assert f.read() == body
+        starts = sorted(int(r[len("bytes="):].partition("-")[0])
+                        for r in _ranges_from(good, "/m.zip"))
+        assert len(starts) == 4, starts
+        assert not set(starts) & {0, 300_000, 600_000, 900_000}, \
+            f"a segment restarted from its beginning: {starts}"
+        assert good.bytes_sent == len(body) - sum(s % 300_000 for s in starts)
+    finally:
+        downloader._MIN_SEGMENT = saved
+        hung.stop()
+        good.stop()
+        shutil.rmtree(tmp)
+
+
+def test_file_mirror_after_404():
+    body = os.urandom(200_000)
+    tmp = tempfile.mkdtemp()
+    Path(tmp, "m.zip").write_bytes(body)
+    lan = StubServer({}, ranges=True).start()
+    try:
+        file_url = Path(tmp, "m.zip").as_uri()
+        for segments in (1, 4):
+            dest = os.path.join(tmp, f"out{segments}.zip")
+            validator = downloader.download_to_file(
+                "https://up.test/m.zip", dest, segments=segments, resumable=True,
+                sources=[lan.url("/m.zip"), file_url],
+            )
+            assert Path(dest).read_bytes() == body, segments
+            assert validator is None, "a mirror's validator returned for the upstream URL"
+        try:
+            downloader.download_to_file("https://up.test/m.zip", dest, sources=[lan.url("/m.zip")])
+        except HTTPError as e:
+            assert e.code == 404
+        else:
+            raise AssertionError("404 from the only source swallowed")
+    finally:
+        lan.stop()
+        shutil.rmtree(tmp)
+
+
+def test_session_fetch_fails_over_and_ranks():
+    slow = StubServer({"/up/cards.tsv": b"a\tb\n"}, ranges=True, request_delay=0.2).start()
+    lan = StubServer({"/lan/cards.tsv": b"a\tb\n"}, ranges=True).start()
+    try:
+        up = slow.url("/up/")
+        url = up + "cards.tsv"
+        config = {up: [_dead_url("/x/"), lan.url("/lan/")]}
+        with Session(mirrors=config, retries=0) as session:
+            assert session.get(url) == b"a\tb\n", "no failover past the dead mirror"
+            assert not slow.requests, "upstream used while a mirror worked"
+            assert session.sources(url) == mirrors.candidates(url, config), "unprobed order"
+            assert session.sources(url, probe=True)[0] == lan.url("/lan/cards.tsv")
+            lan.files.clear()  # the mirror lost the file: 404, on to upstream
+            assert session.get(url) == b"a\tb\n"
+    finally:
+        slow.stop()
+        lan.stop()
+
+
+class _FakeMw:
+    def __init__(self, media_dir, config):
+        self.col = types.SimpleNamespace(media=types.SimpleNamespace(dir=lambda: media_dir))
+        self.addonManager = types.SimpleNamespace(getConfig=lambda name: config)
+        self.taskman = types.SimpleNamespace(run_on_main=lambda fn: fn())
+        self.progress = types.SimpleNamespace(update=lambda **kw: None)
+
+
+def test_kaishi_uses_fastest_mirror():
+    media = os.urandom(3000)
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        zf.writestr("a.mp3", media)
+    body = out.getvalue()
+    upstream = StubServer({"/rel/kaishi-media.zip": body, "/zip-digests.json": json.dumps(
+        {"kaishi-media.zip": hashlib.sha256(body).hexdigest()}).encode()},
+        ranges=True, request_delay=0.3).start()
+    lan = StubServer({"/mvj/kaishi-media.zip": body}, ranges=True).start()
+    tmp = tempfile.mkdtemp()
+    saved = (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+             kaishi._cache)
+    try:
+        os.makedirs(os.path.join(tmp, "media"))
+        kaishi.mw = _FakeMw(os.path.join(tmp, "media"), {
+            "download_cache_mb": 0,
+            "mirrors": {upstream.url("/"): [lan.url("/mvj/")]},
+        })
+        kaishi._CACHE_DIR = os.path.join(tmp, "cache")
+        kaishi._DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+        kaishi._ZIP_DIGESTS_URL = upstream.url("/zip-digests.json")
+        kaishi._cache = None
+        url = upstream.url("/rel/kaishi-media.zip")
+        lan.files["/mvj/rel/kaishi-media.zip"] = lan.files.pop("/mvj/kaishi-media.zip")
+        manifest = {"a.mp3": hashlib.sha256(media).hexdigest()}
+        assert kaishi._download_and_extract_zip(url, "x", manifest) == 1
+        zip_gets = [h for p, h in upstream.requests if p == "/rel/kaishi-media.zip"]
+        assert all(h.get("Range") == "bytes=0-%d" % (mirrors._PROBE_BYTES - 1)
+                   for h in zip_gets), "zip downloaded from the slow upstream"
+        assert lan.bytes_sent >= len(body)
+    finally:
+        upstream.stop()
+        lan.stop()
+        (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+         kaishi._cache) = saved
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    tests = [
+        ("candidates: longest prefix, configured order, upstream last", test_candidates),
+        ("rank: fastest first, unreachable last", test_rank_fastest_first_dead_last),
+        ("download: a hung mirror fails over, resuming at the offset",
+         test_download_fails_over_mid_transfer_at_offset),
+        ("segmented: each segment fails over at its own offset",
+         test_segments_fail_over_independently),
+        ("download: 404 mirror skipped, file:// mirror serves", test_file_mirror_after_404),
+        ("session: fetch fails over; sources ranked by probe",
+         test_session_fetch_fails_over_and_ranks),
+        ("kaishi: zip comes from the faster LAN mirror", test_kaishi_uses_fastest_mirror),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
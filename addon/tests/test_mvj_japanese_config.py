@@ -12,7 +12,13 @@ import os
 import sys
 import types
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# notetype.py uses package-relative imports, so load it as ``addon.notetype``
+# under a bare package stub (skipping the Anki add-on bootstrap __init__).
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
 
 # Stub the aqt imports that notetype.py performs at module load.
 _aqt = types.ModuleType("aqt")
@@ -22,7 +28,7 @@ _aqt_utils.showWarning = lambda *a, **k: None
 sys.modules.setdefault("aqt", _aqt)
 sys.modules.setdefault("aqt.utils", _aqt_utils)
 
-from notetype import _MVJ_JP_FIELD_MAP, _mvj_field_assignments  # noqa: E402
+from addon.notetype import _MVJ_JP_FIELD_MAP, _mvj_field_assignments  # noqa: E402
 
 MODEL_ID = 1779545580076
 PROFILE = "User 1"
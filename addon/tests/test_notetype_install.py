@@ -0,0 +1,757 @@
+"""Tests for the note type download/install path (addon/notetype.py).
+
+``aqt`` is stubbed and ``notetype.mw`` swapped for a small fake, so the download
+logic runs against a local HTTP stand-in without Anki. Run directly:
+
+    python3 addon/tests/test_notetype_install.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+from concurrent.futures import Future
+from urllib.error import HTTPError
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+_aqt = types.ModuleType("aqt")
+_aqt.mw = None
+_aqt_utils = types.ModuleType("aqt.utils")
+_aqt_utils.showWarning = lambda *a, **k: None
+sys.modules.setdefault("aqt", _aqt)
+sys.modules.setdefault("aqt.utils", _aqt_utils)
+
+from http_stub import StubServer  # noqa: E402
+
+import addon.notetype as notetype  # noqa: E402
+
+# --------------------------------------------------------------------------- #
+# Fakes
+# --------------------------------------------------------------------------- #
+
+
+class FakeMw:
+    """Runs main-thread callbacks inline and records progress updates."""
+
+    def __init__(self, config=None):
+        self.updates = []
+        self.addonManager = types.SimpleNamespace(getConfig=lambda name: config)
+        self.taskman = types.SimpleNamespace(
+            run_on_main=lambda fn: fn(), run_in_background=self._run_in_background
+        )
+        self.progress = types.SimpleNamespace(
+            update=lambda **kw: self.updates.append(kw)
+        )
+
+    @staticmethod
+    def _run_in_background(task, on_done):
+        future = Future()
+        try:
+            future.set_result(task())
+        except Exception as e:  # noqa: BLE001
+            future.set_exception(e)
+        on_done(future)
+
+
+def _files():
+    files = {f"/{name}": f"<!-- {name} -->".encode() for name in notetype._TEMPLATE_FILES}
+    manifest = {}
+    for name in notetype._FONT_FILES:
+        body = os.urandom(2048)
+        files[f"/fonts/{name}"] = body
+        manifest[name] = {"size": len(body), "sha256": hashlib.sha256(body).hexdigest()}
+    files["/fonts/manifest.json"] = json.dumps(manifest).encode()
+    return files
+
+
+def _manifest(files):
+    return json.loads(files["/fonts/manifest.json"])
+
+
+def _serve(files, **kw):
+    server = StubServer(files, **kw).start()
+    notetype._BASE_URL = server.url("/")
+    notetype.mw = FakeMw()
+    return server
+
+
+def _download_everything(cache_dir):
+    """The install task's two phases, with every font needing repair."""
+    progress = notetype._DownloadProgress(len(notetype._TEMPLATE_FILES) + 1)
+    with notetype.Session() as session:
+        got = notetype._download_templates(notetype._TemplateCache(cache_dir), progress, session)
+        progress.expect(len(notetype._FONT_FILES))
+        got.update(notetype._download_fonts(notetype._FONT_FILES, progress, session))
+    return got
+
+
+def _templates(cache_dir):
+    with notetype.Session() as session:
+        cache = notetype._TemplateCache(cache_dir)
+        return cache, notetype._download_templates(cache, notetype._DownloadProgress(), session)
+
+
+class _TempDirs:
+    """Temp cache + media dirs, with the font state and subset paths pointed inside."""
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = os.path.join(self.root, "cache")
+        self.media = os.path.join(self.root, "media")
+        os.makedirs(self.media)
+        self.full = os.path.join(self.root, "fonts")
+        self.subsets = os.path.join(self.root, "font_subsets")
+        self._saved = {
+            name: getattr(notetype, name)
+            for name in ("_FONT_STATE_PATH", "_FULL_FONTS_DIR", "_SUBSET_CACHE_DIR", "_SUBSET_STATE_PATH")
+        }
+        notetype._FONT_STATE_PATH = os.path.join(self.root, "font_state.json")
+        notetype._FULL_FONTS_DIR = self.full
+        notetype._SUBSET_CACHE_DIR = self.subsets
+        notetype._SUBSET_STATE_PATH = os.path.join(self.subsets, "collections.json")
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self._saved.items():
+            setattr(notetype, name, value)
+        shutil.rmtree(self.root)
+        return False
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_download_fetches_everything():
+    files = _files()
+    server = _serve(files, request_delay=0.01)
+    try:
+        with _TempDirs() as tmp:
+            got = _download_everything(tmp.cache)
+        expected = {path.rsplit("/", 1)[1]: body for path, body in files.items()}
+        expected[notetype._FONT_MANIFEST] = expected.pop("manifest.json")
+        assert got == expected, "downloaded bodies mismatch"
+        assert server.connections <= notetype._MAX_PARALLEL_DOWNLOADS, server.connections
+        values = [u["value"] for u in notetype.mw.updates]
+        assert values == list(range(1, len(files) + 1)), f"progress not monotonic: {values}"
+        assert notetype.mw.updates[-1]["max"] == len(files), notetype.mw.updates[-1]
+    finally:
+        server.stop()
+
+
+def test_download_propagates_failure():
+    files = _files()
+    del files["/back.html"]
+    server = _serve(files)
+    try:
+        err = None
+        try:
+            with _TempDirs() as tmp:
+                _download_everything(tmp.cache)
+        except HTTPError as e:
+            err = e
+        assert err is not None and err.code == 404, "expected the 404 to surface"
+    finally:
+        server.stop()
+
+
+def test_template_cache_conditional_get():
+    files = _files()
+    server = _serve(files)
+    try:
+        with _TempDirs() as tmp:
+            _, first = _templates(tmp.cache)
+            _, second = _templates(tmp.cache)
+            assert second == first, "cached bodies differ from the originals"
+            sent = [h.get("If-None-Match") for _, h in server.requests[-4:]]
+            assert all(sent), f"conditional headers missing: {sent}"
+
+            server.files["/css.css"] = b"/* changed */"
+            _, third = _templates(tmp.cache)
+            assert third["css.css"] == b"/* changed */"
+            assert notetype._TemplateCache(tmp.cache).load("css.css") == b"/* changed */"
+    finally:
+        server.stop()
+
+
+def test_template_cache_survives_lost_body():
+    files = _files()
+    server = _serve(files)
+    try:
+        with _TempDirs() as tmp:
+            _templates(tmp.cache)
+            os.unlink(os.path.join(tmp.cache, "front.html"))
+            _, got = _templates(tmp.cache)
+        assert got["front.html"] == files["/front.html"]
+        last_front = [h for path, h in server.requests if path == "/front.html"][-1]
+        assert "If-None-Match" not in last_front, "sent a validator for a missing body"
+    finally:
+        server.stop()
+
+
+def test_fonts_repaired_per_file():
+    files = _files()
+    manifest = _manifest(files)
+    with _TempDirs() as tmp:
+        assert notetype._fonts_to_repair(tmp.media, manifest) == notetype._FONT_FILES
+        for name in notetype._FONT_FILES:
+            with open(os.path.join(tmp.media, name), "wb") as f:
+                f.write(files[f"/fonts/{name}"])
+        assert notetype._fonts_to_repair(tmp.media, manifest) == []
+
+        truncated, missing = notetype._FONT_FILES[0], notetype._FONT_FILES[1]
+        with open(os.path.join(tmp.media, truncated), "r+b") as f:
+            f.truncate(100)
+        os.unlink(os.path.join(tmp.media, missing))
+        got = notetype._fonts_to_repair(tmp.media, manifest)
+        assert got == [truncated, missing], got
+
+        # A font absent from the manifest is only checked for existence.
+        del manifest[truncated]
+        got = notetype._fonts_to_repair(tmp.media, manifest)
+        assert got == [missing], got
+
+
+def test_fonts_healthy_install_not_rehashed():
+    files = _files()
+    manifest = _manifest(files)
+    with _TempDirs() as tmp:
+        for name in notetype._FONT_FILES:
+            with open(os.path.join(tmp.media, name), "wb") as f:
+                f.write(files[f"/fonts/{name}"])
+        assert notetype._fonts_to_repair(tmp.media, manifest) == []
+        hashed = []
+        real = notetype._sha256_file
+        notetype._sha256_file = lambda path: hashed.append(path) or real(path)
+        try:
+            assert notetype._fonts_to_repair(tmp.media, manifest) == []
+        finally:
+            notetype._sha256_file = real
+        assert hashed == [], f"re-hashed healthy fonts: {hashed}"
+
+
+def test_verify_fonts_rejects_corrupt_download():
+    files = _files()
+    manifest = _manifest(files)
+    name = notetype._FONT_FILES[0]
+    notetype._verify_fonts({name: files[f"/fonts/{name}"]}, manifest)
+    raised = False
+    try:
+        notetype._verify_fonts({name: b"<html>error page</html>"}, manifest)
+    except ValueError:
+        raised = True
+    assert raised, "corrupt font accepted"
+
+
+class FakeModels:
+    """Just enough of ``col.models`` for ``_update_notetype``."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def new_field(self, name):
+        return {"name": name, "description": "", "font": "Arial", "size": 20}
+
+    def add_field(self, model, field):
+        model["flds"].append(field)
+
+    def rename_field(self, model, field, new_name):
+        field["name"] = new_name
+
+    def update_dict(self, model):
+        self.writes += 1
+
+
+def _model(front="F", back="B", css="body {}\n"):
+    mm = FakeModels()
+    fields = []
+    for name, *_ in notetype._FIELDS:
+        fields.append(mm.new_field(name))
+    model = {"tmpls": [{"qfmt": front, "afmt": back}], "css": css, "flds": fields}
+    notetype.mw = FakeMw()
+    notetype.mw.col = types.SimpleNamespace(models=mm)
+    return model, mm
+
+
+def test_update_notetype_skips_noop_write():
+    model, mm = _model()
+    changes = notetype._update_notetype(model, "F", "B", "body {}\n")
+    assert "field metadata" in changes and mm.writes == 1, (changes, mm.writes)
+    changes = notetype._update_notetype(model, "F", "B", "body {}\n")
+    assert changes == [] and mm.writes == 1, f"no-op update wrote: {changes}"
+
+
+def test_notetype_changes_reports_parts():
+    model, _ = _model()
+    notetype._update_notetype(model, "F", "B", "body {}\n")
+    changes = notetype._notetype_changes
+    assert changes(model, "F2", "B", "body {}\n") == ["front template"]
+    assert changes(model, "F", "B2", "body {}\n") == ["back template"]
+    assert changes(model, "F", "B", "p {}\n") == ["css"]
+
+    # The user's SETTINGS region is merged back in, so a new upstream value
+    # there is not a change -- unless the CSS is being reset.
+    settings = "/* ═══\n   ⚙ SETTINGS\n*/\n:root {{ --x: {}; }}\n/* ═══ */"
+    model["css"] = settings.format("user")
+    assert changes(model, "F", "B", settings.format("upstream")) == []
+    assert changes(model, "F", "B", settings.format("upstream"), reset_css=True) == ["css"]
+
+    model["flds"][0]["description"] = "edited"
+    assert changes(model, "F", "B", model["css"]) == ["field metadata"]
+
+
+def test_notetype_changes_fields():
+    model, _ = _model()
+    notetype._update_notetype(model, "F", "B", "body {}\n")
+    notes = next(f for f in model["flds"] if f["name"] == "Notes")
+    notes["name"] = "Translation"
+    assert notetype._notetype_changes(model, "F", "B", "body {}\n") == ["field names"]
+    model["flds"].remove(notes)
+    assert notetype._notetype_changes(model, "F", "B", "body {}\n") == ["fields"]
+    # A removed create-only field is never re-added, so it's not a change.
+    model["flds"] = [f for f in model["flds"] if f["name"] != "Context"] + [notes]
+    notes["name"] = "Notes"
+    assert notetype._notetype_changes(model, "F", "B", "body {}\n") == []
+
+
+def test_update_keeps_compiled_css_compiled():
+    settings = (
+        "/* ═══\n   ⚙ SETTINGS\n*/\n:root {{ --color-scheme: {}; }}\n/* ═══ */\n"
+        ':root[data-color-scheme="red"] {{ --bg: red; }}\n'
+    )
+    model, mm = _model(css=settings.format("black"))
+    notetype._update_notetype(model, "F", "B", settings.format("black"))
+    notetype._set_css(model, settings.format("black"), compiled=True)
+    assert "red" not in model["css"].split("*/")[-1], model["css"]
+    assert notetype._css_source(model) == settings.format("black")
+
+    # An upstream update merges into the source and recompiles.
+    upstream = settings.format("blue") + "p { margin: 0; }\n"
+    assert notetype._notetype_changes(model, "F", "B", upstream) == ["css"]
+    notetype._update_notetype(model, "F", "B", upstream)
+    assert "--color-scheme: black" in model["css"] and "p { margin: 0; }" in model["css"]
+    assert 'data-color-scheme="red"' in notetype._css_source(model)
+    assert 'data-color-scheme="red"' not in model["css"]
+    assert notetype._notetype_changes(model, "F", "B", upstream) == []
+
+    notetype._set_css(model, notetype._css_source(model), compiled=False)
+    assert notetype._CSS_SOURCE_KEY not in model and 'data-color-scheme="red"' in model["css"]
+
+
+class FakeRuntimeModels:
+    """``col.models`` / ``col.db`` over a list of note types, for ``_notetypes_containing``."""
+
+    def __init__(self, models):
+        self.models = {m["id"]: m for m in models}
+        self.loaded = []
+        self.writes = []
+
+    def get(self, mid):
+        self.loaded.append(mid)
+        return self.models.get(mid)
+
+    def all(self):
+        return list(self.models.values())
+
+    def update_dict(self, model):
+        self.writes.append(model["id"])
+
+    def list(self, sql, snippet):
+        return [
+            mid for mid, m in self.models.items()
+            if any(snippet in t["qfmt"] + t["afmt"] for t in m["tmpls"])
+        ]
+
+
+def test_install_runtime_keeps_blocks_in_use():
+    from addon import card_runtime
+
+    chinese, chinese_blocks = card_runtime.extract_runtime("<script>chinese();</script>")
+    old, old_blocks = card_runtime.extract_runtime("<script>oldMvj();</script>")
+    new, new_blocks = card_runtime.extract_runtime("<script>newMvj();</script>")
+    models = FakeRuntimeModels([
+        {"id": 1, "tmpls": [{"qfmt": old, "afmt": ""}]},
+        {"id": 2, "tmpls": [{"qfmt": chinese, "afmt": ""}]},
+    ])
+    with _TempDirs() as tmp:
+        notetype.mw = FakeMw()
+        notetype.mw.col = types.SimpleNamespace(
+            models=models, db=models, media=types.SimpleNamespace(dir=lambda: tmp.media),
+        )
+        path = os.path.join(tmp.media, card_runtime.RUNTIME_FILE)
+        notetype._install_runtime({**old_blocks, **chinese_blocks}, exclude_id=1)
+
+        # Replacing note type 1 drops its old blocks but keeps the Chinese ones.
+        notetype._install_runtime(new_blocks, exclude_id=1)
+        with open(path, encoding="utf-8") as f:
+            got = card_runtime.parse_runtime(f.read())
+        assert set(got) == set(new_blocks) | set(chinese_blocks), sorted(got)
+
+        mtime = os.stat(path).st_mtime_ns
+        models.models[1]["tmpls"][0]["qfmt"] = new
+        notetype._install_runtime(new_blocks, exclude_id=1)
+        assert os.stat(path).st_mtime_ns == mtime, "unchanged runtime rewritten"
+
+        # No blocks and no file: nothing is written.
+        os.unlink(path)
+        notetype._install_runtime({}, exclude_id=1)
+        assert not os.path.exists(path)
+
+
+def test_apply_templates_prunes_runtime_after_update():
+    from addon import card_runtime
+
+    old, old_blocks = card_runtime.extract_runtime("<script>oldMvj();</script>")
+    model = {"id": 1, "name": notetype.NOTE_TYPE_NAME, "tmpls": [{"qfmt": old, "afmt": ""}]}
+    models = FakeRuntimeModels([model])
+    models.by_name = lambda name: model
+    files = {"front.html": b"<script>newMvj();</script>", "back.html": b"", "css.css": b""}
+    saved = {name: getattr(notetype, name)
+             for name in ("_update_notetype", "_remove_cardgen_guard", "showWarning")}
+    warnings = []
+    notetype._remove_cardgen_guard = lambda: None
+    notetype.showWarning = warnings.append
+
+    def update(model, front, back, css, reset_css=False):
+        if fail:
+            raise RuntimeError("update_dict failed")
+        model["tmpls"][0]["qfmt"] = front
+        return ["front template"]
+
+    notetype._update_notetype = update
+    with _TempDirs() as tmp:
+        notetype.mw = FakeMw()
+        notetype.mw.col = types.SimpleNamespace(
+            models=models, db=models, media=types.SimpleNamespace(dir=lambda: tmp.media),
+        )
+        path = os.path.join(tmp.media, card_runtime.RUNTIME_FILE)
+        try:
+            notetype._install_runtime(old_blocks)
+
+            # A failed update leaves the installed templates' blocks in place.
+            fail = True
+            assert not notetype._apply_templates(files) and warnings
+            with open(path, encoding="utf-8") as f:
+                got = card_runtime.parse_runtime(f.read())
+            assert set(old_blocks) < set(got), sorted(got)
+
+            fail = False
+            assert notetype._apply_templates(files)
+            with open(path, encoding="utf-8") as f:
+                got = card_runtime.parse_runtime(f.read())
+            assert set(got) == card_runtime.referenced_blocks(model["tmpls"][0]["qfmt"])
+            assert not set(old_blocks) & set(got), sorted(got)
+        finally:
+            for name, value in saved.items():
+                setattr(notetype, name, value)
+
+
+def test_cardgen_guard_removed_once():
+    guard = notetype._CARDGEN_SNIPPET
+    fake = FakeRuntimeModels([
+        {"id": 1, "name": "Basic", "tmpls": [{"qfmt": "{{Front}}", "afmt": ""}]},
+        {"id": 2, "name": "Old", "tmpls": [{"qfmt": "{{Front}}\n" + guard, "afmt": ""}]},
+        {"id": 3, "name": notetype.NOTE_TYPE_NAME, "tmpls": [{"qfmt": guard, "afmt": ""}]},
+    ])
+    config = {}
+    notetype.mw = FakeMw()
+    notetype.mw.col = types.SimpleNamespace(
+        models=fake, db=fake,
+        get_config=lambda key, default=None: config.get(key, default),
+        set_config=config.__setitem__,
+    )
+    notetype._remove_cardgen_guard()
+    assert fake.models[2]["tmpls"][0]["qfmt"] == "{{Front}}"
+    assert fake.models[3]["tmpls"][0]["qfmt"] == guard
+    assert fake.writes == [2] and 1 not in fake.loaded, (fake.writes, fake.loaded)
+    assert config == {notetype._CARDGEN_CLEANED_KEY: True}
+
+    fake.models[1]["tmpls"][0]["qfmt"] += guard
+    notetype._remove_cardgen_guard()
+    assert fake.writes == [2], "cleanup ran again after the marker was set"
+
+
+def test_local_templates_prefer_last_download():
+    files = _files()
+    with _TempDirs() as tmp:
+        snapshot = notetype._SNAPSHOT_DIR
+        notetype._SNAPSHOT_DIR = os.path.join(tmp.root, "snapshot")
+        try:
+            assert notetype._local_templates(notetype._TemplateCache(tmp.cache)) is None
+            os.makedirs(notetype._SNAPSHOT_DIR)
+            for name in notetype._TEMPLATE_FILES:
+                with open(os.path.join(notetype._SNAPSHOT_DIR, name), "wb") as f:
+                    f.write(b"snapshot " + name.encode())
+            got = notetype._local_templates(notetype._TemplateCache(tmp.cache))
+            assert got == {n: b"snapshot " + n.encode() for n in notetype._TEMPLATE_FILES}
+            server = _serve(files)
+            try:
+                _templates(tmp.cache)
+            finally:
+                server.stop()
+            got = notetype._local_templates(notetype._TemplateCache(tmp.cache))
+            assert got == {n: files["/" + n] for n in notetype._TEMPLATE_FILES}
+        finally:
+            notetype._SNAPSHOT_DIR = snapshot
+
+
+class _FirstInstall:
+    """``install_notetype`` with no note type yet, against a stub server.
+
+    Records the template sets applied, the ``on_success`` calls and the
+    warnings shown; ``config`` is the collection config.
+    """
+
+    def __init__(self, tmp):
+        self.tmp = tmp
+        self.applied, self.done, self.warnings, self.config = [], [], [], {}
+        self.model = None
+
+    def __enter__(self):
+        self._saved = {
+            name: getattr(notetype, name)
+            for name in ("_apply_templates", "_TemplateCache", "_SNAPSHOT_DIR",
+                         "refresh_font_subsets", "_configure_mvj_japanese", "showWarning")
+        }
+        notetype._apply_templates = self._apply
+        notetype._TemplateCache = lambda d=self.tmp.cache: self._saved["_TemplateCache"](d)
+        notetype._SNAPSHOT_DIR = os.path.join(os.path.dirname(ADDON_DIR), "note-types", "mvj")
+        notetype.refresh_font_subsets = lambda: None
+        notetype._configure_mvj_japanese = lambda profile: None
+        notetype.showWarning = self.warnings.append
+        notetype.mw = FakeMw()
+        notetype.mw.pm = None
+        notetype.mw.progress.start = notetype.mw.progress.finish = None  # must not be used
+        config = self.config
+        notetype.mw.col = types.SimpleNamespace(
+            media=types.SimpleNamespace(dir=lambda: self.tmp.media),
+            models=types.SimpleNamespace(by_name=lambda name: self.model),
+            get_config=lambda key, default=None: config.get(key, default),
+            set_config=config.__setitem__,
+            remove_config=config.pop,
+        )
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self._saved.items():
+            setattr(notetype, name, value)
+        return False
+
+    def _apply(self, files, reset_css=False, background=False):
+        self.applied.append(files)
+        self.model = {"name": notetype.NOTE_TYPE_NAME}
+        return True
+
+    def run(self, fn, files=None):
+        server = StubServer(files or {}).start()
+        try:
+            notetype._BASE_URL = server.url("/")
+            fn()
+        finally:
+            server.stop()
+
+
+def test_first_install_is_local_then_refreshes():
+    def install():
+        notetype.install_notetype(on_success=lambda: first.done.append(len(first.applied)))
+
+    # GitHub unreachable (everything 404s): installed from the snapshot anyway.
+    with _TempDirs() as tmp, _FirstInstall(tmp) as first:
+        first.run(install)
+        assert len(first.applied) == 1 and first.done == [1] and not first.warnings, (
+            len(first.applied), first.done, first.warnings)
+        with open(os.path.join(os.path.dirname(ADDON_DIR), "note-types", "mvj", "front.html"), "rb") as f:
+            assert first.applied[0]["front.html"] == f.read()
+        assert first.config == {notetype._REFRESH_PENDING_KEY: True}, first.config
+
+    # Online: the background refresh applies upstream and adds the fonts.
+    files = _files()
+    with _TempDirs() as tmp, _FirstInstall(tmp) as first:
+        first.run(install, files)
+        assert len(first.applied) == 2 and first.done == [1] and not first.warnings, (
+            len(first.applied), first.done, first.warnings)
+        assert first.applied[1]["front.html"] == files["/front.html"]
+        assert sorted(os.listdir(tmp.media)) == sorted(notetype._FONT_FILES)
+        assert first.config == {}, first.config
+
+
+def test_offline_install_gets_fonts_on_a_later_profile_open():
+    with _TempDirs() as tmp, _FirstInstall(tmp) as first:
+        first.run(notetype.install_notetype)
+        first.run(notetype.finish_pending_install)  # still offline
+        assert len(first.applied) == 1 and not first.warnings, first.warnings
+        assert os.listdir(tmp.media) == [] and first.config, first.config
+
+        first.run(notetype.finish_pending_install, _files())
+        assert len(first.applied) == 2 and not first.warnings, first.warnings
+        assert sorted(os.listdir(tmp.media)) == sorted(notetype._FONT_FILES)
+        assert first.config == {}, first.config
+
+        first.run(notetype.finish_pending_install, _files())
+        assert len(first.applied) == 2, "refreshed again after it went through"
+
+
+def test_background_refresh_only_logs_failures():
+    with _TempDirs() as tmp, _FirstInstall(tmp) as first:
+        # A file where the media folder should be: nothing can be written.
+        blocked = os.path.join(tmp.root, "blocked")
+        open(blocked, "wb").close()
+        notetype.mw.col.media.dir = lambda: blocked
+        first.run(lambda: notetype.install_notetype(background=True), _files())
+        assert not first.warnings and first.applied == [], first.warnings
+
+        notetype._apply_templates = first._saved["_apply_templates"]
+        templates = {"front.html": b"<script>f();</script>", "back.html": b"", "css.css": b""}
+        assert not notetype._apply_templates(templates, background=True)
+        assert not first.warnings, first.warnings
+        assert not notetype._apply_templates(templates) and first.warnings
+
+
+def test_build_templates_minifies_unless_debugging():
+    settings = "/* ═══\n   ⚙ SETTINGS\n*/\n:root {\n    --x:  user;  /* keep */\n}\n/* ═══ */"
+    front = "<div>\n    <span>{{Word}}</span>\n</div>\n<script>\n    // hi\n    go();\n</script>\n"
+    css = settings + "\n\n/* rules */\n.a {\n    color: red;\n}\n"
+
+    notetype.mw = FakeMw({"minify_templates": False, "shared_runtime": False})
+    assert notetype._build_templates(front, "B", css) == (front, "B", css, {})
+
+    notetype.mw = FakeMw({"shared_runtime": False})
+    got_front, _, got_css, _ = notetype._build_templates(front, "B", css)
+    assert got_front == "<div>\n<span>{{Word}}</span>\n</div>\n<script>go();</script>\n", got_front
+    assert got_css == settings + "\n.a{color: red}\n", got_css
+    # The user's SETTINGS region still merges across a minified update.
+    user_css = got_css.replace("--x:  user;", "--x: mine;")
+    assert "--x: mine;" in notetype._merge_css_settings(user_css, got_css)
+
+
+def test_subset_fonts_verified_in_full_dir():
+    files = _files()
+    manifest = _manifest(files)
+    subset = notetype._FONT_FILES[:1]
+    with _TempDirs() as tmp:
+        for name in notetype._FONT_FILES:
+            with open(os.path.join(tmp.media, name), "wb") as f:
+                f.write(files[f"/fonts/{name}"])
+        # The media copy is fine, but the full font it's subset from is missing.
+        assert notetype._fonts_to_repair(tmp.media, manifest, subset) == subset
+        notetype.mw = FakeMw()
+        notetype.mw.col = types.SimpleNamespace(media=types.SimpleNamespace(dir=lambda: tmp.media))
+        notetype._install_fonts({subset[0]: files[f"/fonts/{subset[0]}"]}, manifest, subset)
+        assert os.path.exists(os.path.join(tmp.full, subset[0]))
+        # A subset in the media folder doesn't count as damage while subsetting.
+        with open(os.path.join(tmp.media, subset[0]), "wb") as f:
+            f.write(b"subset")
+        assert notetype._fonts_to_repair(tmp.media, manifest, subset) == []
+        assert notetype._fonts_to_repair(tmp.media, manifest) == subset
+
+
+def test_subset_text_includes_runtime_scripts():
+    from addon import card_runtime
+
+    built, blocks = card_runtime.extract_runtime(
+        "<div>{{Word}}</div><script>el.textContent = '— → ─';</script>")
+    _, other = card_runtime.extract_runtime("<script>x = '☃';</script>")
+    model = {"id": 7, "tmpls": [{"qfmt": built, "afmt": ""}], "css": "b {}"}
+    with _TempDirs() as tmp:
+        assert notetype._template_texts(model, tmp.media) == [built, "b {}"], "no runtime file"
+        with open(os.path.join(tmp.media, card_runtime.RUNTIME_FILE), "w", encoding="utf-8") as f:
+            f.write(card_runtime.render_runtime({**blocks, **other}))
+        text = "".join(notetype._template_texts(model, tmp.media))
+    assert all(c in text for c in "—→─"), "card-script glyphs dropped"
+    assert "☃" not in text, "another note type's blocks included"
+
+
+def test_refresh_font_subsets_tracks_new_glyphs():
+    from addon import font_subset
+
+    if not font_subset.available():
+        print("  (fontTools/brotli not installed; skipped)")
+        return
+    font = os.path.join(os.path.dirname(ADDON_DIR), "note-types", "mvj", "fonts", "_jetbrains-mono.woff2")
+    name = os.path.basename(font)
+    model = {"id": 7, "tmpls": [{"qfmt": "", "afmt": ""}], "css": ""}
+    rows = ["abc\x1fdef"]
+    subset_fonts = notetype._SUBSET_FONTS
+    notetype._SUBSET_FONTS = [name]
+    try:
+        with _TempDirs() as tmp:
+            os.makedirs(tmp.full)
+            shutil.copyfile(font, os.path.join(tmp.full, name))
+            notetype.mw = FakeMw({"subset_fonts": True})
+            notetype.mw.pm = None
+            notetype.mw.col = types.SimpleNamespace(
+                media=types.SimpleNamespace(dir=lambda: tmp.media),
+                models=types.SimpleNamespace(by_name=lambda n: model),
+                db=types.SimpleNamespace(list=lambda sql, mid: list(rows)),
+            )
+            notetype.refresh_font_subsets()
+            media_font = os.path.join(tmp.media, name)
+            first = os.path.getsize(media_font)
+            assert first < os.path.getsize(font) // 2, first
+            assert not notetype.note_needs_font_subset(["abc", "def"])
+
+            # é is outside the base ranges and the notes so far.
+            assert notetype.note_needs_font_subset(["café"])
+            notetype.refresh_font_subsets(extra_texts=["café"])
+            assert not notetype.note_needs_font_subset(["café"])
+            assert os.path.getsize(media_font) != first
+            subsets = [n for n in os.listdir(tmp.subsets) if n.endswith(".woff2")]
+            assert len(subsets) == 1, f"stale subsets not pruned: {subsets}"
+    finally:
+        notetype._SUBSET_FONTS = subset_fonts
+
+
+def main() -> int:
+    tests = [
+        ("templates + fonts fetched, bounded connections, monotonic progress", test_download_fetches_everything),
+        ("download re-raises the first failure", test_download_propagates_failure),
+        ("template cache: 304 served from disk, changes refetched", test_template_cache_conditional_get),
+        ("template cache: lost body refetched", test_template_cache_survives_lost_body),
+        ("update_notetype skips a no-op write", test_update_notetype_skips_noop_write),
+        ("notetype_changes reports templates/css/metadata", test_notetype_changes_reports_parts),
+        ("notetype_changes reports renamed/missing fields", test_notetype_changes_fields),
+        ("update: compiled CSS stays compiled, source merged", test_update_keeps_compiled_css_compiled),
+        ("fonts: only missing/mismatched ones repaired", test_fonts_repaired_per_file),
+        ("fonts: healthy install never re-hashed", test_fonts_healthy_install_not_rehashed),
+        ("fonts: corrupt download rejected", test_verify_fonts_rejects_corrupt_download),
+        ("runtime: blocks other note types call are kept", test_install_runtime_keeps_blocks_in_use),
+        ("runtime: old blocks pruned only after the update", test_apply_templates_prunes_runtime_after_update),
+        ("cardGen guard: only matching note types, once", test_cardgen_guard_removed_once),
+        ("local templates: last download, else the snapshot", test_local_templates_prefer_last_download),
+        ("first install: local now, refreshed in the background", test_first_install_is_local_then_refreshes),
+        ("offline install: fonts fetched on a later profile open",
+         test_offline_install_gets_fonts_on_a_later_profile_open),
+        ("background refresh: failures logged, not shown", test_background_refresh_only_logs_failures),
+        ("build: minified by default, sources with the debug switch", test_build_templates_minifies_unless_debugging),
+        ("fonts: subset fonts verified in the full-font dir", test_subset_fonts_verified_in_full_dir),
+        ("subsets: rebuilt when a new note adds a glyph", test_refresh_font_subsets_tracks_new_glyphs),
+        ("subsets: card-script glyphs read from the runtime", test_subset_text_includes_runtime_scripts),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Tests for addon/remote_zip.py (fetching single members of a zip by Range).
+
+Runs against ``http_stub`` servers; the last test drives
+``kaishi._download_and_extract_zip`` with ``aqt`` stubbed. Run directly:
+
+    python3 addon/tests/test_remote_zip.py
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import types
+import zipfile
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+_aqt = types.ModuleType("aqt")
+_aqt.mw = None
+_aqt_qt = types.ModuleType("aqt.qt")
+_aqt_qt.QMessageBox = object
+_aqt_utils = types.ModuleType("aqt.utils")
+_aqt_utils.showInfo = _aqt_utils.showWarning = lambda *a, **k: None
+sys.modules.setdefault("aqt", _aqt)
+sys.modules.setdefault("aqt.qt", _aqt_qt)
+sys.modules.setdefault("aqt.utils", _aqt_utils)
+
+from http_stub import StubServer  # noqa: E402
+
+import addon.kaishi as kaishi  # noqa: E402
+import addon.remote_zip as remote_zip  # noqa: E402
+from addon.downloader import CancelToken, DownloadCancelled  # noqa: E402
+
+
+def _zip(files, comment=b"") -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+        zf.comment = comment
+    return out.getvalue()
+
+
+def _media(count=40, size=20_000):
+    return {f"media/{i:03d}.mp3": os.urandom(size + i) for i in range(count)}
+
+
+def _ranges(server):
+    return [h.get("Range") for _, h in server.requests]
+
+
+def _extract(path):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {i.filename: zf.read(i) for i in zf.infolist()}
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_fetches_only_wanted_members_merging_neighbours():
+    files = _media()
+    body = _zip(files, comment=b"x" * 300)
+    server = StubServer({"/m.zip": body}, ranges=True).start()
+    tmp = tempfile.mkdtemp()
+    try:
+        archive = remote_zip.RemoteZip(server.url("/m.zip"))
+        assert archive.size == len(body)
+        assert [m.filename for m in archive.members] == list(files)
+        wanted = {"media/003.mp3", "media/004.mp3", "media/005.mp3", "media/030.mp3"}
+        members = [m for m in archive.members if m.filename in wanted]
+        before = server.bytes_sent
+        dest = os.path.join(tmp, "part.zip")
+        fetched = archive.fetch(members, dest)
+        assert _extract(dest) == {n: files[n] for n in sorted(wanted)}
+        assert server.bytes_sent - before == fetched == remote_zip.transfer_size(members)
+        assert fetched < len(body) / 5, (fetched, len(body))
+        # The tail, then one request for 003-005 and one for 030.
+        assert len(_ranges(server)) == 3, _ranges(server)
+        assert all(h.get("If-Range") for _, h in server.requests[1:])
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def test_long_directory_and_resume_after_drops():
+    # ~3,000 long names: the central directory doesn't fit in the tail.
+    files = {f"media/{'n' * 60}_{i:05d}.png": os.urandom(200) for i in range(3000)}
+    body = _zip(files)
+    server = StubServer({"/m.zip": body}, ranges=True, stall_after=120_000, stall_for=0).start()
+    tmp = tempfile.mkdtemp()
+    try:
+        archive = remote_zip.RemoteZip(server.url("/m.zip"))
+        assert len(archive.members) == 3000
+        members = archive.members[100:2000]  # one span of ~700 KB, cut every 120 KB
+        dest = os.path.join(tmp, "part.zip")
+        archive.fetch(members, dest)
+        got = _extract(dest)
+        assert got == {m.filename: files[m.filename] for m in members}
+        assert len(server.requests) > 5, "span not resumed across dropped connections"
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def test_unsupported_without_ranges_or_after_change():
+    files = _media(10)
+    server = StubServer({"/m.zip": _zip(files)}).start()
+    try:
+        try:
+            remote_zip.RemoteZip(server.url("/m.zip"))
+        except remote_zip.Unsupported:
+            pass
+        else:
+            raise AssertionError("a 200 for the tail accepted")
+        server.ranges = True
+        archive = remote_zip.RemoteZip(server.url("/m.zip"))
+        server.files["/m.zip"] = _zip(_media(10))  # replaced on the server
+        try:
+            archive.fetch(archive.members[:2], os.devnull)
+        except remote_zip.Unsupported:
+            pass
+        else:
+            raise AssertionError("spliced bytes from a changed file")
+    finally:
+        server.stop()
+
+
+def test_cancel():
+    server = StubServer({"/m.zip": _zip(_media())}, ranges=True, rate=200_000).start()
+    try:
+        cancel = CancelToken()
+        archive = remote_zip.RemoteZip(server.url("/m.zip"), cancel=cancel)
+
+        def on_progress(stats):
+            cancel.cancel()
+
+        try:
+            archive.fetch(archive.members, os.devnull, on_progress=on_progress)
+        except DownloadCancelled:
+            pass
+        else:
+            raise AssertionError("cancel ignored")
+    finally:
+        server.stop()
+
+
+class _FakeMw:
+    def __init__(self, media_dir, config):
+        self.col = types.SimpleNamespace(media=types.SimpleNamespace(dir=lambda: media_dir))
+        self.addonManager = types.SimpleNamespace(getConfig=lambda name: config)
+        self.taskman = types.SimpleNamespace(run_on_main=lambda fn: fn())
+        self.progress = types.SimpleNamespace(update=lambda **kw: None)
+
+
+def test_kaishi_repairs_by_member():
+    files = _media(60)
+    body = _zip(files)
+    manifest = {n[len("media/"):]: hashlib.sha256(d).hexdigest() for n, d in files.items()}
+    server = StubServer({"/kaishi-media.zip": body}, ranges=True).start()
+    tmp = tempfile.mkdtemp()
+    saved = (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+             kaishi._cache)
+    try:
+        media_dir = os.path.join(tmp, "media")
+        os.makedirs(media_dir)
+        for name, data in files.items():
+            if not name.endswith(("7.mp3", "8.mp3")):
+                with open(os.path.join(media_dir, os.path.basename(name)), "wb") as f:
+                    f.write(data)
+        kaishi.mw = _FakeMw(media_dir, {"download_cache_mb": 10})
+        kaishi._CACHE_DIR = os.path.join(tmp, "cache")
+        kaishi._DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+        kaishi._ZIP_DIGESTS_URL = server.url("/zip-digests.json")  # 404: no digest
+        kaishi._cache = None
+        url = server.url("/kaishi-media.zip")
+        assert kaishi._download_and_extract_zip(url, "x", manifest) == 12
+        assert sorted(os.listdir(media_dir)) == sorted(manifest)
+        for name, data in files.items():
+            with open(os.path.join(media_dir, os.path.basename(name)), "rb") as f:
+                assert f.read() == data, name
+        assert server.bytes_sent < len(body) / 3, (server.bytes_sent, len(body))
+        assert os.listdir(kaishi._DOWNLOAD_DIR) == []
+
+        # Everything missing: the whole zip downloads (and is cached) instead.
+        shutil.rmtree(media_dir)
+        os.makedirs(media_dir)
+        before = server.bytes_sent
+        assert kaishi._download_and_extract_zip(url, "x", manifest) == 60
+        assert server.bytes_sent - before >= len(body)
+    finally:
+        server.stop()
+        (kaishi.mw, kaishi._CACHE_DIR, kaishi._DOWNLOAD_DIR, kaishi._ZIP_DIGESTS_URL,
+         kaishi._cache) = saved
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    tests = [
+        ("fetches only the wanted members, neighbours in one request",
+         test_fetches_only_wanted_members_merging_neighbours),
+        ("directory past the tail; spans resume after drops",
+         test_long_directory_and_resume_after_drops),
+        ("Unsupported: no Range support, or the file changed",
+         test_unsupported_without_ranges_or_after_change),
+        ("cancel stops a member fetch", test_cancel),
+        ("kaishi: a repair fetches just the missing members", test_kaishi_repairs_by_member),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Tests for addon/zip_extract.py (streaming, parallel zip extraction).
+
+Pure module, no Anki needed. Run directly:
+
+    python3 addon/tests/test_zip_extract.py
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+import zipfile
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_pkg = types.ModuleType("addon")
+_pkg.__path__ = [ADDON_DIR]
+sys.modules.setdefault("addon", _pkg)
+
+import addon.zip_extract as zip_extract  # noqa: E402
+
+
+def _make_zip(path, files, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as zf:
+        for name, data in files:
+            if data is None:
+                zf.writestr(zipfile.ZipInfo(name), b"")  # directory entry
+            else:
+                zf.writestr(name, data)
+
+
+class _StopAfter:
+    """A cancel token whose ``check`` raises from the *n*-th call on."""
+
+    def __init__(self, n):
+        self.calls = 0
+        self.n = n
+
+    def check(self):
+        self.calls += 1
+        if self.calls >= self.n:
+            raise KeyboardInterrupt("cancelled")
+
+
+# --------------------------------------------------------------------------- #
+# Tests
+# --------------------------------------------------------------------------- #
+
+
+def test_extracts_flat_in_parallel():
+    tmp = tempfile.mkdtemp()
+    try:
+        files = [(f"media/{i:03d}.mp3", os.urandom(3000 + i)) for i in range(60)]
+        files += [("media/", None), ("a/dup.png", b"first"), ("b/dup.png", b"second")]
+        zip_path = os.path.join(tmp, "m.zip")
+        _make_zip(zip_path, files)
+        out = os.path.join(tmp, "out")
+        os.makedirs(out)
+        assert zip_extract.extract_flat(zip_path, out, workers=4) == 61
+        for name, data in files[:60]:
+            with open(os.path.join(out, os.path.basename(name)), "rb") as f:
+                assert f.read() == data, name
+        with open(os.path.join(out, "dup.png"), "rb") as f:
+            assert f.read() == b"second", "later duplicate didn't win"
+        assert len(os.listdir(out)) == 61
+
+        renamed = os.path.join(tmp, "renamed")
+        os.makedirs(renamed)
+        count = zip_extract.extract_flat(
+            zip_path, renamed, name_for=lambda n: n.endswith(".mp3") and "x" + os.path.basename(n))
+        assert count == 60 and all(n.startswith("x") for n in os.listdir(renamed))
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_corrupt_member_leaves_no_partial_file():
+    tmp = tempfile.mkdtemp()
+    try:
+        good, bad = os.urandom(200_000), os.urandom(200_000)
+        zip_path = os.path.join(tmp, "m.zip")
+        _make_zip(zip_path, [("good.mp3", good), ("bad.mp3", bad)], zipfile.ZIP_STORED)
+        with open(zip_path, "r+b") as f:
+            data = f.read()
+            f.seek(data.index(bad) + 100_000)
+            f.write(b"\0" * 16)  # CRC check fails at the member's end
+        out = os.path.join(tmp, "out")
+        os.makedirs(out)
+        try:
+            zip_extract.extract_flat(zip_path, out, workers=2)
+        except zipfile.BadZipFile:
+            pass
+        else:
+            raise AssertionError("corrupt member extracted without error")
+        assert "bad.mp3" not in os.listdir(out), "half-written media left under its real name"
+        assert not [n for n in os.listdir(out) if n.endswith(zip_extract._TMP_SUFFIX)]
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_cancel_and_leftovers():
+    tmp = tempfile.mkdtemp()
+    try:
+        zip_path = os.path.join(tmp, "m.zip")
+        _make_zip(zip_path, [(f"{i}.png", os.urandom(1000)) for i in range(20)])
+        out = os.path.join(tmp, "out")
+        os.makedirs(out)
+        stray = os.path.join(out, "old.png" + zip_extract._TMP_SUFFIX)
+        with open(stray, "wb") as f:
+            f.write(b"left by a crash")
+        try:
+            zip_extract.extract_flat(zip_path, out, workers=1, cancel=_StopAfter(5))
+        except KeyboardInterrupt:
+            pass
+        else:
+            raise AssertionError("cancel ignored")
+        assert len(os.listdir(out)) == 4, sorted(os.listdir(out))
+        assert not os.path.exists(stray), "leftover temp file not removed"
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_digests_extract_missing_only_and_verify():
+    tmp = tempfile.mkdtemp()
+    try:
+        files = {f"{i}.mp3": os.urandom(2000 + i) for i in range(10)}
+        zip_path = os.path.join(tmp, "m.zip")
+        _make_zip(zip_path, [("media/" + n, d) for n, d in files.items()])
+        digests = {n: hashlib.sha256(d).hexdigest() for n, d in files.items()}
+        out = os.path.join(tmp, "out")
+        os.makedirs(out)
+        with open(os.path.join(out, "0.mp3"), "wb") as f:
+            f.write(b"already here")
+        missing = {n: h for n, h in digests.items() if n != "0.mp3"}
+        missing["not-in-zip.png"] = "0" * 64
+        assert zip_extract.extract_flat(zip_path, out, digests=missing) == 9
+        with open(os.path.join(out, "0.mp3"), "rb") as f:
+            assert f.read() == b"already here", "extracted a file that wasn't asked for"
+        for name in missing:
+            if name != "not-in-zip.png":
+                with open(os.path.join(out, name), "rb") as f:
+                    assert f.read() == files[name], name
+
+        bad = os.path.join(tmp, "bad")
+        os.makedirs(bad)
+        wrong = dict(digests, **{"5.mp3": hashlib.sha256(b"other").hexdigest()})
+        try:
+            zip_extract.extract_flat(zip_path, bad, digests=wrong, workers=1)
+        except zip_extract.DigestMismatch:
+            pass
+        else:
+            raise AssertionError("digest mismatch not detected")
+        left = set(os.listdir(bad))
+        assert "5.mp3" not in left and not [n for n in left if n.endswith(zip_extract._TMP_SUFFIX)]
+
+        # A re-run extracts just what the interrupted one didn't get to.
+        still = {n: h for n, h in digests.items() if n not in left}
+        assert zip_extract.extract_flat(zip_path, bad, digests=still) == len(still)
+        assert sorted(os.listdir(bad)) == sorted(files)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    tests = [
+        ("extracts flat, in parallel; duplicates, dirs, name_for", test_extracts_flat_in_parallel),
+        ("corrupt member: error, no half-written file", test_corrupt_member_leaves_no_partial_file),
+        ("cancel stops extraction; stray temp files removed", test_cancel_and_leftovers),
+        ("digests: missing files only, each verified; re-run resumes",
+         test_digests_extract_missing_only_and_verify),
+    ]
+    failed = 0
+    for label, fn in tests:
+        try:
+            fn()
+            print(f"PASS  {label}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {label}: {e}")
+        except Exception as e:  # noqa: BLE001
+            failed += 1
+            print(f"ERROR {label}: {type(e).__name__}: {e}")
+    print()
+    print(f"{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
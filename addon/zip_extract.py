@@ -0,0 +1,147 @@
+"""Streaming, parallel extraction of a zip into one flat folder.
+
+Used for the Kaishi media zips, which unpack straight into Anki's media
+folder. Each member is copied through a bounded buffer (``_BUFFER``) rather
+than read whole, so memory stays flat however large the files are, and
+workers take members in turn from a shared queue: zlib and file writes
+release the GIL, so decompression of one member overlaps the disk writes of
+others. Every worker has its own ``ZipFile`` handle, so they don't queue on
+one file position.
+
+A member is written to ``<name>.mvj-tmp`` and renamed over ``<name>`` only
+once complete, so an interrupted extraction never leaves half-written media
+behind under a real name; stray temp files from one are removed by the next
+run.
+
+Given ``digests`` (file name -> SHA-256), only those files are extracted,
+each hashed as it streams and renamed into place only if it matches, so a
+re-run after an interrupted extraction touches only what is still missing.
+
+Pure Python; no Anki imports.
+"""
+
+import hashlib
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+_BUFFER = 256 * 1024
+_TMP_SUFFIX = ".mvj-tmp"
+
+
+class DigestMismatch(zipfile.BadZipFile):
+    """A member's SHA-256 isn't the one the manifest lists for it."""
+
+
+def default_workers() -> int:
+    """Threads for extraction: one per CPU, at most 8 (more only contend for the disk)."""
+    return max(1, min(8, os.cpu_count() or 1))
+
+
+def extract_flat(zip_path: str, dest_dir: str, *, name_for=os.path.basename,
+                 digests: dict | None = None, workers: int | None = None,
+                 cancel=None) -> int:
+    """Extract the file members of *zip_path* into *dest_dir*; returns the count.
+
+    Args:
+        name_for: maps a member's name to its file name in *dest_dir*; falsy
+            skips the member. Where two members map to the same name, the
+            later one wins, as with extracting them in order.
+        digests: if given, extract only the files named in it (after
+            *name_for*), each verified against its SHA-256 hex digest;
+            every other member is left alone. None extracts everything.
+        workers: thread count (default ``default_workers()``).
+        cancel: checked before each member (anything with ``check()`` that
+            raises, e.g. ``downloader.CancelToken``).
+
+    Raises:
+        zipfile.BadZipFile: a member is corrupt (bad CRC), or, as
+            ``DigestMismatch``, doesn't match its digest. Members already
+            renamed into place stay; the failing one's temp file is removed.
+    """
+    with zipfile.ZipFile(zip_path) as zf:
+        members = {}
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = name_for(info.filename)
+            if name and (digests is None or name in digests):
+                members[name] = info
+    remove_leftovers(dest_dir)
+    if not members:
+        return 0
+
+    jobs = iter(members.items())
+    lock = threading.Lock()
+    failed = threading.Event()
+
+    def work():
+        # One handle per worker, so reads don't queue on a shared file position.
+        with zipfile.ZipFile(zip_path) as zf:
+            while not failed.is_set():
+                with lock:
+                    job = next(jobs, None)
+                if job is None:
+                    return
+                try:
+                    if cancel is not None:
+                        cancel.check()
+                    name, info = job
+                    _extract_member(zf, info, os.path.join(dest_dir, name),
+                                    digests.get(name) if digests else None)
+                except BaseException:
+                    failed.set()  # the other workers stop after their member
+                    raise
+
+    workers = min(workers or default_workers(), len(members))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work) for _ in range(workers)]
+    for future in futures:
+        future.result()
+    return len(members)
+
+
+def _extract_member(zf, info, target: str, digest: str | None = None) -> None:
+    """Stream *info* to ``target + _TMP_SUFFIX``, then rename it to *target*.
+
+    With *digest*, the data is hashed on the way through and the temp file
+    is only renamed if it matches.
+    """
+    tmp = target + _TMP_SUFFIX
+    sha = hashlib.sha256() if digest else None
+    try:
+        with zf.open(info) as src, open(tmp, "wb") as dst:
+            while True:
+                block = src.read(_BUFFER)
+                if not block:
+                    break
+                if sha is not None:
+                    sha.update(block)
+                dst.write(block)
+        if sha is not None and sha.hexdigest() != digest.lower():
+            raise DigestMismatch(
+                f"{os.path.basename(target)}: SHA-256 {sha.hexdigest()}, expected {digest}"
+            )
+        os.replace(tmp, target)
+    except BaseException:
+        _unlink(tmp)
+        raise
+
+
+def remove_leftovers(dest_dir: str) -> None:
+    """Delete temp files an interrupted ``extract_flat`` left in *dest_dir*."""
+    try:
+        names = os.listdir(dest_dir)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(_TMP_SUFFIX):
+            _unlink(os.path.join(dest_dir, name))
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -6,6 +6,9 @@ verify a complete media install:
     media-manifest.json      <- kaishi-media-full-v2.zip
     def-audio-manifest.json  <- kaishi-def-audio-v2.zip
 
+plus zip-digests.json (zip name -> SHA256 of the zip itself), which the addon
+checks each zip against while downloading it.
+
 Filenames in the zip stored without the UTF-8 flag bit come back as CP437
 mojibake from Python's zipfile; this script applies the same recovery
 the addon uses (cp437 -> utf-8) so the manifest matches the names that
@@ -48,6 +51,14 @@ def build_manifest(zip_path: str) -> dict[str, str]:
     return dict(sorted(manifest.items()))
 
 
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
 def write_manifest(manifest: dict[str, str], path: str) -> None:
     with open(path, "w", encoding="utf-8") as f:
         json.dump(manifest, f, ensure_ascii=False, indent=2)
@@ -69,6 +80,10 @@ def main(argv: list[str]) -> int:
     write_manifest(def_audio, os.path.join(out_dir, "def-audio-manifest.json"))
     print(f"def-audio-manifest.json: {len(def_audio)} entries")
 
+    digests = {os.path.basename(p): file_digest(p) for p in (full_zip, def_audio_zip)}
+    write_manifest(digests, os.path.join(out_dir, "zip-digests.json"))
+    print("zip-digests.json: written")
+
     return 0
 
 
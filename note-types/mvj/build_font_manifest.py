@@ -0,0 +1,43 @@
+"""Build fonts/manifest.json (filename -> size + SHA256) for the note type fonts.
+
+The add-on downloads this manifest alongside the templates and uses it to
+repair only the fonts in a user's media folder that are missing, truncated or
+outdated. Re-run after adding or changing any font in fonts/:
+
+    python build_font_manifest.py
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+
+
+def build_manifest(fonts_dir: str) -> dict[str, dict]:
+    manifest: dict[str, dict] = {}
+    for name in sorted(os.listdir(fonts_dir)):
+        if not name.endswith(".woff2"):
+            continue
+        with open(os.path.join(fonts_dir, name), "rb") as f:
+            data = f.read()
+        manifest[name] = {
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+    return manifest
+
+
+def main() -> int:
+    manifest = build_manifest(FONTS_DIR)
+    path = os.path.join(FONTS_DIR, "manifest.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"manifest.json: {len(manifest)} fonts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())